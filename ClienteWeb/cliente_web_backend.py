@@ -1,20 +1,39 @@
 import eel
 import socket
 import threading
-import json
+import queue
+import time
 import os
+import sys
+
+# Resuelve las rutas absolutas a partir de este archivo
+# Esto hace que funcione sin importar desde dónde ejecutes el script
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# El protocolo es compartido con el servidor ('Codes-Redes/Comun')
+sys.path.insert(0, os.path.join(script_dir, "..", "Codes-Redes", "Comun"))
+import protocolo
+from receptor import ReceptorCliente
+from presencia import Presencia
 
 HOST = "127.0.0.1"
 PORT = 5000
+FORMATO = protocolo.FORMATO_BINARIO  # Frames compactos; si el servidor no lo soporta, se usa JSON
+COMPRESION = None  # "zlib" para comprimir lo que manda el servidor (enlaces lentos)
 
 client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 connected = False
-recv_buffer = ""
+receptor = None  # Lee el socket y arma los frames (JSON o binarios)
+ultimo_id = None  # Último mensaje recibido (para pedir sólo lo perdido al reconectar)
+sala_actual = None  # Sala en la que estamos (se vuelve a ella al reconectar)
+en_linea = Presencia()  # Quién está conectado (frames 'presence' del servidor)
+
+# --- Puente por lotes hacia JavaScript ---
+INTERVALO_LOTE_SEG = 0.05  # Lo que llega en este intervalo va en una sola llamada
+MAX_MENSAJES_POR_LOTE = 2000
+pendientes = queue.SimpleQueue()  # Lotes del hilo receptor (o la excepción que lo cortó)
 
 # Inicializa Eel en la carpeta 'web'
-# Resuelve la ruta absoluta a la carpeta 'web'
-# Esto hace que funcione sin importar desde dónde ejecutes el script
-script_dir = os.path.dirname(os.path.abspath(__file__))
 web_folder = os.path.join(script_dir, 'web')
 
 # Inicializa Eel usando la ruta absoluta
@@ -22,46 +41,86 @@ eel.init(web_folder)
 
 
 def recibir_mensajes():
-    global connected, recv_buffer
+    """Hilo receptor: deja cada lote recibido para 'enviar_lotes_js'."""
+    global connected, ultimo_id, sala_actual
     while connected:
         try:
-            data = client.recv(4096).decode('utf-8')
-            if not data:
-                raise Exception("Servidor desconectado.")
-            
-            recv_buffer += data
-            
-            while "\n" in recv_buffer:
-                message_line, recv_buffer = recv_buffer.split("\n", 1)
-                
-                if not message_line:
-                    continue
-                    
-                try:
-                    msg_data = json.loads(message_line)
-                    # --- CAMBIO CLAVE ---
-                    # En lugar de Tkinter, llama a una función de JavaScript
-                    eel.actualizar_chat_js(msg_data)
-                except json.JSONDecodeError:
-                    print(f"Error decodificando JSON: {message_line}")
+            # Mensajes ya decodificados (JSON o binario, según lo negociado);
+            # los ping del servidor ya los contesta el receptor
+            lote = receptor.recibir()
+            for i, msg_data in enumerate(lote):
+                if msg_data.get("type") == "chat":
+                    ultimo_id = msg_data.get("id", ultimo_id)
+                elif msg_data.get("type") == "room":
+                    sala_actual = msg_data.get("sala")
+                elif msg_data.get("type") == "presence":
+                    # La lista se lleva acá; a JS sólo le llega la cuenta y el aviso
+                    aviso = en_linea.aplicar(msg_data)
+                    lote[i] = {"type": "presence", "total": len(en_linea), "aviso": aviso}
+            if lote:
+                pendientes.put(lote)
 
         except Exception as e:
             print(f"Error en recibir_mensajes: {e}")
-            eel.actualizar_status_js(f"🔴 Desconectado: {e}", "red")
             connected = False
+            pendientes.put(e)  # Se avisa después de entregar lo que ya llegó
             break
 
+
+def enviar_lotes_js():
+    """
+    Hilo puente hacia JavaScript. En vez de una llamada de eel (un mensaje
+    por el websocket) por frame, junta todo lo que llegó durante
+    INTERVALO_LOTE_SEG y lo manda en una sola llamada.
+    """
+    while True:
+        item = pendientes.get()  # Espera al primer lote
+        mensajes = []
+        limite = time.monotonic() + INTERVALO_LOTE_SEG
+        while True:
+            if isinstance(item, Exception):
+                if mensajes:
+                    eel.actualizar_lote_js(mensajes)
+                    mensajes = []
+                eel.actualizar_status_js(f"🔴 Desconectado: {item}", "red")
+                eel.conexion_perdida_js()
+            else:
+                mensajes += item
+            if len(mensajes) >= MAX_MENSAJES_POR_LOTE:
+                break
+            try:
+                item = pendientes.get(timeout=max(0.0, limite - time.monotonic()))
+            except queue.Empty:
+                break
+        if mensajes:
+            # --- CAMBIO CLAVE ---
+            # En lugar de Tkinter, llama a una función de JavaScript (con todo el lote)
+            eel.actualizar_lote_js(mensajes)
+
+
 # Expone esta función a JavaScript
 @eel.expose
 def conectar_py(username):
-    global connected
+    global connected, client, receptor
     if not username:
         eel.mostrar_error_js("Debes ingresar un nombre de usuario.")
         return False
     try:
+        # Socket y receptor nuevos: así también sirve para reconectar
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         client.connect((HOST, PORT))
+        receptor = ReceptorCliente(client)
         connected = True
-        client.sendall(username.encode("utf-8"))
+
+        # Si ya estuvimos conectados, pedimos sólo los mensajes que nos perdimos
+        saludo = {"type": "hello", "username": username, "formato": FORMATO}
+        if COMPRESION:
+            saludo["compresion"] = COMPRESION
+        if ultimo_id:
+            saludo["since_id"] = ultimo_id
+        if sala_actual:
+            saludo["sala"] = sala_actual
+        client.sendall(protocolo.codificar(saludo))
         
         # Iniciar hilo para recibir mensajes
         threading.Thread(target=recibir_mensajes, daemon=True).start()
@@ -82,7 +141,7 @@ def enviar_mensaje_py(msg):
     global connected
     if msg and connected:
         try:
-            client.sendall(msg.encode("utf-8"))
+            client.sendall(protocolo.codificar({"type": "chat", "payload": msg}))
             # Devuelve el mensaje para mostrarlo localmente como "Tú"
             return msg
         except Exception as e:
@@ -91,6 +150,7 @@ def enviar_mensaje_py(msg):
     return None
 
 print("Iniciando cliente web... Abre la ventana.")
+threading.Thread(target=enviar_lotes_js, daemon=True).start()
 # Iniciar la aplicación web
 eel.start('main.html', size=(450, 550), port=8080)
 print("Cliente web cerrado.")
\ No newline at end of file
@@ -1,36 +1,101 @@
 // --- Exponer funciones de JS a Python ---
 
-// Esta función será llamada por Python (desde recibir_mensajes)
-eel.expose(actualizar_chat_js);
-function actualizar_chat_js(msg_data) {
+// --- Dibujo del Chat ---
+//
+// Python junta los mensajes que llegan en un intervalo y los manda en una
+// sola llamada (actualizar_lote_js). Los mensajes nuevos se arman en un
+// DocumentFragment y entran al DOM de una vez. Todo lo que llega del
+// servidor (nombres, mensajes, respuestas de comandos) es texto plano y
+// se pone con textContent, nunca como HTML. El chat guarda como máximo
+// MAX_MENSAJES_CHAT nodos y los 'delete' buscan el nodo en un mapa.
+
+const MAX_MENSAJES_CHAT = 2000;  // Los más viejos se quitan del DOM
+const nodosPorId = new Map();    // ID del mensaje -> nodo <div>
+
+function crear_nodo(id, texto, clase) {
+    const nodo = document.createElement('div');
+    nodo.className = clase ? `chat-message ${clase}` : 'chat-message';
+    if (texto.includes("\n")) {
+        nodo.classList.add('bloque');  // Respuestas de varias líneas (listas, /help)
+    }
+    if (id) {
+        // Usamos el ID del mensaje como ID del elemento HTML (lo usa el CSS)
+        nodo.id = id;
+        nodosPorId.set(id, nodo);
+    }
+    nodo.textContent = texto;
+    return nodo;
+}
+
+function recortar_chat(chatArea) {
+    // Quita los mensajes más viejos (y su entrada en el mapa)
+    let sobran = chatArea.childElementCount - MAX_MENSAJES_CHAT;
+    while (sobran-- > 0) {
+        const viejo = chatArea.firstElementChild;
+        if (viejo.id && nodosPorId.get(viejo.id) === viejo) {
+            nodosPorId.delete(viejo.id);
+        }
+        viejo.remove();
+    }
+}
+
+// Esta función será llamada por Python (una vez por lote de mensajes)
+eel.expose(actualizar_lote_js);
+function actualizar_lote_js(mensajes) {
     const chatArea = document.getElementById('chat-area');
-    let messageHtml = '';
-    const msgType = msg_data.type;
-
-    if (msgType === "chat") {
-        const prefix = msg_data.prefix || "";
-        const payload = msg_data.payload || "";
-        const id = msg_data.id || "msg-unknown";
-        // Usamos el ID del mensaje como ID del elemento HTML
-        messageHtml = `<div class="chat-message" id="${id}">${prefix}${payload}</div>`;
-    } 
-    else if (msgType === "delete") {
-        const idToDelete = msg_data.id;
-        const msgElement = document.getElementById(idToDelete);
-        if (msgElement) {
-            msgElement.innerHTML = ">> Mensaje eliminado por el administrador <<";
-            msgElement.classList.add("deleted");
+    // Sólo se baja al final si el usuario ya estaba ahí (no si está leyendo arriba)
+    const alFinal = chatArea.scrollHeight - chatArea.scrollTop - chatArea.clientHeight < 30;
+    let fragmento = document.createDocumentFragment();
+
+    for (const msg_data of mensajes) {
+        const msgType = msg_data.type;
+
+        if (msgType === "chat") {
+            const prefix = msg_data.prefix || "";
+            const payload = msg_data.payload || "";
+            fragmento.appendChild(crear_nodo(msg_data.id || "msg-unknown", `${prefix}${payload}`));
         }
-        return; // No añadir más HTML
-    } 
-    else if (msgType === "clear") {
-        chatArea.innerHTML = '<div class="chat-message server">📢 El chat fue limpiado por un administrador.</div>';
-        return; // No añadir más HTML
+        else if (msgType === "delete") {
+            // Lo pendiente va primero: el mensaje a borrar puede venir en este lote
+            chatArea.appendChild(fragmento);
+            const msgElement = nodosPorId.get(msg_data.id);
+            if (msgElement) {
+                msgElement.textContent = ">> Mensaje eliminado por el administrador <<";
+                msgElement.classList.remove("bloque");
+                msgElement.classList.add("deleted");
+            }
+        }
+        else if (msgType === "clear") {
+            fragmento = document.createDocumentFragment();
+            nodosPorId.clear();
+            chatArea.replaceChildren(crear_nodo(null, '📢 El chat fue limpiado por un administrador.', 'server'));
+        }
+        else if (msgType === "presence") {
+            // Cuántos hay en línea, y un solo aviso por lote de cambios (no uno por usuario)
+            document.getElementById('roster-count').innerText = `👥 ${msg_data.total} en línea`;
+            for (const linea of (msg_data.aviso || "").split("\n")) {
+                if (linea) {
+                    fragmento.appendChild(crear_nodo(null, linea, 'server'));
+                }
+            }
+        }
+        else if (msgType === "error") {
+            // El servidor rechazó algo (ej. nombre en uso) y va a cerrar la conexión
+            mostrar_error_js(msg_data.payload || "");
+            fragmento.appendChild(crear_nodo(null, `${msg_data.prefix || ""}${msg_data.payload || ""}`, 'server'));
+        }
+    }
+
+    chatArea.appendChild(fragmento);
+    recortar_chat(chatArea);
+    if (alFinal) {
+        chatArea.scrollTop = chatArea.scrollHeight;
     }
+}
 
-    chatArea.innerHTML += messageHtml;
-    // Auto-scroll
-    chatArea.scrollTop = chatArea.scrollHeight;
+// Un solo mensaje (los locales: "Tú:", conexión)
+function actualizar_chat_js(msg_data) {
+    actualizar_lote_js([msg_data]);
 }
 
 eel.expose(actualizar_status_js);
@@ -57,6 +122,14 @@ function conexion_exitosa_js(username) {
     });
 }
 
+eel.expose(conexion_perdida_js);
+function conexion_perdida_js() {
+    // Volver a mostrar el formulario para poder reconectar
+    // (el chat se conserva; el servidor sólo manda lo que nos perdimos)
+    document.getElementById('conn-frame').style.display = 'flex';
+    document.getElementById('conn-button').innerText = 'Reconectar';
+}
+
 
 // --- Lógica de la Interfaz (Clicks de botones) ---
 
@@ -90,12 +163,14 @@ window.onload = function() {
 
         // 1. Si NO es un comando, actualiza la UI local INMEDIATAMENTE.
         if (!msg.startsWith('/')) {
+            const chatArea = document.getElementById('chat-area');
             actualizar_chat_js({
                 type: "chat",
                 id: "local-" + Date.now(), // ID local
                 prefix: "💬 Tú: ",
                 payload: msg
             });
+            chatArea.scrollTop = chatArea.scrollHeight;  // Lo propio siempre se muestra
         }
         
         // 2. Limpia la caja de texto INMEDIATAMENTE.
@@ -0,0 +1,371 @@
+"""
+Benchmark de carga del servidor de chat.
+
+Conecta N clientes sintéticos (saludo + frames JSON, igual que los
+clientes reales), hace que algunos envíen mensajes a una tasa fija y
+mide:
+
+  - throughput (mensajes enviados y entregados por segundo)
+  - latencia de fan-out p50 / p99 / p999 (envío -> recepción)
+  - memoria por conexión y CPU del proceso servidor
+
+Por defecto levanta un servidor headless local en un puerto libre; con
+--host/--port se mide un servidor ya corriendo (sin datos de memoria/CPU
+salvo que se pase --pid). Los resultados se guardan en JSON para
+comparar corridas entre versiones (--comparar).
+
+    python carga.py --clientes 1000 --emisores 20 --tasa 50 --duracion 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+SERVIDOR_DIR = os.path.join(AQUI, "..", "Server")
+sys.path.insert(0, os.path.join(AQUI, "..", "Comun"))
+import protocolo
+
+MARCA = "bench|"  # Prefijo del payload de los mensajes de benchmark
+PING = protocolo.codificar({"type": "ping"}).rstrip(b"\n")  # Heartbeat del servidor
+PONG = protocolo.codificar({"type": "pong"})
+
+
+# --- Utilidades ---
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def subir_limite_descriptores():
+    try:
+        import resource
+        suave, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if suave < duro:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (duro, duro))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return None
+    i = min(len(valores_ordenados) - 1, int(len(valores_ordenados) * p))
+    return valores_ordenados[i]
+
+
+def lanzar_servidor(port, extra_args=()):
+    """Levanta 'servidor_main.py --headless' en un directorio temporal."""
+    carpeta = tempfile.mkdtemp(prefix="bench_chat_")  # Ahí queda su chat_log.txt
+    proceso = subprocess.Popen(
+        [sys.executable, os.path.join(SERVIDOR_DIR, "servidor_main.py"),
+         "--headless", "--silencioso", "--host", "127.0.0.1", "--port", str(port),
+         *extra_args],
+        cwd=carpeta, stdout=subprocess.DEVNULL)
+
+    # Esperar a que acepte conexiones
+    limite = time.time() + 10
+    while time.time() < limite:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proceso
+        except OSError:
+            time.sleep(0.05)
+    proceso.kill()
+    raise RuntimeError("El servidor no arrancó a tiempo.")
+
+
+class MedidorProceso:
+    """Lee memoria (RSS) y CPU de un proceso desde /proc (sólo Linux)."""
+
+    def __init__(self, pid):
+        self.pid = pid
+
+    def rss_bytes(self):
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for linea in f:
+                    if linea.startswith("VmRSS:"):
+                        return int(linea.split()[1]) * 1024
+        except OSError:
+            return None
+
+    def cpu_segundos(self):
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                campos = f.read().rsplit(")", 1)[1].split()
+            # utime y stime son los campos 14 y 15 (aquí 11 y 12)
+            return (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, IndexError, ValueError):
+            return None
+
+
+# --- Cliente Sintético ---
+
+class ClienteSintetico:
+    """
+    Un cliente del chat. Si es 'medidor' decodifica cada frame para medir
+    latencias; si no, sólo cuenta líneas (así el propio benchmark no se
+    vuelve el cuello de botella con miles de conexiones).
+    """
+
+    def __init__(self, nombre, medidor=False):
+        self.nombre = nombre
+        self.medidor = medidor
+        self.reader = None
+        self.writer = None
+        self.recibidos = 0
+        self.latencias_ns = []
+        self.enviados = 0
+
+    async def conectar(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(protocolo.codificar({"type": "hello", "username": self.nombre}))
+        await self.writer.drain()
+
+    async def recibir(self):
+        decoder = protocolo.DecodificadorFrames(1 << 20)
+        try:
+            while True:
+                data = await self.reader.read(1 << 16)
+                if not data:
+                    break
+                if PING in data:
+                    self.writer.write(PONG)  # Si no, el servidor nos cree muertos
+                if not self.medidor:
+                    self.recibidos += data.count(b"\n")
+                    continue
+                ahora = time.monotonic_ns()
+                for frame in decoder.feed(data):
+                    self.recibidos += 1
+                    payload = protocolo.decodificar(frame).get("payload", "")
+                    if payload.startswith(MARCA):
+                        self.latencias_ns.append(ahora - int(payload.split("|", 2)[1]))
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    def enviar(self, texto):
+        self.writer.write(protocolo.codificar({"type": "chat", "payload": texto}))
+        self.enviados += 1
+
+    def cerrar(self):
+        if self.writer:
+            self.writer.close()
+
+
+async def emitir(cliente, tasa, tamano, duracion):
+    """Envía 'tasa' mensajes/s durante 'duracion' segundos (en ticks de 10 ms)."""
+    relleno = "x" * max(0, tamano - 40)
+    inicio = time.monotonic()
+    while True:
+        transcurrido = time.monotonic() - inicio
+        if transcurrido >= duracion:
+            break
+        debidos = int(transcurrido * tasa) - cliente.enviados
+        for _ in range(debidos):
+            cliente.enviar(f"{MARCA}{time.monotonic_ns()}|{relleno}")
+        await cliente.writer.drain()
+        await asyncio.sleep(0.01)
+
+
+# --- Corrida ---
+
+async def esperar_quietud(clientes, intervalo):
+    """Espera hasta que pase 'intervalo' segundos sin que llegue nada nuevo."""
+    anterior = -1
+    while True:
+        total = sum(c.recibidos for c in clientes)
+        if total == anterior:
+            return
+        anterior = total
+        await asyncio.sleep(intervalo)
+
+
+async def correr(args, medidor_proceso):
+    clientes = [ClienteSintetico(f"bench{i}", medidor=i < args.medidores)
+                for i in range(args.clientes)]
+
+    rss_inicial = medidor_proceso.rss_bytes() if medidor_proceso else None
+
+    # Conectar en tandas para no desbordar el backlog de accept()
+    for i in range(0, len(clientes), 500):
+        await asyncio.gather(*(c.conectar(args.host, args.port) for c in clientes[i:i + 500]))
+    receptores = [asyncio.create_task(c.recibir()) for c in clientes]
+    await esperar_quietud(clientes, args.calentamiento)  # Que se asienten los avisos de unión
+
+    rss_conectados = medidor_proceso.rss_bytes() if medidor_proceso else None
+    cpu_inicial = medidor_proceso.cpu_segundos() if medidor_proceso else None
+    recibidos_antes = sum(c.recibidos for c in clientes)
+
+    # Los emisores son los últimos clientes (los medidores son los primeros)
+    emisores = clientes[-args.emisores:] if args.emisores else []
+    inicio = time.monotonic()
+    await asyncio.gather(*(emitir(c, args.tasa, args.tamano, args.duracion) for c in emisores))
+    await asyncio.sleep(args.drenado)  # Dejar que termine de llegar el fan-out
+    duracion_real = time.monotonic() - inicio
+
+    cpu_final = medidor_proceso.cpu_segundos() if medidor_proceso else None
+
+    for c in clientes:
+        c.cerrar()
+    for t in receptores:
+        t.cancel()
+    await asyncio.gather(*receptores, return_exceptions=True)
+
+    enviados = sum(c.enviados for c in clientes)
+    recibidos = sum(c.recibidos for c in clientes) - recibidos_antes
+    latencias = sorted(l for c in clientes for l in c.latencias_ns)
+    esperados_por_medidor = enviados  # Los medidores no emiten: reciben todo
+    medidos = [c for c in clientes if c.medidor]
+
+    ms = lambda ns: round(ns / 1e6, 3) if ns is not None else None
+    resultado = {
+        "etiqueta": args.etiqueta,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "parametros": {
+            "clientes": args.clientes, "emisores": args.emisores, "tasa": args.tasa,
+            "tamano": args.tamano, "duracion": args.duracion, "medidores": args.medidores,
+        },
+        "enviados": enviados,
+        "entregados": recibidos,
+        "envios_por_seg": round(enviados / args.duracion, 1),
+        "entregas_por_seg": round(recibidos / duracion_real, 1),
+        "perdidos_medidores": sum(max(0, esperados_por_medidor - len(c.latencias_ns)) for c in medidos),
+        "latencia_ms": {
+            "p50": ms(percentil(latencias, 0.50)),
+            "p99": ms(percentil(latencias, 0.99)),
+            "p999": ms(percentil(latencias, 0.999)),
+            "max": ms(latencias[-1] if latencias else None),
+        },
+        "memoria_por_conexion_kb": (
+            round((rss_conectados - rss_inicial) / args.clientes / 1024, 2)
+            if rss_inicial and rss_conectados else None),
+        "cpu_servidor_pct": (
+            round((cpu_final - cpu_inicial) / duracion_real * 100, 1)
+            if cpu_inicial is not None and cpu_final is not None else None),
+    }
+    return resultado
+
+
+# --- Reporte y Comparación ---
+
+METRICAS_COMPARABLES = [
+    # (ruta en el resultado, mayor es mejor)
+    (("entregas_por_seg",), True),
+    (("latencia_ms", "p50"), False),
+    (("latencia_ms", "p99"), False),
+    (("latencia_ms", "p999"), False),
+    (("memoria_por_conexion_kb",), False),
+    (("cpu_servidor_pct",), False),
+]
+
+
+def obtener(resultado, ruta):
+    for clave in ruta:
+        resultado = (resultado or {}).get(clave)
+    return resultado
+
+
+def imprimir(resultado):
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+def comparar(actual, base, tolerancia):
+    """Imprime las diferencias contra una corrida anterior; devuelve True si hay regresión."""
+    regresion = False
+    print(f"\n--- Comparación contra '{base.get('etiqueta')}' ({base.get('fecha')}) ---")
+    for ruta, mayor_mejor in METRICAS_COMPARABLES:
+        a, b = obtener(actual, ruta), obtener(base, ruta)
+        if a is None or b is None or b == 0:
+            continue
+        cambio = (a - b) / b
+        peor = cambio < -tolerancia if mayor_mejor else cambio > tolerancia
+        regresion |= peor
+        marca = "  <-- REGRESIÓN" if peor else ""
+        print(f"{'.'.join(ruta):28} {b:>12} -> {a:>12} ({cambio:+.1%}){marca}")
+    return regresion
+
+
+def guardar(resultado, ruta):
+    if not ruta:
+        carpeta = os.path.join(AQUI, "resultados")
+        os.makedirs(carpeta, exist_ok=True)
+        fecha = datetime.now().strftime("%Y%m%d_%H%M%S")
+        ruta = os.path.join(carpeta, f"{fecha}_{resultado['etiqueta']}.json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {ruta}")
+
+
+def agregar_args_conexion(parser):
+    """Argumentos comunes para apuntar a un servidor (o levantar uno local)."""
+    parser.add_argument("--host", default=None,
+                        help="Servidor ya corriendo (si se omite se levanta uno local)")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--pid", type=int, default=None,
+                        help="PID del servidor externo, para medir memoria y CPU")
+    parser.add_argument("--servidor-args", default="--sin-limites",
+                        help="Argumentos extra para el servidor local (por defecto sin límites "
+                             "de tasa, para medir el motor; ej. '--sin-limites --politica desconectar')")
+
+
+def preparar_servidor(args):
+    """Levanta el servidor local si hace falta. Devuelve (proceso, medidor)."""
+    subir_limite_descriptores()
+    proceso = None
+    if args.host is None:
+        args.host = "127.0.0.1"
+        args.port = puerto_libre()
+        proceso = lanzar_servidor(args.port, args.servidor_args.split())
+        args.pid = proceso.pid
+    medidor = MedidorProceso(args.pid) if args.pid and os.path.exists("/proc") else None
+    return proceso, medidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga del servidor de chat")
+    agregar_args_conexion(parser)
+    parser.add_argument("--clientes", type=int, default=200, help="Conexiones totales")
+    parser.add_argument("--emisores", type=int, default=10, help="Cuántas de ellas envían")
+    parser.add_argument("--tasa", type=float, default=20, help="Mensajes/s por emisor")
+    parser.add_argument("--tamano", type=int, default=100, help="Bytes aprox. de cada payload")
+    parser.add_argument("--duracion", type=float, default=10, help="Segundos de envío")
+    parser.add_argument("--medidores", type=int, default=20,
+                        help="Clientes que miden latencia (el resto sólo cuenta)")
+    parser.add_argument("--calentamiento", type=float, default=0.5,
+                        help="Segundos sin tráfico para dar por terminada la conexión inicial")
+    parser.add_argument("--drenado", type=float, default=1.0)
+    parser.add_argument("--etiqueta", default="local", help="Nombre de la corrida (ej. 'asyncio')")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", default=None, help="Resultado anterior para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="Cambio tolerado (0.10 = 10%%)")
+    args = parser.parse_args()
+    args.medidores = min(args.medidores, args.clientes - args.emisores)
+
+    proceso, medidor = preparar_servidor(args)
+    try:
+        resultado = asyncio.run(correr(args, medidor))
+    finally:
+        if proceso:
+            proceso.terminate()
+            proceso.wait()
+
+    imprimir(resultado)
+    guardar(resultado, args.salida)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            if comparar(resultado, json.load(f), args.tolerancia):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
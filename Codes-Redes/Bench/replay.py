@@ -0,0 +1,265 @@
+"""
+Reproduce un chat_log.txt real contra el servidor.
+
+Lee los logs del servidor y convierte sus líneas en eventos:
+
+    [fecha] 🔗 user se ha conectado desde (...)   -> conectar
+    [fecha] 💬 user: msg  /  [ID: x] 💬 user: msg  -> mensaje de chat
+    [fecha] ❌ user (conexión cerrada).            -> desconectar
+
+y los vuelve a ejecutar respetando el orden de cada usuario y los
+huecos entre eventos, en tiempo real o comprimidos N veces (--factor).
+Al final compara la tasa pedida con la lograda y el retraso de cada evento.
+
+    python replay.py ../../chat_log.txt --factor 60 --maximo-hueco 5
+"""
+import argparse
+import asyncio
+import os
+import re
+import time
+from datetime import datetime
+
+import carga
+from carga import protocolo
+
+LOG_POR_DEFECTO = os.path.join(carga.AQUI, "..", "..", "chat_log.txt")
+
+RE_LINEA = re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] (?:\[ID: [^\]]+\] )?(.*)$")
+RE_CONECTAR = re.compile(r"^🔗 (.+?) se ha conectado desde ")
+RE_DESCONECTAR = re.compile(r"^❌ (.+?) \(conexión cerrada\)\.$")
+RE_CHAT = re.compile(r"^💬 (.+?): (.*)$")
+
+NOMBRE_MAX = 32  # Como en Server/config.py
+
+CONECTAR = "conectar"
+CHAT = "chat"
+DESCONECTAR = "desconectar"
+
+
+class Evento:
+    __slots__ = ("t", "tipo", "usuario", "texto", "programado")
+
+    def __init__(self, t, tipo, usuario, texto=None):
+        self.t = t              # Segundos desde el primer evento
+        self.tipo = tipo
+        self.usuario = usuario
+        self.texto = texto
+        self.programado = 0.0   # Momento (monotonic) en que debía ejecutarse
+
+
+# --- Lectura de Logs ---
+
+def parsear_logs(rutas):
+    """Devuelve la lista de eventos (ordenada por tiempo) de uno o más logs."""
+    crudos = []
+    for ruta in rutas:
+        with open(ruta, encoding="utf-8", errors="replace") as f:
+            for linea in f:
+                m = RE_LINEA.match(linea.rstrip("\n"))
+                if not m:
+                    continue
+                fecha = datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S").timestamp()
+                texto = m.group(2)
+
+                if (c := RE_CONECTAR.match(texto)):
+                    crudos.append((fecha, CONECTAR, c.group(1), None))
+                elif (c := RE_DESCONECTAR.match(texto)):
+                    crudos.append((fecha, DESCONECTAR, c.group(1), None))
+                elif (c := RE_CHAT.match(texto)):
+                    crudos.append((fecha, CHAT, c.group(1), c.group(2)))
+
+    # sort es estable: los eventos del mismo segundo conservan su orden
+    crudos.sort(key=lambda e: e[0])
+    if not crudos:
+        return []
+    inicio = crudos[0][0]
+    return [Evento(fecha - inicio, tipo, usuario, texto) for fecha, tipo, usuario, texto in crudos]
+
+
+def comprimir(eventos, factor, maximo_hueco):
+    """
+    Aplica la compresión de tiempo. 'maximo_hueco' (ya comprimido) recorta
+    los silencios largos del log (ej. horas con el servidor apagado).
+    """
+    resultado = []
+    t_anterior_log = 0.0
+    t = 0.0
+    for e in eventos:
+        hueco = (e.t - t_anterior_log) / factor if factor > 0 else 0.0
+        if maximo_hueco is not None:
+            hueco = min(hueco, maximo_hueco)
+        t += hueco
+        t_anterior_log = e.t
+        resultado.append(Evento(t, e.tipo, e.usuario, e.texto))
+    return resultado
+
+
+def nombre_usuario(usuario, copia=1):
+    """
+    Nombre que acepta el servidor (letras, números, '_', '.', '-'; hasta
+    NOMBRE_MAX) para un usuario del log y su número de copia.
+    """
+    sufijo = f"-{copia}" if copia > 1 else ""
+    return re.sub(r"[^\w.-]", "_", usuario)[:NOMBRE_MAX - len(sufijo)] + sufijo
+
+
+def multiplicar(eventos, copias):
+    """
+    Repite la población de usuarios 'copias' veces (user -> user-2, ...),
+    con los nombres ya adaptados a lo que acepta el servidor.
+    """
+    resultado = []
+    for e in eventos:
+        for i in range(max(copias, 1)):
+            resultado.append(Evento(e.t, e.tipo, nombre_usuario(e.usuario, i + 1), e.texto))
+    return resultado
+
+
+# --- Usuarios Reproducidos ---
+
+class UsuarioReplay:
+    """
+    Un usuario del log. Procesa sus eventos en orden con su propia cola,
+    así una conexión lenta no desordena sus mensajes ni frena a los demás.
+    """
+
+    def __init__(self, nombre, host, port, stats):
+        self.nombre = nombre
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.cola = asyncio.Queue()
+        self.writer = None
+        self._lector = None
+
+    async def ejecutar(self):
+        while True:
+            evento = await self.cola.get()
+            if evento is None:
+                break
+            try:
+                await self._aplicar(evento)
+            except (OSError, ConnectionError) as e:
+                self.stats["errores"] += 1
+                print(f"Error con {self.nombre}: {e}")
+                self._cerrar()
+            self.stats["retrasos"].append(time.monotonic() - evento.programado)
+            self.stats["ejecutados"] += 1
+        self._cerrar()
+
+    async def _aplicar(self, evento):
+        if evento.tipo == CONECTAR or (evento.tipo == CHAT and self.writer is None):
+            if self.writer is None:
+                reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                self.writer.write(protocolo.codificar({"type": "hello", "username": self.nombre}))
+                self._lector = asyncio.create_task(self._drenar(reader))
+
+        if evento.tipo == CHAT:
+            self.writer.write(protocolo.codificar({"type": "chat", "payload": evento.texto}))
+            await self.writer.drain()
+            self.stats["mensajes"] += 1
+        elif evento.tipo == DESCONECTAR:
+            self._cerrar()
+
+    async def _drenar(self, reader):
+        """Lee todo lo que manda el servidor (un cliente real no deja de leer)."""
+        try:
+            while (data := await reader.read(1 << 16)):
+                self.stats["bytes_recibidos"] += len(data)
+                if carga.PING in data and self.writer is not None:
+                    self.writer.write(carga.PONG)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    def _cerrar(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self._lector is not None:
+            self._lector.cancel()
+            self._lector = None
+
+
+async def reproducir(eventos, host, port):
+    stats = {"ejecutados": 0, "mensajes": 0, "errores": 0,
+             "bytes_recibidos": 0, "retrasos": []}
+    usuarios = {}
+    tareas = []
+
+    inicio = time.monotonic()
+    for e in eventos:
+        e.programado = inicio + e.t
+        espera = e.programado - time.monotonic()
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+        usuario = usuarios.get(e.usuario)
+        if usuario is None:
+            usuario = usuarios[e.usuario] = UsuarioReplay(e.usuario, host, port, stats)
+            tareas.append(asyncio.create_task(usuario.ejecutar()))
+        usuario.cola.put_nowait(e)
+
+    for usuario in usuarios.values():
+        usuario.cola.put_nowait(None)
+    await asyncio.gather(*tareas)
+
+    stats["duracion"] = time.monotonic() - inicio
+    stats["usuarios"] = len(usuarios)
+    return stats
+
+
+def reportar(eventos, stats):
+    duracion_pedida = eventos[-1].t if eventos else 0.0
+    retrasos = sorted(stats["retrasos"])
+    ms = lambda s: round(s * 1000, 1) if s is not None else None
+
+    pedida = len(eventos) / duracion_pedida if duracion_pedida else None
+    lograda = stats["ejecutados"] / stats["duracion"] if stats["duracion"] else None
+
+    print("\n--- Replay ---")
+    print(f"Usuarios:             {stats['usuarios']}")
+    print(f"Eventos:              {stats['ejecutados']} / {len(eventos)} "
+          f"({stats['mensajes']} mensajes, {stats['errores']} errores)")
+    print(f"Duración pedida:      {duracion_pedida:.2f} s")
+    print(f"Duración real:        {stats['duracion']:.2f} s")
+    if pedida and lograda:
+        print(f"Tasa pedida/lograda:  {pedida:.1f} / {lograda:.1f} eventos/s "
+              f"({lograda / pedida:.1%})")
+    print(f"Retraso p50/p99/max:  {ms(carga.percentil(retrasos, 0.5))} / "
+          f"{ms(carga.percentil(retrasos, 0.99))} / {ms(retrasos[-1] if retrasos else None)} ms")
+    print(f"Bytes recibidos:      {stats['bytes_recibidos']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce un chat_log.txt contra el servidor")
+    parser.add_argument("logs", nargs="*", default=[LOG_POR_DEFECTO],
+                        help="Archivos de log (por defecto el chat_log.txt del repo)")
+    carga.agregar_args_conexion(parser)
+    parser.add_argument("--factor", type=float, default=1.0,
+                        help="Compresión de tiempo (60 = un minuto del log por segundo; 0 = sin esperas)")
+    parser.add_argument("--maximo-hueco", type=float, default=None,
+                        help="Silencio máximo entre eventos, en segundos ya comprimidos")
+    parser.add_argument("--copias", type=int, default=1,
+                        help="Multiplica la población de usuarios del log")
+    args = parser.parse_args()
+
+    eventos = parsear_logs(args.logs)
+    if not eventos:
+        print("No se encontraron eventos en los logs.")
+        return
+    eventos = multiplicar(comprimir(eventos, args.factor, args.maximo_hueco), args.copias)
+
+    proceso, _ = carga.preparar_servidor(args)
+    try:
+        stats = asyncio.run(reproducir(eventos, args.host, args.port))
+    finally:
+        if proceso:
+            proceso.terminate()
+            proceso.wait()
+
+    reportar(eventos, stats)
+
+
+if __name__ == "__main__":
+    main()
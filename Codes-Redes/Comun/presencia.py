@@ -0,0 +1,66 @@
+"""
+Lista local de usuarios conectados, compartida por los dos clientes.
+
+El servidor no anuncia cada entrada y salida con texto: manda frames
+'presence' (ver servidor_core, sección Presencia):
+
+    {"type": "presence", "snapshot": true, "online": [...]}   foto completa
+    {"type": "presence", "online": [...], "offline": [...]}   cambios
+
+La foto llega al conectarse (si es grande, partida: las partes que
+siguen llevan "sigue": true y la completan) y después sólo cambios, ya
+juntados por el servidor. Aplicarlos es idempotente, así que un cambio
+repetido no rompe la cuenta.
+"""
+
+MAX_NOMBRES_AVISO = 5  # Más que esto en un aviso se resume como "y N más"
+
+
+class Presencia:
+    """Quién está en línea, según los frames 'presence' recibidos."""
+
+    def __init__(self):
+        self._usuarios = {}  # {nombre en minúsculas: nombre}
+
+    def __len__(self):
+        return len(self._usuarios)
+
+    def __contains__(self, username):
+        return username.casefold() in self._usuarios
+
+    def nombres(self):
+        return sorted(self._usuarios.values(), key=str.casefold)
+
+    def aplicar(self, msg_data):
+        """
+        Aplica un frame 'presence' y devuelve el texto del aviso para el
+        chat (una línea por frame, no una por usuario), o None si no hay
+        nada que mostrar.
+        """
+        foto = msg_data.get("snapshot")
+        if foto and not msg_data.get("sigue"):
+            self._usuarios.clear()
+        entraron = [u for u in msg_data.get("online", ()) if u not in self]
+        salieron = [u for u in msg_data.get("offline", ()) if u in self]
+        for username in entraron:
+            self._usuarios[username.casefold()] = username
+        for username in salieron:
+            del self._usuarios[username.casefold()]
+
+        if foto:
+            return None  # La foto inicial sólo actualiza la cuenta
+        lineas = []
+        if entraron:
+            lineas.append(f"🔗 {_resumen(entraron)} {'se conectó' if len(entraron) == 1 else 'se conectaron'}.")
+        if salieron:
+            lineas.append(f"❌ {_resumen(salieron)} {'se desconectó' if len(salieron) == 1 else 'se desconectaron'}.")
+        return "\n".join(lineas) or None
+
+
+def _resumen(nombres):
+    """'ana, beto y carlos', o 'ana, beto, ... y 120 más'."""
+    if len(nombres) > MAX_NOMBRES_AVISO:
+        return f"{', '.join(nombres[:MAX_NOMBRES_AVISO])} y {len(nombres) - MAX_NOMBRES_AVISO} más"
+    if len(nombres) == 1:
+        return nombres[0]
+    return f"{', '.join(nombres[:-1])} y {nombres[-1]}"
@@ -0,0 +1,418 @@
+"""
+Protocolo del chat, compartido por el servidor y los dos clientes.
+
+Cada frame es un objeto JSON en una línea terminada en '\\n', en ambos
+sentidos. El cliente abre la sesión con:
+
+    {"type": "hello", "username": "..."}
+
+y luego envía {"type": "chat", "payload": "..."}. Por compatibilidad,
+una línea que no sea JSON se trata como texto plano.
+
+Formato binario (opcional): si el saludo trae "formato": "binario", el
+servidor le responde a ese cliente con frames binarios compactos (ver
+'codificar_binario'); lo que manda el cliente sigue siendo JSON.
+
+Compresión (opcional): si el saludo trae "compresion": "zlib", todo lo
+que manda el servidor después de la confirmación es un único stream
+zlib (un contexto por conexión), vaciado con Z_SYNC_FLUSH en cada envío.
+"""
+import json
+import struct
+import zlib
+
+MAX_FRAME = 64 * 1024  # Tamaño máximo de un frame (bytes, sin el '\n')
+
+
+class DecodificadorFrames:
+    """
+    Decodificador incremental de frames delimitados por '\\n'.
+
+    Se le pasan los bytes tal como llegan de recv() y devuelve todos los
+    frames completos que contienen, sin importar cómo los haya partido o
+    juntado TCP. Los bytes de un frame incompleto se guardan para la
+    siguiente llamada.
+
+    Los frames más largos que 'max_frame' se descartan (sin guardarlos en
+    memoria) y se cuentan en 'descartados'; quien lo use decide si eso
+    amerita cerrar la conexión.
+    """
+
+    def __init__(self, max_frame=MAX_FRAME):
+        self.max_frame = max_frame
+        self.descartados = 0
+        self._buffer = bytearray()
+        self._descartando = False  # Saltando el resto de un frame gigante
+
+    def feed(self, data):
+        """Agrega bytes y devuelve la lista de frames completos (bytes)."""
+        return self._extraer(data, bytes)
+
+    def pendientes(self):
+        """Bytes guardados de un frame todavía incompleto."""
+        return len(self._buffer)
+
+    def mensajes(self, data):
+        """
+        Como 'feed', pero devuelve los frames ya decodificados (diccionarios).
+        Cada línea se decodifica directo del buffer, sin copiarla antes.
+        """
+        return self._extraer(data, decodificar)
+
+    def _extraer(self, data, convertir):
+        """Agrega 'data' (bytes o memoryview) y aplica 'convertir' a cada frame completo."""
+        self._buffer += data
+        frames = []
+        inicio = 0
+
+        vista = memoryview(self._buffer)
+        try:
+            while True:
+                fin = self._buffer.find(b"\n", inicio)
+                if fin == -1:
+                    break
+                if self._descartando:
+                    self._descartando = False
+                elif fin - inicio > self.max_frame:
+                    self.descartados += 1
+                elif fin > inicio:
+                    frames.append(convertir(vista[inicio:fin]))
+                inicio = fin + 1
+        finally:
+            vista.release()  # Con la vista abierta el buffer no se puede recortar
+
+        # Un solo recorte por llamada: el costo es lineal en lo recibido
+        del self._buffer[:inicio]
+
+        if len(self._buffer) > self.max_frame:
+            # El frame sigue creciendo sin '\n': se tira hasta el próximo
+            self._buffer.clear()
+            if not self._descartando:
+                self._descartando = True
+                self.descartados += 1
+
+        return frames
+
+
+def codificar(data_dict):
+    """Convierte un diccionario en un frame listo para enviar."""
+    return (json.dumps(data_dict) + "\n").encode("utf-8")
+
+
+class Frame:
+    """
+    Mensaje saliente serializado una sola vez (por formato).
+
+    Los bytes son inmutables, así que el mismo objeto se encola tal cual
+    en la cola de cada destinatario: un broadcast a miles de clientes
+    cuesta un solo json.dumps y ninguna copia. Cada formato se serializa
+    recién cuando algún destinatario lo necesita.
+    """
+
+    __slots__ = ("campos", "_datos", "_binario")
+
+    def __init__(self, data_dict):
+        self.campos = data_dict
+        self._datos = None
+        self._binario = None
+
+    @property
+    def datos(self):
+        """Bytes en JSON + '\\n'."""
+        if self._datos is None:
+            self._datos = codificar(self.campos)
+        return self._datos
+
+    def binario(self, tabla):
+        """(bytes en formato binario, índice de prefijo usado o 0)."""
+        if self._binario is None:
+            self._binario = codificar_binario(self.campos, tabla)
+        return self._binario
+
+    @property
+    def tipo(self):
+        return self.campos.get("type")
+
+    def __len__(self):
+        return len(self.datos)
+
+
+def decodificar(frame):
+    """
+    Convierte un frame recibido en un diccionario.
+    Una línea que no es JSON se interpreta como un mensaje de chat.
+    """
+    texto = str(frame, "utf-8", "replace").rstrip("\r")  # bytes, bytearray o memoryview
+    if texto.startswith("{"):
+        try:
+            data = json.loads(texto)
+            if isinstance(data, dict):
+                return data
+        except json.JSONDecodeError:
+            pass
+    return {"type": "chat", "payload": texto}
+
+
+# --- Formato Binario ---
+#
+# Cada frame es:  | u32 largo | u8 tipo | cuerpo |   (el largo cuenta tipo + cuerpo)
+#
+#   CHAT       u8 flags | id | u32 prefijo | payload (utf-8, el resto)
+#   DELETE     u8 flags | id
+#   CLEAR, PING, PONG     sin cuerpo
+#   PREFIJO    u32 índice | texto (utf-8): define un prefijo para esta conexión
+#   JSON       el frame en JSON (cualquier otro tipo, o campos extra)
+#
+# El id es un u64 si es un ID de 16 hex (los normales), o u16 largo + texto
+# si no (flag ID_TEXTO). Los prefijos ("💬 usuario: ") se repiten en cada
+# mensaje: se internan en una tabla y viajan como un índice; a cada conexión
+# se le manda la definición (PREFIJO) la primera vez que se usa.
+
+FORMATO_JSON = "json"
+FORMATO_BINARIO = "binario"
+COMPRESION_ZLIB = "zlib"
+
+B_JSON = 0
+B_CHAT = 1
+B_DELETE = 2
+B_CLEAR = 3
+B_PING = 4
+B_PONG = 5
+B_PREFIJO = 6
+
+FLAG_ID_TEXTO = 0x01
+FLAG_PRIVADO = 0x02
+
+_CABECERA = struct.Struct(">IB")
+_U64 = struct.Struct(">Q")
+_U32 = struct.Struct(">I")
+_U16 = struct.Struct(">H")
+
+_TIPOS_SIMPLES = {"clear": B_CLEAR, "ping": B_PING, "pong": B_PONG}
+_NOMBRES_SIMPLES = {v: k for k, v in _TIPOS_SIMPLES.items()}
+_CAMPOS_CHAT = {"type", "id", "prefix", "payload", "privado"}
+
+
+class TablaPrefijos:
+    """Tabla de prefijos internados (texto <-> índice). El 0 es 'sin prefijo'."""
+
+    def __init__(self, maximo=1 << 20):
+        self.maximo = maximo
+        self._indices = {}
+        self._definiciones = [None]  # Frame PREFIJO ya armado, por índice
+
+    def indice(self, texto):
+        """Índice del prefijo (lo interna si es nuevo). None si la tabla está llena."""
+        if not texto:
+            return 0
+        indice = self._indices.get(texto)
+        if indice is None:
+            if len(self._definiciones) > self.maximo:
+                return None
+            indice = len(self._definiciones)
+            self._indices[texto] = indice
+            cuerpo = _U32.pack(indice) + texto.encode("utf-8")
+            self._definiciones.append(_CABECERA.pack(len(cuerpo) + 1, B_PREFIJO) + cuerpo)
+        return indice
+
+    def definicion(self, indice):
+        return self._definiciones[indice]
+
+
+def _codificar_id(msg_id):
+    """(flags, bytes) de un ID de mensaje."""
+    if isinstance(msg_id, str) and len(msg_id) == 16:
+        try:
+            return 0, _U64.pack(int(msg_id, 16))
+        except ValueError:
+            pass
+    texto = str(msg_id).encode("utf-8")
+    return FLAG_ID_TEXTO, _U16.pack(len(texto)) + texto
+
+
+def _frame_binario(tipo, cuerpo=b""):
+    return _CABECERA.pack(len(cuerpo) + 1, tipo) + cuerpo
+
+
+def codificar_binario(data_dict, tabla):
+    """Convierte un diccionario en un frame binario. Devuelve (bytes, índice de prefijo)."""
+    tipo = data_dict.get("type")
+
+    if tipo == "chat" and data_dict.keys() <= _CAMPOS_CHAT:
+        indice = tabla.indice(data_dict.get("prefix", ""))
+        if indice is not None:
+            flags, id_bytes = _codificar_id(data_dict.get("id", ""))
+            if data_dict.get("privado"):
+                flags |= FLAG_PRIVADO
+            cuerpo = (bytes((flags,)) + id_bytes + _U32.pack(indice) +
+                      str(data_dict.get("payload", "")).encode("utf-8"))
+            return _frame_binario(B_CHAT, cuerpo), indice
+
+    elif tipo == "delete" and data_dict.keys() <= {"type", "id"}:
+        flags, id_bytes = _codificar_id(data_dict.get("id", ""))
+        return _frame_binario(B_DELETE, bytes((flags,)) + id_bytes), 0
+
+    elif tipo in _TIPOS_SIMPLES and len(data_dict) == 1:
+        return _frame_binario(_TIPOS_SIMPLES[tipo]), 0
+
+    cuerpo = json.dumps(data_dict).encode("utf-8")
+    return _frame_binario(B_JSON, cuerpo), 0
+
+
+class DecodificadorBinario:
+    """
+    Decodificador incremental del formato binario (lado del cliente).
+    Guarda la tabla de prefijos que le va mandando el servidor.
+    Los frames más largos que 'max_frame' se saltean y se cuentan.
+    """
+
+    def __init__(self, max_frame=MAX_FRAME):
+        self.max_frame = max_frame
+        self.descartados = 0
+        self.prefijos = {0: ""}
+        self._buffer = bytearray()
+        self._saltar = 0  # Bytes que faltan tirar de un frame gigante
+
+    def pendientes(self):
+        return len(self._buffer)
+
+    def mensajes(self, data):
+        """Agrega bytes y devuelve los mensajes completos, ya decodificados."""
+        buffer = self._buffer
+        if self._saltar:
+            tirados = min(self._saltar, len(data))
+            self._saltar -= tirados
+            data = data[tirados:]
+        buffer += data
+
+        mensajes = []
+        inicio = 0
+        while len(buffer) - inicio >= _CABECERA.size:
+            largo, tipo = _CABECERA.unpack_from(buffer, inicio)
+            if largo > self.max_frame:
+                self.descartados += 1
+                disponibles = len(buffer) - inicio - 4
+                if disponibles >= largo:
+                    inicio += 4 + largo
+                    continue
+                self._saltar = largo - disponibles
+                inicio = len(buffer)
+                break
+            if len(buffer) - inicio < 4 + largo:
+                break
+            cuerpo = memoryview(buffer)[inicio + 5:inicio + 4 + largo]
+            mensaje = self._decodificar(tipo, cuerpo)
+            cuerpo.release()
+            if mensaje is not None:
+                mensajes.append(mensaje)
+            inicio += 4 + largo
+
+        del buffer[:inicio]
+        return mensajes
+
+    def _leer_id(self, flags, cuerpo, pos):
+        if flags & FLAG_ID_TEXTO:
+            (largo,) = _U16.unpack_from(cuerpo, pos)
+            pos += 2
+            return str(cuerpo[pos:pos + largo], "utf-8"), pos + largo
+        return f"{_U64.unpack_from(cuerpo, pos)[0]:016x}", pos + 8
+
+    def _decodificar(self, tipo, cuerpo):
+        if tipo == B_CHAT:
+            flags = cuerpo[0]
+            msg_id, pos = self._leer_id(flags, cuerpo, 1)
+            (indice,) = _U32.unpack_from(cuerpo, pos)
+            mensaje = {
+                "type": "chat",
+                "id": msg_id,
+                "prefix": self.prefijos.get(indice, ""),
+                "payload": str(cuerpo[pos + 4:], "utf-8", "replace"),
+            }
+            if flags & FLAG_PRIVADO:
+                mensaje["privado"] = True
+            return mensaje
+        if tipo == B_DELETE:
+            msg_id, _ = self._leer_id(cuerpo[0], cuerpo, 1)
+            return {"type": "delete", "id": msg_id}
+        if tipo == B_PREFIJO:
+            (indice,) = _U32.unpack_from(cuerpo, 0)
+            self.prefijos[indice] = str(cuerpo[4:], "utf-8", "replace")
+            return None
+        if tipo in _NOMBRES_SIMPLES:
+            return {"type": _NOMBRES_SIMPLES[tipo]}
+        if tipo == B_JSON:
+            return json.loads(bytes(cuerpo))
+        return None  # Tipo desconocido (de una versión más nueva): se ignora
+
+
+def confirmacion(formato, compresion=None):
+    """
+    Lo primero que manda el servidor (siempre en JSON y sin comprimir) a un
+    cliente que pidió algo distinto de JSON plano; lo que sigue ya va en
+    el formato (y la compresión) confirmados.
+    """
+    data = {"type": "hello", "formato": formato}
+    if compresion:
+        data["compresion"] = compresion
+    return codificar(data)
+
+
+class DecodificadorNegociado:
+    """
+    Decoder del lado del cliente. Mira sólo el primer frame que manda el
+    servidor: si es la confirmación del saludo, todo lo que sigue se
+    decodifica en ese formato (y se descomprime si corresponde); si no,
+    como JSON. Un servidor que no conoce estas opciones nunca las
+    confirma, así que el cliente sigue en JSON sin enterarse.
+    """
+
+    def __init__(self, max_frame=MAX_FRAME):
+        self.max_frame = max_frame
+        self._inicio = bytearray()  # Bytes recibidos antes de decidir el formato
+        self._decoder = None
+        self._zlib = None
+
+        # --- Contadores (sólo con compresión) ---
+        self.bytes_comprimidos = 0
+        self.bytes_descomprimidos = 0
+
+    @property
+    def formato(self):
+        return FORMATO_BINARIO if isinstance(self._decoder, DecodificadorBinario) else FORMATO_JSON
+
+    @property
+    def compresion(self):
+        return COMPRESION_ZLIB if self._zlib is not None else None
+
+    @property
+    def descartados(self):
+        return self._decoder.descartados if self._decoder is not None else 0
+
+    def mensajes(self, data):
+        """Agrega bytes y devuelve los mensajes completos, ya decodificados."""
+        if self._decoder is None:
+            return self._negociar(data)
+        if self._zlib is not None:
+            self.bytes_comprimidos += len(data)
+            data = self._zlib.decompress(data)
+            self.bytes_descomprimidos += len(data)
+        return self._decoder.mensajes(data)
+
+    def _negociar(self, data):
+        self._inicio += data
+        fin = self._inicio.find(b"\n")
+        if fin == -1 and len(self._inicio) <= self.max_frame:
+            return []
+
+        datos = bytes(self._inicio)
+        self._inicio.clear()
+        primero = decodificar(datos[:fin]) if fin != -1 else {}
+        if primero.get("type") == "hello":
+            binario = primero.get("formato") == FORMATO_BINARIO
+            self._decoder = DecodificadorBinario(self.max_frame) if binario else DecodificadorFrames(self.max_frame)
+            if primero.get("compresion") == COMPRESION_ZLIB:
+                self._zlib = zlib.decompressobj()
+            return self.mensajes(datos[fin + 1:])
+
+        self._decoder = DecodificadorFrames(self.max_frame)
+        return self._decoder.mensajes(datos)
@@ -0,0 +1,88 @@
+"""
+Recepción del lado del cliente, compartida por los dos clientes.
+
+Lee el socket con recv_into() sobre un buffer propio (sin crear un
+objeto bytes por cada recv), le pasa al decoder una vista de lo leído y
+devuelve los mensajes completos en lotes: todo lo que llegó en un recv
+sale junto, así quien lo muestre puede dibujar un lote de una vez.
+
+El tamaño del buffer se adapta: si un recv lo llena (llegó una ráfaga o
+el historial al conectar) se duplica, y si varias lecturas seguidas usan
+poco se achica. Un catch-up de miles de mensajes se lee en pocas
+llamadas y con costo lineal; una conexión tranquila usa poca memoria.
+
+Los 'ping' del servidor (heartbeat) se contestan acá mismo y no llegan
+al cliente.
+"""
+# ### Importar nuestros módulos ###
+import protocolo
+
+RECV_MINIMO = 16 * 1024
+RECV_MAXIMO = 1024 * 1024
+LECTURAS_PARA_ACHICAR = 8  # Lecturas seguidas con menos de 1/4 del buffer
+
+PONG = protocolo.codificar({"type": "pong"})
+
+
+class ReceptorCliente:
+    """Recibe del socket 'sock' y devuelve lotes de mensajes ya decodificados."""
+
+    def __init__(self, sock, decoder=None, minimo=RECV_MINIMO, maximo=RECV_MAXIMO):
+        self.sock = sock
+        self.decoder = decoder or protocolo.DecodificadorNegociado()
+        self.minimo = minimo
+        self.maximo = maximo
+        self._buffer = bytearray(minimo)
+        self._chicas = 0  # Lecturas seguidas que usaron poco del buffer
+
+        # --- Contadores ---
+        self.lecturas = 0
+        self.bytes_recibidos = 0
+        self.mensajes_recibidos = 0
+
+    def recibir(self):
+        """
+        Bloquea hasta el próximo recv y devuelve la lista de mensajes
+        completos que trajo (puede estar vacía si llegó un frame a medias).
+        Lanza ConnectionError si el servidor cerró la conexión.
+        """
+        n = self.sock.recv_into(self._buffer)
+        if not n:
+            raise ConnectionError("Servidor desconectado.")
+        self.lecturas += 1
+        self.bytes_recibidos += n
+
+        with memoryview(self._buffer) as vista, vista[:n] as datos:
+            mensajes = self.decoder.mensajes(datos)
+        self._ajustar(n)
+
+        lote = []
+        for mensaje in mensajes:
+            if mensaje.get("type") == "ping":
+                # Heartbeat del servidor: contestamos para que no nos desconecte
+                self.sock.sendall(PONG)
+            else:
+                lote.append(mensaje)
+        self.mensajes_recibidos += len(lote)
+        return lote
+
+    def lotes(self):
+        """Generador de lotes (no vacíos) hasta que se cierre la conexión."""
+        while True:
+            lote = self.recibir()
+            if lote:
+                yield lote
+
+    def _ajustar(self, n):
+        """Agranda o achica el buffer según cuánto trajo el último recv."""
+        tamano = len(self._buffer)
+        if n == tamano and tamano < self.maximo:
+            self._buffer = bytearray(min(tamano * 2, self.maximo))
+            self._chicas = 0
+        elif n < tamano // 4 and tamano > self.minimo:
+            self._chicas += 1
+            if self._chicas >= LECTURAS_PARA_ACHICAR:
+                self._buffer = bytearray(max(tamano // 2, self.minimo))
+                self._chicas = 0
+        else:
+            self._chicas = 0
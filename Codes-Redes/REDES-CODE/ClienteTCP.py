@@ -3,14 +3,36 @@ import threading
 import tkinter as tk
 from tkinter import scrolledtext
 from tkinter import ttk, messagebox
-import json 
+import os
+import queue
+import sys
+
+# El protocolo es compartido con el servidor ('Codes-Redes/Comun')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Comun"))
+import protocolo
+from receptor import ReceptorCliente
+from presencia import Presencia
+from collections import deque
 
 HOST = "127.0.0.1"
 PORT = 5000
+FORMATO = protocolo.FORMATO_BINARIO # Frames compactos; si el servidor no lo soporta, se usa JSON
+COMPRESION = None # "zlib" para comprimir lo que manda el servidor (enlaces lentos)
 
 client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 connected = False
-recv_buffer = "" # Buffer para mensajes JSON
+receptor = None # Lee el socket y arma los frames (JSON o binarios) que llegan partidos
+ultimo_id = None # Último mensaje recibido (para pedir sólo lo perdido al reconectar)
+sala_actual = None # Sala en la que estamos (se vuelve a ella al reconectar)
+usuario_actual = None
+en_linea = Presencia() # Quién está conectado (frames 'presence' del servidor)
+
+# --- Dibujo por lotes ---
+MAX_LINEAS_CHAT = 5000 # Scrollback: las líneas más viejas se borran
+INTERVALO_DIBUJO_MS = 50 # Cada cuánto se aplican los mensajes recibidos
+MAX_MENSAJES_POR_TICK = 2000 # Así una ráfaga enorme no congela la ventana
+pendientes = queue.SimpleQueue() # Lotes del hilo receptor para el hilo de Tkinter
+ids_en_pantalla = deque() # IDs (tags) en el chat, del más viejo al más nuevo
 
 # --- COLORES DARK MODE ---
 BG_COLOR = "#2d2d2d"
@@ -25,18 +47,30 @@ RED_STATUS = "#F44336"
 ENTRY_CURSOR = "#ffffff" 
 
 def conectar():
-    global connected
+    global connected, client, receptor, usuario_actual
     username = entry_user.get()
     if not username:
         messagebox.showerror("Error", "Debes ingresar un nombre de usuario.")
         return
 
     try:
+        # Socket y receptor nuevos: así también sirve para reconectar
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         client.connect((HOST, PORT))
+        receptor = ReceptorCliente(client)
         connected = True
         
-        client.sendall(username.encode("utf-8"))
+        # Si ya estuvimos conectados, pedimos sólo los mensajes que nos perdimos
+        saludo = {"type": "hello", "username": username, "formato": FORMATO}
+        if COMPRESION:
+            saludo["compresion"] = COMPRESION
+        if ultimo_id:
+            saludo["since_id"] = ultimo_id
+        if sala_actual:
+            saludo["sala"] = sala_actual
+        client.sendall(protocolo.codificar(saludo))
         
+        usuario_actual = username
         status_label.config(text=f"🟢 Conectado como: {username}", foreground=GREEN_STATUS)
         
         entry_msg.config(state=tk.NORMAL)
@@ -44,53 +78,94 @@ def conectar():
         entry_user.config(state=tk.DISABLED)
         btn_conectar.config(state=tk.DISABLED)
         
-        chat_area.config(state=tk.NORMAL)
-        chat_area.insert(tk.END, f"✅ Conectado a {HOST}:{PORT} como {username}\n")
-        chat_area.config(state=tk.DISABLED)
-        chat_area.see(tk.END)
+        escribir_lineas([(f"✅ Conectado a {HOST}:{PORT} como {username}\n", ())])
         
         threading.Thread(target=recibir_mensajes, daemon=True).start()
         
     except Exception as e:
         messagebox.showerror("Error de Conexión", f"No se pudo conectar al servidor: {e}")
-        chat_area.config(state=tk.NORMAL)
-        chat_area.insert(tk.END, f"❌ Error al conectar: {e}\n")
-        chat_area.config(state=tk.DISABLED)
+        escribir_lineas([(f"❌ Error al conectar: {e}\n", ())])
+
+# --- Dibujo del Chat (siempre en el hilo de Tkinter) ---
+#
+# El hilo receptor no toca la GUI: deja cada lote de mensajes en una cola
+# y el main loop de Tk la vacía cada INTERVALO_DIBUJO_MS, aplicando todo
+# lo pendiente con un solo insert (texto y tag de cada mensaje juntos) y
+# un solo 'see'. El área de chat guarda como máximo MAX_LINEAS_CHAT
+# líneas: las más viejas se borran junto con sus tags.
+
+def escribir_lineas(partes):
+    """
+    Agrega al final del chat una lista de (texto, tags) con un solo
+    insert, recorta el scrollback y baja al final si ya estábamos ahí.
+    """
+    if not partes:
+        return
+    al_final = chat_area.yview()[1] >= 0.999
+    argumentos = []
+    for texto, tags in partes:
+        argumentos += (texto, tags)
+    chat_area.config(state=tk.NORMAL)
+    chat_area.insert(tk.END, *argumentos)
+    recortar_chat()
+    chat_area.config(state=tk.DISABLED)
+    if al_final:
         chat_area.see(tk.END)
 
-def process_message_data(msg_data):
-    """Procesa un objeto de mensaje JSON ya decodificado."""
-    global chat_area
-    msg_type = msg_data.get("type")
 
+def recortar_chat():
+    """Borra las líneas más viejas que MAX_LINEAS_CHAT (y los tags que quedan vacíos)."""
+    lineas = int(chat_area.index("end-1c").split(".")[0])
+    if lineas <= MAX_LINEAS_CHAT:
+        return
+    chat_area.delete("1.0", f"{lineas - MAX_LINEAS_CHAT + 1}.0")
+    # Los tags de mensajes borrados siguen existiendo (y ocupando memoria) hasta borrarlos
+    while ids_en_pantalla and not chat_area.tag_ranges(ids_en_pantalla[0]):
+        chat_area.tag_delete(ids_en_pantalla.popleft())
+
+
+def aplicar_pendientes():
+    """Tick del main loop: aplica los mensajes que dejó el hilo receptor."""
+    partes = []  # Mensajes de chat seguidos: se insertan juntos
+    aplicados = 0
     try:
-        if msg_type == "chat":
-            msg_id = msg_data.get("id", "unknown")
-            prefix = msg_data.get("prefix", "")
-            payload = msg_data.get("payload", "")
-            full_msg = f"{prefix}{payload}\n"
-            
-            chat_area.config(state=tk.NORMAL)
-            
-            # --- Lógica de Tags para Eliminar ---
-            # 1. Obtenemos el índice DE INICIO (antes de insertar)
-            start_index = chat_area.index(tk.END + "-1c")
-            
-            # 2. Insertamos el texto
-            chat_area.insert(tk.END, full_msg)
-            
-            # 3. Obtenemos el índice DE FIN (después de insertar)
-            end_index = chat_area.index(tk.END + "-1c")
-            
-            # 4. Añadimos un 'tag' al texto que acabamos de insertar
-            #    El nombre del tag es el propio ID del mensaje
-            chat_area.tag_add(msg_id, start_index, end_index)
-            # --- Fin de Lógica de Tags ---
+        while aplicados < MAX_MENSAJES_POR_TICK:
+            try:
+                lote = pendientes.get_nowait()
+            except queue.Empty:
+                break
+            for msg_data in lote:
+                aplicados += 1
+                if msg_data.get("type") == "chat":
+                    partes.append(parte_chat(msg_data))
+                else:
+                    # delete, clear, etc. se aplican en orden, después de lo anterior
+                    escribir_lineas(partes)
+                    partes = []
+                    process_message_data(msg_data)
+        escribir_lineas(partes)
+    except Exception as e:
+        print(f"Error dibujando mensajes: {e}")
+    # Si quedó algo (una ráfaga), se sigue enseguida; si no, en el próximo tick
+    ventana.after(1 if not pendientes.empty() else INTERVALO_DIBUJO_MS, aplicar_pendientes)
 
-            chat_area.config(state=tk.DISABLED)
-            chat_area.see(tk.END)
 
-        elif msg_type == "delete":
+def parte_chat(msg_data):
+    """(texto, tags) de un mensaje de chat. El tag es el propio ID (para poder eliminarlo)."""
+    global ultimo_id
+    msg_id = msg_data.get("id", "unknown")
+    ultimo_id = msg_id
+    ids_en_pantalla.append(msg_id)
+    return f"{msg_data.get('prefix', '')}{msg_data.get('payload', '')}\n", (msg_id,)
+
+
+def process_message_data(msg_data):
+    """Procesa un objeto de mensaje JSON ya decodificado (que no es de chat)."""
+    global sala_actual
+    msg_type = msg_data.get("type")
+
+    try:
+        if msg_type == "delete":
             id_to_delete = msg_data.get("id")
             if not id_to_delete:
                 return
@@ -99,10 +174,10 @@ def process_message_data(msg_data):
             tag_ranges = chat_area.tag_ranges(id_to_delete)
             
             if tag_ranges:
-                # tag_ranges nos da (start, end)
-                start, end = tag_ranges
+                # tag_ranges nos da (start, end) por cada tramo con el tag
+                start, end = tag_ranges[0], tag_ranges[-1]
                 chat_area.config(state=tk.NORMAL)
-                # Reemplazar el contenido
+                # Reemplazar el contenido (el texto nuevo ya no lleva el tag)
                 chat_area.delete(start, end)
                 chat_area.insert(start, ">> Mensaje eliminado por el administrador <<\n")
                 chat_area.config(state=tk.DISABLED)
@@ -112,66 +187,69 @@ def process_message_data(msg_data):
             chat_area.delete('1.0', tk.END)
             chat_area.insert(tk.END, "📢 El chat fue limpiado por un administrador.\n")
             chat_area.config(state=tk.DISABLED)
+            for msg_id in ids_en_pantalla:
+                chat_area.tag_delete(msg_id)
+            ids_en_pantalla.clear()
+
+        elif msg_type == "room":
+            sala_actual = msg_data.get("sala")
+
+        elif msg_type == "presence":
+            aviso = en_linea.aplicar(msg_data)
+            if aviso:
+                escribir_lineas([(aviso + "\n", ())])
+            if connected:
+                status_label.config(text=f"🟢 Conectado como: {usuario_actual} · {len(en_linea)} en línea")
+
+        elif msg_type == "error":
+            # El servidor rechazó algo (ej. nombre en uso) y va a cerrar la conexión
+            escribir_lineas([(f"{msg_data.get('prefix', '')}{msg_data.get('payload', '')}\n", ())])
+
+        elif msg_type == "_desconectado":
+            # Aviso del hilo receptor: la conexión se cayó
+            status_label.config(text="🔴 Desconectado", foreground=RED_STATUS)
+            entry_msg.config(state=tk.DISABLED)
+            btn_enviar.config(state=tk.DISABLED)
+            btn_conectar.config(state=tk.NORMAL, text="Reconectar")
+            entry_user.config(state=tk.NORMAL)  # Por si el nombre fue rechazado (ej. 'nombre_en_uso')
             
     except Exception as e:
         print(f"Error procesando mensaje: {e}")
 
 
 def recibir_mensajes():
-    global connected, recv_buffer
+    global connected
     while connected:
         try:
-            # Recibimos datos en el buffer
-            data = client.recv(4096).decode('utf-8')
-            if not data:
-                raise Exception("Servidor desconectado.")
-            
-            recv_buffer += data
-            
-            # Procesamos todos los mensajes completos (terminados en \n)
-            # que tengamos en el buffer
-            while "\n" in recv_buffer:
-                # Separamos el primer mensaje del resto
-                message_line, recv_buffer = recv_buffer.split("\n", 1)
-                
-                if not message_line:
-                    continue
-                    
-                # Intentamos decodificar el JSON
-                try:
-                    msg_data = json.loads(message_line)
-                    # Llamamos a la función que procesa la lógica
-                    process_message_data(msg_data)
-                except json.JSONDecodeError:
-                    print(f"Error decodificando JSON, datos corruptos: {message_line}")
+            # El receptor nos devuelve todos los mensajes completos que
+            # trajo el recv (ya decodificados) y guarda el resto para el
+            # próximo; los ping del servidor ya los contesta él.
+            # El lote entero se deja para el hilo de Tkinter.
+            pendientes.put(receptor.recibir())
 
         except Exception as e:
             # Si hay un error, salimos del bucle
             print(f"Error en recibir_mensajes: {e}")
-            status_label.config(text="🔴 Desconectado", fg=RED_STATUS)
-            entry_msg.config(state=tk.DISABLED)
-            btn_enviar.config(state=tk.DISABLED)
             connected = False
+            pendientes.put([{"type": "_desconectado"}])
             break # Salir del bucle while
 
 def enviar(event=None):
     msg = entry_msg.get()
     if msg and connected:
-        # El cliente NO envía JSON, solo texto plano.
-        # El servidor se encarga de envolverlo en JSON.
+        # El cliente envía un frame JSON con el texto crudo.
+        # El servidor se encarga de ponerle ID y prefijo.
         
-        # PERO, sí mostramos el "Tú: " localmente.
+        # Sí mostramos el "Tú: " localmente.
         # Para esto, necesitamos crear un ID local y usar el tag
         # por si queremos borrar nuestros propios mensajes (aunque no es el caso)
         # Simplificación: El cliente solo envía el texto crudo.
         
         # Añadir "Tú: " al chat localmente
-        chat_area.config(state=tk.NORMAL)
-        chat_area.insert(tk.END, f"💬 Tú: {msg}\n")
-        chat_area.config(state=tk.DISABLED)
-        chat_area.see(tk.END)
+        escribir_lineas([(f"💬 Tú: {msg}\n", ())])
+        chat_area.see(tk.END) # Lo propio siempre se muestra
         
-        client.sendall(msg.encode("utf-8"))
+        client.sendall(protocolo.codificar({"type": "chat", "payload": msg}))
         entry_msg.delete(0, tk.END)
         
 def al_cerrar():
@@ -252,5 +330,6 @@ btn_enviar.pack(side=tk.LEFT, padx=5)
 
 ventana.bind('<Return>', enviar)
 ventana.protocol("WM_DELETE_WINDOW", al_cerrar)
+ventana.after(INTERVALO_DIBUJO_MS, aplicar_pendientes)
 
 ventana.mainloop()
\ No newline at end of file
@@ -0,0 +1,242 @@
+"""
+Almacén persistente de mensajes (SQLite en modo WAL).
+
+A diferencia de 'chat_log.txt' (texto para humanos), acá los mensajes
+quedan indexados y se pueden consultar:
+
+  - por ID: es la clave primaria (rowid). Como los IDs son snowflake y
+    crecen con el tiempo, ordenar por ID es ordenar por fecha, y la
+    paginación es por clave ("los N anteriores a tal ID"): cada página
+    cuesta lo mismo aunque haya millones de mensajes antes.
+  - por sala y por autor: índices (sala, id) y (autor, id).
+  - por texto: índice de texto completo FTS5 (si el SQLite lo trae; si
+    no, se busca con LIKE).
+
+Se escribe igual que el log: el event loop sólo encola y un hilo
+escritor guarda en lotes (una transacción por lote). Las consultas se
+hacen en otros hilos con conexiones de sólo lectura (WAL permite leer
+mientras se escribe), así nunca frenan al event loop.
+"""
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ### Importar nuestros módulos ###
+import config
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS mensajes (
+    id      INTEGER PRIMARY KEY,  -- ID snowflake como entero
+    sala    TEXT,                 -- NULL = mensaje global (ej. del admin)
+    autor   TEXT NOT NULL COLLATE NOCASE,
+    prefijo TEXT NOT NULL,
+    texto   TEXT NOT NULL,
+    borrado INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_mensajes_sala ON mensajes (sala, id);
+CREATE INDEX IF NOT EXISTS idx_mensajes_autor ON mensajes (autor, id);
+"""
+
+_ESQUEMA_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS mensajes_fts
+    USING fts5 (texto, content='mensajes', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS mensajes_fts_insertar AFTER INSERT ON mensajes BEGIN
+    INSERT INTO mensajes_fts (rowid, texto) VALUES (new.id, new.texto);
+END;
+"""
+
+_INSERTAR = ("INSERT OR IGNORE INTO mensajes (id, sala, autor, prefijo, texto) "
+             "VALUES (?, ?, ?, ?, ?)")
+_BORRAR = "UPDATE mensajes SET borrado = 1 WHERE id = ?"
+_SIN_TOPE = (1 << 63) - 1  # El mayor INTEGER de SQLite (sin 'antes_de')
+
+
+class AlmacenMensajes:
+    """Guarda mensajes en segundo plano y responde consultas indexadas."""
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or config.ALMACEN_DB
+        self.fts = False  # Si hay búsqueda de texto completo (FTS5)
+        self._cola = queue.SimpleQueue()
+        self._hilo = None
+        self._local = threading.local()  # Una conexión de lectura por hilo
+        self._lectores = None  # Hilos para las consultas
+
+        # --- Contadores ---
+        self.encolados = 0
+        self.descartados = 0
+        self.guardados = 0
+        self.lotes = 0
+        self.errores = 0
+
+    # --- API para el event loop (no bloquea) ---
+
+    def guardar(self, msg_id, sala, autor, prefijo, texto):
+        """Encola un mensaje (ID entero; sala None = global). No bloquea nunca."""
+        if self._cola.qsize() >= config.ALMACEN_MAX_PENDIENTES:
+            self.descartados += 1
+            return
+        self.encolados += 1
+        self._cola.put((_INSERTAR, (msg_id, sala, autor, prefijo, texto)))
+
+    def marcar_borrado(self, msg_id):
+        self._cola.put((_BORRAR, (msg_id,)))
+
+    def pendientes(self):
+        return self._cola.qsize()
+
+    def estadisticas(self):
+        return {
+            "encolados": self.encolados,
+            "guardados": self.guardados,
+            "pendientes": self.pendientes(),
+            "descartados": self.descartados,
+            "lotes": self.lotes,
+            "errores": self.errores,
+        }
+
+    # --- Ciclo de vida ---
+
+    def iniciar(self):
+        """Crea el esquema (si hace falta) y arranca el hilo escritor."""
+        if self._hilo is not None:
+            return
+        conexion = self._conectar_escritura()
+        self._lectores = ThreadPoolExecutor(config.ALMACEN_LECTORES,
+                                            thread_name_prefix="lector-almacen")
+        self._hilo = threading.Thread(target=self._bucle, args=(conexion,),
+                                      name="escritor-almacen", daemon=True)
+        self._hilo.start()
+
+    def cerrar(self):
+        """Guarda lo pendiente y detiene el hilo escritor."""
+        if self._hilo is None:
+            return
+        self._lectores.shutdown(wait=False)
+        self._cola.put(None)
+        self._hilo.join(timeout=5)
+        self._hilo = None
+
+    def _conectar_escritura(self):
+        conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=NORMAL")  # Con WAL: seguro ante caídas del proceso
+        conexion.executescript(_ESQUEMA)
+        try:
+            conexion.executescript(_ESQUEMA_FTS)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False  # SQLite sin FTS5: '/buscar' usa LIKE
+        conexion.commit()
+        return conexion
+
+    # --- Hilo escritor ---
+
+    def _bucle(self, conexion):
+        seguir = True
+        while seguir:
+            lote = [self._cola.get()]
+            limite = time.monotonic() + config.ALMACEN_BATCH_SEGUNDOS
+            while len(lote) < config.ALMACEN_BATCH and time.monotonic() < limite:
+                try:
+                    lote.append(self._cola.get(timeout=max(0.0, limite - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            if None in lote:
+                seguir = False
+                lote = [op for op in lote if op is not None]
+                # Lo que quedó en la cola también se guarda antes de cerrar
+                while True:
+                    try:
+                        op = self._cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    if op is not None:
+                        lote.append(op)
+
+            if lote:
+                self._escribir_lote(conexion, lote)
+        conexion.close()
+
+    def _escribir_lote(self, conexion, lote):
+        try:
+            with conexion:  # Una sola transacción (y un solo fsync del WAL) por lote
+                for sql, parametros in lote:
+                    conexion.execute(sql, parametros)
+            self.guardados += sum(1 for sql, _ in lote if sql is _INSERTAR)
+            self.lotes += 1
+        except sqlite3.Error as e:
+            self.errores += 1
+            print(f"Error guardando mensajes: {e}")
+
+    # --- Consultas ---
+
+    async def consultar(self, consulta, *args):
+        """Corre 'consulta' (ej. self.ultimos) en un hilo lector y espera el resultado."""
+        return await asyncio.get_running_loop().run_in_executor(self._lectores, consulta, *args)
+
+    # Lo que sigue corre en los hilos lectores, nunca en el del event loop
+
+    def _lector(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(f"file:{self.ruta}?mode=ro", uri=True)
+            self._local.conexion = conexion
+        return conexion
+
+    def ultimos(self, sala, cantidad, antes_de=None):
+        """
+        Los 'cantidad' mensajes más recientes de la sala (y los globales),
+        anteriores al ID 'antes_de' si se pasa (paginación por clave: cada
+        página cuesta lo mismo sin importar cuántas haya antes).
+        Devuelve filas (id, sala, prefijo, texto) de la más vieja a la más nueva.
+        """
+        tope = antes_de or _SIN_TOPE
+        filas = self._lector().execute(
+            "SELECT id, sala, prefijo, texto FROM ("
+            "  SELECT * FROM (SELECT id, sala, prefijo, texto FROM mensajes"
+            "                 WHERE sala = ? AND id < ? AND borrado = 0"
+            "                 ORDER BY id DESC LIMIT ?)"
+            "  UNION ALL"
+            "  SELECT * FROM (SELECT id, sala, prefijo, texto FROM mensajes"
+            "                 WHERE sala IS NULL AND id < ? AND borrado = 0"
+            "                 ORDER BY id DESC LIMIT ?)"
+            ") ORDER BY id DESC LIMIT ?",
+            (sala, tope, cantidad, tope, cantidad, cantidad)).fetchall()
+        filas.reverse()
+        return filas
+
+    def buscar(self, texto, cantidad, antes_de=None, autor=None):
+        """
+        Los 'cantidad' mensajes más recientes (de todas las salas) que
+        contienen las palabras de 'texto' y/o son de 'autor', anteriores a
+        'antes_de' si se pasa.
+        Devuelve filas (id, sala, prefijo, texto), de la más nueva a la más vieja.
+        """
+        tope = antes_de or _SIN_TOPE
+        condiciones, parametros = ["m.borrado = 0"], []
+        tabla, orden = "mensajes m", "m.id"
+        if autor:
+            condiciones.append("m.autor = ?")  # Usa el índice (autor, id)
+            parametros.append(autor)
+        if texto and self.fts:
+            # Cada palabra como frase literal: el texto del usuario no es sintaxis FTS
+            # Se ordena por el rowid de FTS5: recorre su índice de atrás para
+            # adelante y corta en el LIMIT (no junta todas las coincidencias)
+            tabla, orden = "mensajes_fts f JOIN mensajes m ON m.id = f.rowid", "f.rowid"
+            condiciones.append("mensajes_fts MATCH ?")
+            parametros.append(" ".join('"' + p.replace('"', '""') + '"' for p in texto.split()))
+        elif texto:
+            condiciones.append("m.texto LIKE ? ESCAPE '\\'")
+            parametros.append("%" + texto.replace("\\", "\\\\").replace("%", "\\%")
+                              .replace("_", "\\_") + "%")
+        condiciones.append(f"{orden} < ?")
+        parametros += [tope, cantidad]
+        return self._lector().execute(
+            f"SELECT m.id, m.sala, m.prefijo, m.texto FROM {tabla}"
+            f" WHERE {' AND '.join(condiciones)} ORDER BY {orden} DESC LIMIT ?",
+            parametros).fetchall()
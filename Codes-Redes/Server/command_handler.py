@@ -1,7 +1,34 @@
-import json
-import uuid
+"""
+Comandos del chat ('/algo ...').
+
+Cada comando es una función registrada con el decorador '@comando', que
+la agrega a COMANDOS (de ahí sale también /help):
+
+    @comando("/salas", ayuda="Lista las salas abiertas.", limite=2, rafaga=5)
+    def cmd_salas(sesion, args, servidor):
+        ...
+
+  - 'limite' y 'rafaga': límite de tasa propio del comando, por usuario
+    (comandos por segundo), además del límite general de mensajes.
+  - Si la función es 'async def', corre como tarea aparte: el event loop
+    sigue atendiendo mientras espera (ej. una consulta al almacén).
+
+Las respuestas son texto plano (los clientes las muestran como texto,
+nunca como HTML), con saltos de línea para las listas.
+
+Todo se ejecuta dentro del event loop del servidor, así que no necesita locks.
+"""
+import asyncio
+from datetime import datetime
 
-def enviar_mensaje_privado(conn, mensaje_payload):
+import config
+import ids
+import protocolo
+import metricas
+from limites import CuboTokens
+from salas import Salas
+
+def enviar_mensaje_privado(sesion, mensaje_payload, servidor):
     """
     Envía un mensaje privado (como un comando) al cliente 
     usando el protocolo JSON.
@@ -10,51 +37,234 @@ def enviar_mensaje_privado(conn, mensaje_payload):
         # Creamos un paquete JSON, igual que en el servidor principal
         data_to_send = {
             "type": "chat",
-            "id": "cmd_" + str(uuid.uuid4())[:4], # ID único para el comando
+            "id": servidor.ids.siguiente(), # ID único para el comando
             "prefix": "", # El payload ya lo incluye todo
             "payload": mensaje_payload
         }
         
-        mensaje_json = json.dumps(data_to_send) + "\n"
-        conn.sendall(mensaje_json.encode("utf-8"))
+        sesion.enviar(protocolo.Frame(data_to_send))
         
     except Exception as e:
         print(f"Error enviando mensaje privado JSON: {e}")
 
-def procesar_comando(conn, username, msg, clientes, lock):
+def _separar_opciones(partes):
     """
-    Procesa un comando recibido de un cliente.
+    Saca de la lista de palabras las opciones 'antes:<id>' y '@usuario'.
+    Devuelve (palabras restantes, id entero o None, usuario o None); el
+    id es False si vino pero no es válido.
     """
-    
-    comando = msg.split(' ')[0]
-    
-    # --- Comando /help ---
-    if comando == "/help":
-        respuesta = """
---- Comandos Disponibles ---
-/help          Muestra esta ayuda.
-/usuarios      Muestra los usuarios conectados.
---------------------------------
-"""
-        # (Importante) Usamos <pre> para que el HTML respete los saltos de línea
-        respuesta_html = f"<pre>{respuesta}</pre>"
-        enviar_mensaje_privado(conn, respuesta_html)
-
-    # --- Comando /usuarios ---
-    elif comando == "/usuarios":
-        lista_usuarios = []
-        with lock:
-            lista_usuarios = list(clientes.values())
-            
-        respuesta = f"📢 Servidor: Usuarios conectados ({len(lista_usuarios)}):\n"
-        for i, user in enumerate(lista_usuarios):
-            respuesta += f"  {i+1}. {user}\n"
-        
-        # (Importante) Usamos <pre> para que el HTML respete los saltos de línea
-        respuesta_html = f"<pre>{respuesta}</pre>"
-        enviar_mensaje_privado(conn, respuesta_html)
-        
-    # --- Comando Desconocido ---
+    restantes, antes_de, autor = [], None, None
+    for palabra in partes:
+        if palabra.startswith("antes:"):
+            antes_de = ids.a_int(palabra[6:]) or False
+        elif palabra.startswith("@") and len(palabra) > 1:
+            autor = palabra[1:]
+        else:
+            restantes.append(palabra)
+    return restantes, antes_de, autor
+
+
+def _lineas_almacen(filas, con_sala=False):
+    """Filas (id, sala, prefijo, texto) del almacén como texto, una por línea."""
+    lineas = []
+    for msg_id, sala, prefijo, texto in filas:
+        fecha = datetime.fromtimestamp(ids.hora(msg_id)).strftime("%d/%m %H:%M")
+        donde = f"#{sala or '*'} " if con_sala else ""
+        lineas.append(f"  [{fecha}] {donde}{prefijo}{texto}")
+    return "\n".join(lineas)
+
+
+def _responder_consulta(sesion, servidor, titulo, filas, cantidad, siguiente, con_sala=False):
+    """Arma la respuesta de /historial o /buscar con el aviso de la página siguiente."""
+    if filas is None:
+        enviar_mensaje_privado(sesion, "📢 Servidor: No se pudo consultar el historial.", servidor)
+        return
+    if not filas:
+        enviar_mensaje_privado(sesion, f"📢 Servidor: {titulo}: sin resultados.", servidor)
+        return
+    respuesta = f"📢 Servidor: {titulo} ({len(filas)}):\n" + _lineas_almacen(filas, con_sala)
+    if len(filas) == cantidad:
+        mas_viejo = min(fila[0] for fila in filas)
+        respuesta += f"\n  Más antiguos: {siguiente} antes:{mas_viejo:016x}"
+    enviar_mensaje_privado(sesion, respuesta, servidor)
+
+
+# --- Registro de Comandos ---
+
+COMANDOS = {}  # {"/nombre": Comando}, en el orden en que se registran
+
+
+class Comando:
+    """Un comando registrado."""
+
+    __slots__ = ("nombre", "funcion", "uso", "ayuda", "limite", "rafaga", "asincrono")
+
+    def __init__(self, nombre, funcion, uso, ayuda, limite, rafaga):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.uso = uso
+        self.ayuda = ayuda
+        self.limite = limite
+        self.rafaga = rafaga
+        self.asincrono = asyncio.iscoroutinefunction(funcion)
+
+
+def comando(nombre, uso="", ayuda="", limite=0, rafaga=1):
+    """Decorador: registra la función como el comando 'nombre'."""
+    def registrar(funcion):
+        COMANDOS[nombre] = Comando(nombre, funcion, uso, ayuda, limite, rafaga)
+        return funcion
+    return registrar
+
+
+def _espera_comando(sesion, cmd):
+    """Segundos que le faltan a la sesión para poder usar 'cmd' (0 = ya puede)."""
+    if not cmd.limite or not config.LIMITES_COMANDOS:
+        return 0.0
+    cubo = sesion.limites_comandos.get(cmd.nombre)
+    if cubo is None:
+        cubo = sesion.limites_comandos[cmd.nombre] = CuboTokens(cmd.limite, cmd.rafaga)
+    espera = cubo.espera()
+    if espera <= 0:
+        cubo.consumir()
+    return espera
+
+
+def procesar_comando(sesion, msg, servidor):
+    """Busca el comando en el registro y lo ejecuta (o lo lanza, si es async)."""
+    partes = msg.split(None, 1)
+    nombre = partes[0]
+    args = partes[1] if len(partes) > 1 else ""
+
+    cmd = COMANDOS.get(nombre)
+    if cmd is None:
+        respuesta = f"📢 Servidor: Comando '{nombre}' no reconocido. Escribe /help."
+        enviar_mensaje_privado(sesion, respuesta, servidor)
+        return
+
+    espera = _espera_comando(sesion, cmd)
+    if espera > 0:
+        enviar_mensaje_privado(sesion, f"📢 Servidor: Demasiados {nombre} seguidos; espera {espera:.1f} s.", servidor)
+        return
+
+    if cmd.asincrono:
+        servidor.lanzar(cmd.funcion(sesion, args, servidor))
+    else:
+        cmd.funcion(sesion, args, servidor)
+
+
+# --- Comandos ---
+
+@comando("/help", ayuda="Muestra esta ayuda.")
+def cmd_help(sesion, args, servidor):
+    lineas = ["--- Comandos Disponibles ---"]
+    for cmd in COMANDOS.values():
+        firma = f"{cmd.nombre} {cmd.uso}".strip()
+        if len(firma) < 15:
+            lineas.append(f"{firma:<15}{cmd.ayuda}")
+        else:
+            lineas += [firma, f"{'':<15}{cmd.ayuda}"]
+    lineas.append("--------------------------------")
+    enviar_mensaje_privado(sesion, "\n".join(lineas), servidor)
+
+
+@comando("/usuarios", uso="[prefijo] [página]",
+         ayuda="Usuarios conectados (en todos los nodos), por página.", limite=2, rafaga=5)
+def cmd_usuarios(sesion, args, servidor):
+    filtro, pagina = "", 1
+    for palabra in args.split():
+        if palabra.isdigit():
+            pagina = max(1, int(palabra))
+        else:
+            filtro = palabra
+
+    por_pagina = config.USUARIOS_PAGINA
+    desde = (pagina - 1) * por_pagina
+    total, nombres = servidor.usuarios.pagina(desde, por_pagina, filtro)
+
+    titulo = f"Usuarios que empiezan con '{filtro}'" if filtro else "Usuarios conectados"
+    lineas = [f"📢 Servidor: {titulo} ({total}):"]
+    lineas += [f"  {desde + i + 1}. {nombre}" for i, nombre in enumerate(nombres)]
+    paginas = max(1, -(-total // por_pagina))
+    if paginas > 1:
+        siguiente = f" — siguiente: /usuarios {filtro + ' ' if filtro else ''}{pagina + 1}" if pagina < paginas else ""
+        lineas.append(f"  Página {pagina} de {paginas}{siguiente}")
+    enviar_mensaje_privado(sesion, "\n".join(lineas), servidor)
+
+
+@comando("/sala", uso="[nombre]", ayuda="Muestra tu sala, o cambia a otra (se crea si no existe).")
+def cmd_sala(sesion, args, servidor):
+    partes = args.split()
+    if not partes:
+        miembros = [s.username for s in sesion.sala.miembros]
+        lineas = [f"📢 Servidor: Estás en la sala '{sesion.sala.nombre}' ({len(miembros)}):"]
+        lineas += [f"  {i+1}. {user}" for i, user in enumerate(miembros)]
+        enviar_mensaje_privado(sesion, "\n".join(lineas), servidor)
+    elif not Salas.nombre_valido(partes[0]):
+        enviar_mensaje_privado(sesion, "📢 Servidor: Nombre de sala inválido (letras, números, '-' o '_', máx. 32).", servidor)
+    elif partes[0] == sesion.sala.nombre:
+        enviar_mensaje_privado(sesion, f"📢 Servidor: Ya estás en la sala '{partes[0]}'.", servidor)
     else:
-        respuesta = f"📢 Servidor: Comando '{comando}' no reconocido. Escribe /help."
-        enviar_mensaje_privado(conn, respuesta)
\ No newline at end of file
+        servidor.cambiar_sala(sesion, partes[0])
+
+
+@comando("/salas", ayuda="Lista las salas abiertas.", limite=2, rafaga=5)
+def cmd_salas(sesion, args, servidor):
+    lineas = [f"📢 Servidor: Salas abiertas ({len(servidor.salas)}):"]
+    lineas += [f"  {sala.nombre} ({len(sala)} usuarios)" for sala in servidor.salas]
+    enviar_mensaje_privado(sesion, "\n".join(lineas), servidor)
+
+
+@comando("/msg", uso="<usuario> <texto>", ayuda="Mensaje privado (sólo lo ve ese usuario).")
+def cmd_msg(sesion, args, servidor):
+    partes = args.split(None, 1)
+    if len(partes) < 2 or not partes[1].strip():
+        enviar_mensaje_privado(sesion, "📢 Servidor: Uso: /msg <usuario> <texto>", servidor)
+    elif not servidor.mensaje_directo(sesion, partes[0], partes[1]):
+        enviar_mensaje_privado(sesion, f"📢 Servidor: El usuario '{partes[0]}' no está conectado.", servidor)
+
+
+@comando("/stats", ayuda="Métricas del servidor.", limite=1, rafaga=3)
+def cmd_stats(sesion, args, servidor):
+    respuesta = "📢 Servidor: Métricas\n" + metricas.texto_legible(*servidor.estadisticas())
+    enviar_mensaje_privado(sesion, respuesta, servidor)
+
+
+# --- Historial en Disco (se responden desde el almacén, en un hilo aparte) ---
+
+@comando("/historial", uso="[n] [antes:<id>]",
+         ayuda="Los últimos n mensajes de tu sala (guardados en disco).", limite=2, rafaga=5)
+async def cmd_historial(sesion, args, servidor):
+    if servidor.almacen is None:
+        enviar_mensaje_privado(sesion, "📢 Servidor: El historial en disco está desactivado.", servidor)
+        return
+    partes, antes_de, _ = _separar_opciones(args.split())
+    if antes_de is False or (partes and not partes[0].isdigit()):
+        enviar_mensaje_privado(sesion, "📢 Servidor: Uso: /historial [n] [antes:<id>]", servidor)
+        return
+    cantidad = int(partes[0]) if partes else config.HISTORIAL_PAGINA
+    cantidad = max(1, min(cantidad, config.HISTORIAL_PAGINA_MAX))
+    sala = sesion.sala.nombre
+
+    filas = await servidor.consultar_almacen(servidor.almacen.ultimos, sala, cantidad, antes_de)
+    _responder_consulta(sesion, servidor, f"Historial de '{sala}'", filas, cantidad,
+                        f"/historial {cantidad}")
+
+
+@comando("/buscar", uso="[@usuario] <texto> [antes:<id>]",
+         ayuda="Busca mensajes en todas las salas.", limite=1, rafaga=3)
+async def cmd_buscar(sesion, args, servidor):
+    if servidor.almacen is None:
+        enviar_mensaje_privado(sesion, "📢 Servidor: El historial en disco está desactivado.", servidor)
+        return
+    partes, antes_de, autor = _separar_opciones(args.split())
+    texto = " ".join(partes)
+    if antes_de is False or not (texto or autor):
+        enviar_mensaje_privado(sesion, "📢 Servidor: Uso: /buscar [@usuario] <texto> [antes:<id>]", servidor)
+        return
+    cantidad = config.HISTORIAL_PAGINA
+    busqueda = " ".join(([f"@{autor}"] if autor else []) + partes)
+
+    filas = await servidor.consultar_almacen(servidor.almacen.buscar, texto, cantidad, antes_de, autor)
+    _responder_consulta(sesion, servidor, f"Resultados de '{busqueda}'", filas, cantidad,
+                        f"/buscar {busqueda}", con_sala=True)
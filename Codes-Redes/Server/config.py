@@ -4,6 +4,30 @@ PORT = 5000
 
 # --- Configuración de Log ---
 LOG_FILE = "chat_log.txt"
+LOG_BATCH_LINEAS = 512         # Máximo de líneas por escritura
+LOG_BATCH_SEGUNDOS = 0.2       # Espera máxima para juntar un lote
+LOG_MAX_PENDIENTES = 100000    # Líneas en cola antes de empezar a descartar
+LOG_FSYNC = "nunca"            # "nunca", "lote" o "intervalo"
+LOG_FSYNC_SEGUNDOS = 1.0       # Para LOG_FSYNC = "intervalo"
+LOG_ROTAR = None               # None, "tamano" o "diaria"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Para LOG_ROTAR = "tamano"
+
+# --- Almacén Persistente de Mensajes (SQLite) ---
+ALMACEN_DB = "chat_mensajes.db"  # None = sin almacén (/historial y /buscar apagados)
+ALMACEN_BATCH = 1000             # Máximo de mensajes por transacción
+ALMACEN_BATCH_SEGUNDOS = 0.2     # Espera máxima para juntar un lote
+ALMACEN_MAX_PENDIENTES = 100000  # Mensajes en cola antes de empezar a descartar
+ALMACEN_LECTORES = 2             # Hilos que responden consultas
+HISTORIAL_PAGINA = 20            # Mensajes por página de /historial y /buscar
+HISTORIAL_PAGINA_MAX = 200
+
+# --- Comandos ---
+LIMITES_COMANDOS = True  # Límite de tasa propio de cada comando (ver command_handler)
+USUARIOS_PAGINA = 50     # Nombres por página de /usuarios
+
+# --- Presencia (quién está conectado) ---
+PRESENCIA_INTERVALO = 0.5     # Los cambios se juntan y se mandan en un solo frame por intervalo
+PRESENCIA_MAX_NOMBRES = 400  # Nombres por frame: 400 x (NOMBRE_MAX x 4 bytes + 4) entra en el MAX_FRAME de los clientes
 
 # --- Colores Dark Mode ---
 BG_COLOR = "#2d2d2d"
@@ -15,4 +39,62 @@ BTN_FG = "#ffffff"
 BTN_ACTIVE = "#6a6a6a"
 GREEN_STATUS = "#4CAF50"
 RED_STATUS = "#F44336"
-ENTRY_CURSOR = "#ffffff"
\ No newline at end of file
+ENTRY_CURSOR = "#ffffff"
+
+# --- Consola de la GUI del Servidor ---
+GUI_INTERVALO_MS = 100     # Cada cuánto se vuelcan los eventos a la pantalla
+GUI_MAX_LINEAS = 2000      # Líneas que se conservan en la consola (scrollback)
+GUI_MUESTREO = 1           # Mostrar 1 de cada N eventos (1 = todos)
+
+# --- Configuración del Motor (asyncio) ---
+BACKLOG = 4096          # Conexiones pendientes en la cola de accept()
+RECV_SIZE = 64 * 1024   # Bytes leídos por llamada a read() (caben muchos frames)
+MAX_FRAME = 16 * 1024   # Tamaño máximo de un frame entrante (bytes)
+
+# --- Colas de Salida por Cliente ---
+COLA_MAX_MENSAJES = 1000      # Mensajes pendientes por cliente
+COLA_MAX_BYTES = 1024 * 1024  # Bytes pendientes por cliente
+# Qué hacer con un cliente lento cuando su cola se llena:
+#   "descartar_antiguos", "desconectar" o "coalescer"
+POLITICA_DESBORDE = "descartar_antiguos"
+
+# --- Límites de Tasa y Admisión (0 = sin límite) ---
+LIMITE_MENSAJES_SEG = 10       # Frames por segundo por conexión
+LIMITE_MENSAJES_RAFAGA = 30    # Ráfaga permitida por conexión
+LIMITE_SALA_SEG = 500          # Frames por segundo por sala (sumando a todos)
+LIMITE_SALA_RAFAGA = 1000
+MAX_CONEXIONES = 20000         # Conexiones simultáneas
+MAX_BYTES_EN_VUELO = 256 * 1024 * 1024  # Bytes encolados para enviar (todas las sesiones)
+
+# --- Compresión (sólo para los clientes que la piden en el saludo) ---
+COMPRESION_NIVEL = 6     # 1 (rápido) a 9 (más chico)
+COMPRESION_MEMORIA = 8   # memLevel de zlib (1-9): memoria del contexto de cada conexión
+
+# --- Heartbeats y Conexiones Inactivas ---
+HEARTBEAT_SEG = 30          # Sin recibir nada en este tiempo, se manda un 'ping'
+TIMEOUT_INACTIVO = 90       # Sin recibir nada (ni el 'pong'), se desconecta (0 = nunca)
+RUEDA_RESOLUCION = 1.0      # Segundos por ranura de la rueda de temporizadores
+TCP_KEEPALIVE_IDLE = 60     # Keepalive del kernel: segundos sin tráfico antes de sondear
+TCP_KEEPALIVE_INTERVALO = 10
+TCP_KEEPALIVE_SONDEOS = 5
+
+# --- Métricas ---
+METRICAS_HOST = "127.0.0.1"  # Sólo local; Prometheus o curl desde la misma máquina
+METRICAS_PORT = 9100         # GET /metrics (Prometheus) y /stats (JSON); 0 = apagado
+
+# --- IDs de Mensaje ---
+NODO_ID = 0  # 0-1023; distinto en cada servidor si se corren varios
+
+# --- Sharding (varios procesos/nodos unidos por un relay) ---
+RELAY_HOST = "127.0.0.1"
+RELAY_PORT = 5001
+RELAY_MAX_FRAME = 1024 * 1024  # Un evento del relay puede llevar la lista de usuarios
+RELAY_COLA_MAX_BYTES = 16 * 1024 * 1024  # Pendiente hacia un nodo (o el hub); al superarlo se corta
+
+# --- Salas ---
+NOMBRE_MAX = 32  # Largo máximo del nombre de usuario
+SALA_POR_DEFECTO = "general"
+SALAS_INACTIVAS_MAX = 100  # Salas vacías cuyo historial se guarda (por si alguien vuelve)
+
+# --- Historial en Memoria ---
+HISTORIAL_MAX = 500  # Mensajes recientes (por sala) que recibe un cliente al entrar
@@ -0,0 +1,68 @@
+"""
+Historial reciente de mensajes en memoria.
+
+Guarda los últimos frames de chat ya serializados (los mismos objetos
+'protocolo.Frame' que se enviaron), así ponerse al día al conectarse no
+cuesta ningún json.dumps extra. Como los IDs son crecientes, reanudar
+con 'since_id' sólo recorre los mensajes que el cliente se perdió.
+"""
+from collections import deque
+
+# ### Importar nuestros módulos ###
+import config
+import ids
+
+
+class HistorialMensajes:
+    """Ring buffer acotado de frames de chat, con búsqueda por ID."""
+
+    def __init__(self, maximo=config.HISTORIAL_MAX):
+        self._frames = deque(maxlen=maximo)  # [(id como entero, Frame)]
+
+    def __len__(self):
+        return len(self._frames)
+
+    def agregar(self, msg_id, frame):
+        """
+        Guarda un frame en orden de ID; si el ring está lleno se olvida el
+        más viejo. Los de otros nodos pueden llegar desordenados (los IDs
+        vienen de otro reloj): se insertan en su lugar, buscando desde el
+        final, para que 'desde' pueda cortar en el primer ID ya visto.
+        """
+        valor = ids.a_int(msg_id) or 0
+        frames = self._frames
+        if not frames or frames[-1][0] <= valor:
+            frames.append((valor, frame))
+            return
+        if len(frames) == frames.maxlen:
+            if valor < frames[0][0]:
+                return  # Más viejo que todo el ring: se habría olvidado igual
+            frames.popleft()
+        pos = len(frames)
+        while pos and frames[pos - 1][0] > valor:
+            pos -= 1
+        frames.insert(pos, (valor, frame))
+
+    def desde(self, since_id=None, indice=None):
+        """
+        Frames con ID posterior a 'since_id' (todo el historial si no se pasa).
+        Si se pasa el 'indice' de mensajes, se omiten los eliminados.
+        """
+        valor = ids.a_int(since_id) if since_id else None
+        if valor is None:
+            frames = [frame for _, frame in self._frames]
+        else:
+            # Se recorre desde el final: el costo es sólo lo que se perdió
+            frames = []
+            for id_frame, frame in reversed(self._frames):
+                if id_frame <= valor:
+                    break
+                frames.append(frame)
+            frames.reverse()
+
+        if indice is not None and indice.borrados:
+            frames = [f for f in frames if not indice.eliminado(f.campos.get("id"))]
+        return frames
+
+    def limpiar(self):
+        self._frames.clear()
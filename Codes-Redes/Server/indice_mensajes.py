@@ -0,0 +1,89 @@
+"""
+Índice de mensajes del servidor: ID -> (autor, hora, borrado).
+
+Los datos se guardan en columnas ('array' y 'bytearray') en lugar de un
+objeto por mensaje. Como los IDs son crecientes (ver 'ids.py'), la propia
+columna de IDs está ordenada y se busca con bisect: no hace falta un
+dict, y cada mensaje ocupa 13 bytes (la hora sale del propio ID). También
+guarda las marcas de borrado (tombstones) que usa el admin para eliminar
+mensajes. Para buscar el texto de un mensaje está el almacén en disco.
+"""
+from array import array
+from bisect import bisect_left
+
+# ### Importar nuestros módulos ###
+import ids
+
+
+class IndiceMensajes:
+    """Índice compacto de todos los mensajes enviados en esta ejecución."""
+
+    def __init__(self):
+        # --- Columnas (una posición por mensaje, ordenadas por ID) ---
+        self._ids = array('Q')         # ID como entero
+        self._autor = array('I')       # Índice en self._autores
+        self._borrado = bytearray()    # 1 = eliminado por el admin
+
+        # Los nombres se guardan una sola vez (internados)
+        self._autores = []
+        self._id_autor = {}
+
+        self.borrados = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, msg_id):
+        return self._fila(msg_id) is not None
+
+    def _fila(self, msg_id):
+        """Posición del mensaje en las columnas (búsqueda binaria), o None."""
+        valor = ids.a_int(msg_id)
+        if valor is None:
+            return None
+        fila = bisect_left(self._ids, valor)
+        if fila < len(self._ids) and self._ids[fila] == valor:
+            return fila
+        return None
+
+    def agregar(self, msg_id, autor):
+        """Registra un mensaje nuevo."""
+        valor = ids.a_int(msg_id)
+        if valor is None:
+            return
+
+        id_autor = self._id_autor.get(autor)
+        if id_autor is None:
+            id_autor = len(self._autores)
+            self._autores.append(autor)
+            self._id_autor[autor] = id_autor
+
+        if not self._ids or valor > self._ids[-1]:
+            # Caso normal: el ID es el más nuevo y va al final
+            self._ids.append(valor)
+            self._autor.append(id_autor)
+            self._borrado.append(0)
+        else:
+            # Llegó fuera de orden (ej. desde otro nodo): se inserta en su lugar
+            fila = bisect_left(self._ids, valor)
+            if fila < len(self._ids) and self._ids[fila] == valor:
+                return  # Ya registrado
+            self._ids.insert(fila, valor)
+            self._autor.insert(fila, id_autor)
+            self._borrado.insert(fila, 0)
+
+    def eliminar(self, msg_id):
+        """
+        Marca un mensaje como eliminado.
+        Devuelve False si el ID no existe o ya estaba eliminado.
+        """
+        fila = self._fila(msg_id)
+        if fila is None or self._borrado[fila]:
+            return False
+        self._borrado[fila] = 1
+        self.borrados += 1
+        return True
+
+    def eliminado(self, msg_id):
+        fila = self._fila(msg_id)
+        return fila is not None and self._borrado[fila] == 1
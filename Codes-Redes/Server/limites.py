@@ -0,0 +1,105 @@
+"""
+Límites de tasa y control de admisión del servidor.
+
+  - CuboTokens: token bucket (por conexión y por sala). Cuando se acaba,
+    el servidor deja de leer de ese socket hasta que haya tokens: los
+    datos se quedan en el buffer del kernel y TCP frena al cliente, en
+    vez de acumularlos en memoria del servidor.
+  - ControlAdmision: tope global de conexiones y de bytes en vuelo
+    (encolados para enviar y todavía no escritos). Si se supera el tope
+    de bytes, se pausa la lectura de todos hasta que las colas bajen.
+"""
+import asyncio
+import time
+
+# ### Importar nuestros módulos ###
+import config
+
+
+class CuboTokens:
+    """Token bucket: 'tasa' tokens por segundo, hasta 'rafaga' acumulados."""
+
+    __slots__ = ("tasa", "rafaga", "tokens", "_ultimo")
+
+    def __init__(self, tasa, rafaga):
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self.tokens = rafaga
+        self._ultimo = time.monotonic()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.rafaga, self.tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def espera(self, n=1):
+        """Segundos que faltan para tener 'n' tokens (0 si ya los hay)."""
+        if not self.tasa:
+            return 0.0  # Sin límite
+        self._recargar()
+        if self.tokens >= n:
+            return 0.0
+        return (n - self.tokens) / self.tasa
+
+    def consumir(self, n=1):
+        if self.tasa:
+            self.tokens -= n
+
+
+class ControlAdmision:
+    """Topes globales del servidor, con sus contadores."""
+
+    def __init__(self):
+        self.max_conexiones = config.MAX_CONEXIONES
+        self.max_bytes = config.MAX_BYTES_EN_VUELO
+        self.conexiones = 0
+        self.bytes_en_vuelo = 0
+        self._hay_lugar = asyncio.Event()
+        self._hay_lugar.set()
+
+        # --- Contadores ---
+        self.rechazadas = 0     # Conexiones rechazadas por el tope
+        self.pausas_globales = 0  # Lecturas pausadas por exceso de bytes en vuelo
+        self.frenadas = 0       # Frames demorados por un token bucket
+        self.segundos_frenados = 0.0
+
+    # --- Conexiones ---
+
+    def admitir(self):
+        """Cuenta una conexión nueva. Devuelve False si se llegó al tope."""
+        if self.max_conexiones and self.conexiones >= self.max_conexiones:
+            self.rechazadas += 1
+            return False
+        self.conexiones += 1
+        return True
+
+    def liberar(self):
+        self.conexiones -= 1
+
+    # --- Bytes en vuelo ---
+
+    def sumar(self, n):
+        self.bytes_en_vuelo += n
+        if self.max_bytes and self.bytes_en_vuelo >= self.max_bytes:
+            self._hay_lugar.clear()
+
+    def restar(self, n):
+        self.bytes_en_vuelo -= n
+        if not self.max_bytes or self.bytes_en_vuelo < self.max_bytes:
+            self._hay_lugar.set()
+
+    async def esperar_lugar(self):
+        """Si el servidor está saturado, espera a que las colas de salida bajen."""
+        if not self._hay_lugar.is_set():
+            self.pausas_globales += 1
+            await self._hay_lugar.wait()
+
+    def estadisticas(self):
+        return {
+            "conexiones": self.conexiones,
+            "rechazadas": self.rechazadas,
+            "bytes_en_vuelo": self.bytes_en_vuelo,
+            "pausas_globales": self.pausas_globales,
+            "frenadas": self.frenadas,
+            "segundos_frenados": round(self.segundos_frenados, 3),
+        }
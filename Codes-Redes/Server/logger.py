@@ -1,21 +1,184 @@
+import os
+import queue
 import threading
+import time
+import atexit
 from datetime import datetime
 import config  
 
-# Lock para evitar que dos hilos escriban al log al mismo tiempo
-log_lock = threading.Lock()
+# --- Políticas de fsync ---
+FSYNC_NUNCA = "nunca"          # El sistema operativo decide cuándo bajar a disco
+FSYNC_LOTE = "lote"            # fsync después de cada lote escrito
+FSYNC_INTERVALO = "intervalo"  # fsync como máximo cada LOG_FSYNC_SEGUNDOS
+
+# --- Políticas de rotación ---
+ROTAR_TAMANO = "tamano"  # Al superar LOG_MAX_BYTES
+ROTAR_DIARIA = "diaria"  # Al cambiar el día
+
+
+class EscritorLog:
+    """
+    Escritor de log en segundo plano.
+
+    Los hilos (o el event loop) sólo meten líneas en una cola sin locks
+    (queue.SimpleQueue) y vuelven enseguida; un único hilo escritor las
+    saca en lotes y las escribe con el archivo siempre abierto. Un disco
+    lento nunca retrasa la entrega de mensajes: si la cola se llena, las
+    líneas se descartan y se cuentan.
+    """
+
+    def __init__(self, ruta=config.LOG_FILE):
+        self.ruta = ruta
+        self._cola = queue.SimpleQueue()
+        self._archivo = None
+        self._bytes_archivo = 0
+        self._dia_archivo = None
+        self._ultimo_fsync = time.monotonic()
+        self._hilo = None
+        self._lock_inicio = threading.Lock()
+        self._detener = False
+
+        # --- Contadores ---
+        self.encolados = 0
+        self.descartados = 0
+        self.escritos = 0
+        self.lotes = 0
+
+    # --- API para los productores ---
+
+    def escribir(self, linea):
+        """Encola una línea ya formateada (no bloquea nunca)."""
+        if self._cola.qsize() >= config.LOG_MAX_PENDIENTES:
+            self.descartados += 1
+            return
+        self.encolados += 1
+        self._cola.put(linea)
+
+    def pendientes(self):
+        return self._cola.qsize()
+
+    def estadisticas(self):
+        return {
+            "encolados": self.encolados,
+            "escritos": self.escritos,
+            "pendientes": self.pendientes(),
+            "descartados": self.descartados,
+            "lotes": self.lotes,
+        }
+
+    # --- Ciclo de vida ---
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        with self._lock_inicio:
+            if self._hilo is None:
+                self._detener = False
+                self._hilo = threading.Thread(target=self._bucle, name="escritor-log", daemon=True)
+                self._hilo.start()
+
+    def cerrar(self):
+        """Escribe lo pendiente y cierra el archivo."""
+        if self._hilo is None:
+            return
+        self._detener = True
+        self._cola.put(None)  # Despierta al hilo
+        self._hilo.join(timeout=5)
+        self._hilo = None
+
+    # --- Hilo escritor ---
+
+    def _bucle(self):
+        while True:
+            lote = self._tomar_lote()
+            if lote:
+                try:
+                    self._escribir_lote(lote)
+                except Exception as e:
+                    print(f"Error fatal al escribir en el log: {e}")
+            if self._detener and self._cola.empty():
+                break
+        if self._archivo:
+            self._archivo.close()
+            self._archivo = None
+
+    def _tomar_lote(self):
+        """Espera la primera línea y junta más hasta llenar el lote o agotar el tiempo."""
+        lote = []
+        primera = self._cola.get()  # Bloquea sin gastar CPU mientras no hay nada
+        if primera is not None:
+            lote.append(primera)
+
+        limite = time.monotonic() + config.LOG_BATCH_SEGUNDOS
+        while primera is not None and len(lote) < config.LOG_BATCH_LINEAS:
+            restante = limite - time.monotonic()
+            try:
+                linea = self._cola.get(timeout=max(restante, 0))
+            except queue.Empty:
+                break
+            if linea is None:
+                break
+            lote.append(linea)
+        return lote
+
+    def _escribir_lote(self, lote):
+        self._rotar_si_hace_falta()
+        texto = "".join(lote)
+        self._archivo.write(texto)
+        self._archivo.flush()
+        self._bytes_archivo += len(texto.encode("utf-8"))
+        self.escritos += len(lote)
+        self.lotes += 1
+
+        ahora = time.monotonic()
+        if (config.LOG_FSYNC == FSYNC_LOTE or
+                (config.LOG_FSYNC == FSYNC_INTERVALO and
+                 ahora - self._ultimo_fsync >= config.LOG_FSYNC_SEGUNDOS)):
+            os.fsync(self._archivo.fileno())
+            self._ultimo_fsync = ahora
+
+    # --- Rotación ---
+
+    def _rotar_si_hace_falta(self):
+        hoy = datetime.now().strftime("%Y-%m-%d")
+
+        if self._archivo is not None:
+            if config.LOG_ROTAR == ROTAR_TAMANO and self._bytes_archivo >= config.LOG_MAX_BYTES:
+                self._rotar(datetime.now().strftime("%Y-%m-%d_%H%M%S"))
+            elif config.LOG_ROTAR == ROTAR_DIARIA and hoy != self._dia_archivo:
+                self._rotar(self._dia_archivo)
+
+        if self._archivo is None:
+            self._archivo = open(self.ruta, 'a', encoding='utf-8')
+            self._bytes_archivo = self._archivo.tell()
+            self._dia_archivo = hoy
+
+    def _rotar(self, sufijo):
+        """Cierra el archivo actual y lo renombra, ej. 'chat_log.2025-11-12.txt'."""
+        self._archivo.close()
+        self._archivo = None
+        base, ext = os.path.splitext(self.ruta)
+        destino = f"{base}.{sufijo}{ext}"
+        n = 1
+        while os.path.exists(destino):
+            destino = f"{base}.{sufijo}-{n}{ext}"
+            n += 1
+        os.replace(self.ruta, destino)
+
+
+# Escritor global usado por todo el servidor
+escritor = EscritorLog()
+
 
 def escribir_log(mensaje):
     """
-    Escribe un mensaje (con timestamp) en el archivo de log 
-    de forma segura (thread-safe).
+    Escribe un mensaje (con timestamp) en el archivo de log.
+    Sólo lo encola: el hilo escritor lo guarda en disco en segundo plano.
     """
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    mensaje_con_timestamp = f"[{timestamp}] {mensaje}\n"
-    
-    with log_lock:
-        try:
-            with open(config.LOG_FILE, 'a', encoding='utf-8') as f:
-                f.write(mensaje_con_timestamp)
-        except Exception as e:
-            print(f"Error fatal al escribir en el log: {e}")
\ No newline at end of file
+    escritor.iniciar()
+    escritor.escribir(f"[{timestamp}] {mensaje}\n")
+
+
+# Al salir se guardan las líneas que queden en la cola
+atexit.register(escritor.cerrar)
@@ -0,0 +1,195 @@
+"""
+Métricas del servidor: contadores, histogramas y un endpoint HTTP.
+
+Todo se registra desde el hilo del event loop, así que los contadores
+son enteros comunes (sin locks) y un histograma es un bisect sobre
+límites fijos más un incremento. Lo caro (recorrer las sesiones, armar
+el texto) pasa una vez por segundo o cuando alguien pide las métricas.
+
+El endpoint sirve dos rutas:
+    GET /metrics  -> formato de texto de Prometheus
+    GET /stats    -> el mismo contenido en JSON
+"""
+import asyncio
+import json
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Latencias en segundos: de 10 µs a 10 s, en pasos de ~x2.5
+LIMITES_LATENCIA = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+                    0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histograma:
+    """Histograma de cubetas fijas (acumulable, como los de Prometheus)."""
+
+    __slots__ = ("limites", "cubetas", "suma", "cuenta")
+
+    def __init__(self, limites=LIMITES_LATENCIA):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)  # La última es +Inf
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def observar(self, valor):
+        self.cubetas[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.cuenta += 1
+
+    def percentil(self, p):
+        """Estimación: el límite superior de la cubeta donde cae el percentil p (0-1)."""
+        if not self.cuenta:
+            return None
+        objetivo = p * self.cuenta
+        acumulado = 0
+        for i, n in enumerate(self.cubetas):
+            acumulado += n
+            if acumulado >= objetivo:
+                return self.limites[i] if i < len(self.limites) else float("inf")
+        return float("inf")
+
+    def resumen(self):
+        return {
+            "cuenta": self.cuenta,
+            "promedio": self.suma / self.cuenta if self.cuenta else None,
+            "p50": self.percentil(0.5),
+            "p99": self.percentil(0.99),
+        }
+
+
+class Metricas:
+    """Contadores del servidor y tasas por segundo de los últimos segundos."""
+
+    def __init__(self, ventana=10):
+        # --- Contadores (sólo crecen) ---
+        self.conexiones_totales = 0
+        self.frames_entrantes = 0
+        self.bytes_entrantes = 0
+        self.frames_entrantes_descartados = 0  # Frames demasiado grandes
+        self.broadcasts = 0
+        self.comandos = 0
+
+        # --- Histogramas ---
+        self.latencia_broadcast = Histograma()  # Encolar un frame a toda una sala
+        self.latencia_comando = Histograma()
+        self.latencia_consulta = Histograma()  # /historial y /buscar (en el almacén)
+
+        # Muestras (tiempo, entrantes, salientes) para calcular tasas
+        self._muestras = deque(maxlen=ventana + 1)
+
+    def muestrear(self, salientes):
+        """Guarda una muestra; lo llama una tarea una vez por segundo."""
+        self._muestras.append((time.monotonic(), self.frames_entrantes, salientes))
+
+    def tasas(self):
+        """(entrantes/s, salientes/s) promediados en la ventana de muestras."""
+        if len(self._muestras) < 2:
+            return 0.0, 0.0
+        (t0, e0, s0), (t1, e1, s1) = self._muestras[0], self._muestras[-1]
+        return (e1 - e0) / (t1 - t0), (s1 - s0) / (t1 - t0)
+
+
+# --- Formatos de Salida ---
+
+def aplanar(datos, prefijo=""):
+    """{'a': {'b': 1}} -> [('a_b', 1)] (sólo valores numéricos)."""
+    for clave, valor in datos.items():
+        nombre = f"{prefijo}{clave}"
+        if isinstance(valor, dict):
+            yield from aplanar(valor, nombre + "_")
+        elif isinstance(valor, bool):
+            yield nombre, int(valor)
+        elif isinstance(valor, (int, float)):
+            yield nombre, valor
+
+
+def _mas_frenados(datos):
+    """[(usuario, frenadas, segundos)] de las sesiones más frenadas (no es numérico: aparte)."""
+    return datos.get("limites", {}).get("mas_frenados", ())
+
+
+def texto_prometheus(datos, histogramas, prefijo="chat_"):
+    """Arma el formato de texto de Prometheus para los datos y los histogramas."""
+    lineas = []
+    for nombre, valor in aplanar(datos):
+        lineas.append(f"{prefijo}{nombre} {valor}")
+    for usuario, frenadas, segundos in _mas_frenados(datos):
+        etiqueta = usuario.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        lineas.append(f'{prefijo}limites_frenadas_usuario{{usuario="{etiqueta}"}} {frenadas}')
+        lineas.append(f'{prefijo}limites_segundos_frenados_usuario{{usuario="{etiqueta}"}} {segundos}')
+    for nombre, h in histogramas.items():
+        lineas.append(f"# TYPE {prefijo}{nombre} histogram")
+        acumulado = 0
+        for limite, n in zip(h.limites, h.cubetas):
+            acumulado += n
+            lineas.append(f'{prefijo}{nombre}_bucket{{le="{limite}"}} {acumulado}')
+        lineas.append(f'{prefijo}{nombre}_bucket{{le="+Inf"}} {h.cuenta}')
+        lineas.append(f"{prefijo}{nombre}_sum {h.suma}")
+        lineas.append(f"{prefijo}{nombre}_count {h.cuenta}")
+    return "\n".join(lineas) + "\n"
+
+
+def texto_legible(datos, histogramas):
+    """Versión para humanos (comando /stats y GUI): una métrica por línea."""
+    lineas = [f"{nombre}: {valor}" for nombre, valor in aplanar(datos)]
+    frenados = _mas_frenados(datos)
+    if frenados:
+        lineas.append("limites_mas_frenados: " + ", ".join(
+            f"{usuario} ({frenadas}, {segundos} s)" for usuario, frenadas, segundos in frenados))
+    for nombre, h in histogramas.items():
+        r = h.resumen()
+        ms = lambda v: "-" if v is None else f"{v * 1000:.3f} ms"
+        lineas.append(f"{nombre}: n={r['cuenta']} p50≤{ms(r['p50'])} p99≤{ms(r['p99'])}")
+    return "\n".join(lineas)
+
+
+class ServidorMetricas:
+    """
+    Endpoint HTTP mínimo (sólo GET) que corre en el mismo event loop.
+    'obtener()' devuelve (datos, histogramas) en el momento del pedido.
+    """
+
+    def __init__(self, host, port, obtener):
+        self.host = host
+        self.port = port
+        self.obtener = obtener
+        self._server = None
+
+    async def iniciar(self):
+        self._server = await asyncio.start_server(self._atender, self.host, self.port,
+                                                  reuse_address=True)
+
+    def cerrar(self):
+        if self._server is not None:
+            self._server.close()
+
+    async def _atender(self, reader, writer):
+        try:
+            pedido = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+            partes = pedido.split(b" ", 2)
+            ruta = partes[1].decode("latin-1") if len(partes) > 1 else "/"
+
+            datos, histogramas = self.obtener()
+            if ruta.startswith("/metrics"):
+                cuerpo = texto_prometheus(datos, histogramas).encode("utf-8")
+                tipo = "text/plain; version=0.0.4"
+                estado = "200 OK"
+            elif ruta.startswith("/stats"):
+                datos = dict(datos, histogramas={n: h.resumen() for n, h in histogramas.items()})
+                cuerpo = json.dumps(datos, ensure_ascii=False, indent=2).encode("utf-8")
+                tipo = "application/json"
+                estado = "200 OK"
+            else:
+                cuerpo = b"Rutas: /metrics, /stats\n"
+                tipo = "text/plain"
+                estado = "404 Not Found"
+
+            writer.write(f"HTTP/1.1 {estado}\r\nContent-Type: {tipo}; charset=utf-8\r\n"
+                         f"Content-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n"
+                         .encode("latin-1") + cuerpo)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
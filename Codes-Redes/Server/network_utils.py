@@ -18,4 +18,39 @@ def get_local_ip():
     except Exception:
         # Si no hay conexión a internet o hay un firewall, 
         # es posible que falle y devolvamos la IP de 'localhost'.
-        return "127.0.0.1"
\ No newline at end of file
+        return "127.0.0.1"
+
+def subir_limite_descriptores():
+    """
+    Sube el límite suave de descriptores de archivo (RLIMIT_NOFILE) al
+    máximo permitido, para poder mantener miles de sockets abiertos.
+
+    En sistemas sin el módulo 'resource' (Windows) no hace nada.
+    """
+    try:
+        import resource
+        suave, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if duro == resource.RLIM_INFINITY or suave < duro:
+            nuevo = duro if duro != resource.RLIM_INFINITY else max(suave, 65536)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (nuevo, duro))
+    except (ImportError, ValueError, OSError):
+        pass
+
+def configurar_keepalive(sock, idle, intervalo, sondeos):
+    """
+    Activa el keepalive de TCP en un socket: el kernel detecta por su
+    cuenta a los pares muertos (cable cortado, equipo apagado) aunque
+    no haya tráfico. Las opciones finas sólo existen en algunos sistemas.
+    """
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle)
+        if hasattr(socket, "TCP_KEEPINTVL"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, intervalo)
+        if hasattr(socket, "TCP_KEEPCNT"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, sondeos)
+    except OSError:
+        pass
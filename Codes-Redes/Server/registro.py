@@ -0,0 +1,151 @@
+"""
+Registro de conexiones del servidor.
+
+Guarda cada sesión indexada por su conexión (writer) y por su nombre de
+usuario, así buscar a un usuario (ej. para un mensaje directo) es O(1)
+en vez de recorrer a todos los clientes. También garantiza que no haya
+dos usuarios conectados con el mismo nombre.
+
+'ListaUsuarios' es la lista de todos los conectados (también los de
+otros nodos), ordenada para paginarla sin recorrerla.
+"""
+import re
+from bisect import bisect_left, insort
+
+# ### Importar nuestros módulos ###
+import config
+
+# Letras (con acentos), números, '_', '.' y '-'; sin espacios (así sirve en '/msg <usuario>')
+RE_NOMBRE_USUARIO = re.compile(rf"^[\w.-]{{1,{config.NOMBRE_MAX}}}$")
+
+
+def nombre_valido(username):
+    return bool(RE_NOMBRE_USUARIO.match(username or ""))
+
+
+def clave_nombre(username):
+    """Los nombres se comparan sin distinguir mayúsculas ('Ana' == 'ana')."""
+    return username.casefold()
+
+
+class RegistroConexiones:
+    """Índice bidireccional conexión <-> nombre de usuario."""
+
+    def __init__(self):
+        self._por_writer = {}  # {writer: Sesion}
+        self._por_nombre = {}  # {clave_nombre(username): Sesion}
+
+    def __len__(self):
+        return len(self._por_writer)
+
+    def __contains__(self, writer):
+        return writer in self._por_writer
+
+    def values(self):
+        return self._por_writer.values()
+
+    def nombre_en_uso(self, username):
+        return clave_nombre(username) in self._por_nombre
+
+    def registrar(self, sesion):
+        """Agrega la sesión. Devuelve False si el nombre ya está en uso."""
+        clave = clave_nombre(sesion.username)
+        if clave in self._por_nombre:
+            return False
+        self._por_nombre[clave] = sesion
+        self._por_writer[sesion.writer] = sesion
+        return True
+
+    def quitar(self, sesion):
+        """Saca la sesión del registro. Devuelve False si no estaba."""
+        if self._por_writer.pop(sesion.writer, None) is None:
+            return False
+        self._por_nombre.pop(clave_nombre(sesion.username), None)
+        return True
+
+    def por_nombre(self, username):
+        return self._por_nombre.get(clave_nombre(username))
+
+
+class ListaUsuarios:
+    """
+    Usuarios conectados en todos los nodos: {nombre: nodo}.
+
+    Se actualiza de a un cambio (entra o sale alguien) y mantiene los
+    nombres ordenados (bisect), así '/usuarios' nunca recorre ni copia la
+    lista entera: una página o un filtro por prefijo cuestan O(log n)
+    más lo que se muestra, aunque haya miles de usuarios.
+    """
+
+    def __init__(self):
+        self._usuarios = {}  # {clave_nombre: (nodo, username)}
+        self._orden = []     # Claves ordenadas
+        self._por_nodo = {}  # {nodo: set(claves)}
+
+    def __len__(self):
+        return len(self._usuarios)
+
+    def __contains__(self, username):
+        return clave_nombre(username) in self._usuarios
+
+    def get(self, username):
+        """(nodo, username) del usuario, o None si no está conectado."""
+        return self._usuarios.get(clave_nombre(username))
+
+    def agregar(self, username, nodo):
+        clave = clave_nombre(username)
+        anterior = self._usuarios.get(clave)
+        if anterior is None:
+            insort(self._orden, clave)
+        else:
+            self._por_nodo[anterior[0]].discard(clave)
+            if not self._por_nodo[anterior[0]]:
+                del self._por_nodo[anterior[0]]
+        self._usuarios[clave] = (nodo, username)
+        self._por_nodo.setdefault(nodo, set()).add(clave)
+
+    def quitar(self, username, nodo):
+        """
+        Lo saca sólo si está conectado en ese nodo (no si reconectó en otro).
+        Devuelve False si no estaba.
+        """
+        clave = clave_nombre(username)
+        if self._usuarios.get(clave, (None,))[0] != nodo:
+            return False
+        del self._usuarios[clave]
+        del self._orden[bisect_left(self._orden, clave)]
+        self._por_nodo[nodo].discard(clave)
+        if not self._por_nodo[nodo]:
+            del self._por_nodo[nodo]
+        return True
+
+    def reemplazar_nodo(self, nodo, usuarios):
+        """
+        Todo lo que se sabía de ese nodo se reemplaza por 'usuarios'.
+        Devuelve (los que entraron, los que salieron).
+        """
+        nuevos = {clave_nombre(u): u for u in usuarios}
+        salieron = []
+        for clave in list(self._por_nodo.get(nodo, ())):
+            if clave not in nuevos:
+                salieron.append(self._usuarios[clave][1])
+                self.quitar(salieron[-1], nodo)
+        entraron = [u for clave, u in nuevos.items()
+                    if self._usuarios.get(clave, (None,))[0] != nodo]
+        for username in entraron:
+            self.agregar(username, nodo)
+        return entraron, salieron
+
+    def de_nodo(self, nodo):
+        return len(self._por_nodo.get(nodo, ()))
+
+    def pagina(self, desde, cantidad, prefijo=""):
+        """
+        (total, nombres): los usuarios cuyo nombre empieza con 'prefijo'
+        (todos si es ""), en orden alfabético, desde la posición 'desde'.
+        """
+        clave = clave_nombre(prefijo)
+        inicio = bisect_left(self._orden, clave)
+        fin = bisect_left(self._orden, clave + "\U0010ffff") if clave else len(self._orden)
+        claves = self._orden[inicio + desde:min(inicio + desde + cantidad, fin)]
+        return fin - inicio, [self._usuarios[c][1] for c in claves]
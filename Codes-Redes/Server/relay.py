@@ -0,0 +1,299 @@
+"""
+Relay pub/sub entre nodos (shards) del servidor.
+
+Cuando se corren varios procesos servidor (en la misma máquina con
+SO_REUSEPORT, o en varias máquinas), cada uno sólo tiene a sus propios
+clientes. El relay reenvía entre ellos los eventos que tienen que verse
+en todos lados: mensajes de chat, 'delete', 'clear', mensajes directos
+y presencia (quién está conectado en cada nodo).
+
+Los eventos son diccionarios con 'tipo' y 'nodo' (el que lo publicó).
+Hay dos implementaciones con la misma interfaz:
+
+  - RelayLocal: en memoria, para varios ChatServer en un mismo proceso
+    (sirve para probar el sharding sin levantar procesos).
+  - RelayTCP: se conecta a un HubRelay por TCP, con el mismo protocolo
+    de frames JSON delimitados por '\\n' que usan los clientes.
+
+El hub no interpreta los eventos: reenvía cada línea a los demás nodos.
+Sólo genera 'nodo_caido' cuando se cae la conexión de un nodo.
+
+Por TCP, cada conexión (nodo -> hub y hub -> nodo) escribe desde una cola
+acotada con su propia tarea, como las sesiones de los clientes: un nodo
+lento no hace crecer la memoria del hub ni la de quien publica. Si la
+cola se llena se corta esa conexión; el nodo reconecta y su 'hola'
+vuelve a sincronizar la presencia.
+"""
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from collections import deque
+import os
+import sys
+
+# El protocolo vive en 'Codes-Redes/Comun' (compartido con los clientes)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Comun"))
+
+# ### Importar nuestros módulos ###
+import config
+import protocolo
+
+# --- Tipos de evento ---
+HOLA = "hola"              # Un nodo (re)conectado, con su lista de usuarios
+USUARIOS = "usuarios"      # Respuesta a 'hola' con la lista de usuarios de un nodo
+NODO_CAIDO = "nodo_caido"  # El hub perdió la conexión con un nodo
+
+
+class Relay(ABC):
+    """
+    Interfaz común. El servidor llama a 'iniciar' con dos callbacks:
+      al_recibir(evento): llega un evento de otro nodo.
+      al_conectar():      el relay (re)conectó; hay que anunciarse con 'hola'.
+    """
+
+    def __init__(self):
+        # --- Contadores ---
+        self.publicados = 0
+        self.recibidos = 0
+        self.perdidos = 0  # Publicados sin conexión al hub (o con la cola llena)
+        self.invalidos = 0  # Recibidos que no se pudieron procesar
+
+    @abstractmethod
+    async def iniciar(self, nodo, al_recibir, al_conectar):
+        ...
+
+    @abstractmethod
+    def publicar(self, evento):
+        ...
+
+    def cerrar(self):
+        pass
+
+
+# --- Implementación en memoria (loopback) ---
+
+class HubLocal:
+    """Hub en memoria: reparte los eventos entre los RelayLocal de un proceso."""
+
+    def __init__(self):
+        self.relays = []
+
+    def conectar(self, relay):
+        self.relays.append(relay)
+
+    def desconectar(self, relay):
+        if relay in self.relays:
+            self.relays.remove(relay)
+            self.difundir({"tipo": NODO_CAIDO, "nodo": relay.nodo}, origen=relay)
+
+    def difundir(self, evento, origen):
+        # Se pasa por JSON como en la red: el receptor recibe su propia copia
+        linea = json.dumps(evento, ensure_ascii=False)
+        for relay in self.relays:
+            if relay is not origen:
+                relay.loop.call_soon(relay.entregar, json.loads(linea))
+
+
+class RelayLocal(Relay):
+    """Relay en memoria: todos los nodos comparten un HubLocal y el event loop."""
+
+    def __init__(self, hub):
+        super().__init__()
+        self.hub = hub
+        self.nodo = None
+        self.loop = None
+        self._al_recibir = None
+
+    async def iniciar(self, nodo, al_recibir, al_conectar):
+        self.nodo = nodo
+        self.loop = asyncio.get_running_loop()
+        self._al_recibir = al_recibir
+        self.hub.conectar(self)
+        al_conectar()
+
+    def publicar(self, evento):
+        self.publicados += 1
+        self.hub.difundir(evento, origen=self)
+
+    def entregar(self, evento):
+        self.recibidos += 1
+        try:
+            self._al_recibir(evento)
+        except Exception as e:
+            self.invalidos += 1
+            print(f"Relay: evento descartado ({e!r}): {evento!r:.200}")
+
+    def cerrar(self):
+        self.hub.desconectar(self)
+
+
+# --- Implementación por TCP ---
+
+class SalidaAcotada:
+    """
+    Cola de salida de una conexión del relay con su propia tarea escritora.
+    Si lo pendiente supera RELAY_COLA_MAX_BYTES se cierra la conexión.
+    """
+
+    def __init__(self, writer, max_bytes=None):
+        self.writer = writer
+        self.max_bytes = max_bytes or config.RELAY_COLA_MAX_BYTES
+        self.cola = deque()
+        self.cola_bytes = 0
+        self.cerrada = False
+        self._hay_datos = asyncio.Event()
+        self._tarea = asyncio.get_running_loop().create_task(self._escritor())
+
+    def enviar(self, data_bytes):
+        """Encola sin bloquear. Devuelve False si la cola se llenó (y cerró la conexión)."""
+        if self.cerrada:
+            return False
+        if self.cola_bytes + len(data_bytes) > self.max_bytes:
+            self.cerrar()
+            return False
+        self.cola.append(data_bytes)
+        self.cola_bytes += len(data_bytes)
+        self._hay_datos.set()
+        return True
+
+    async def _escritor(self):
+        try:
+            while not self.cerrada:
+                await self._hay_datos.wait()
+                self._hay_datos.clear()
+                while self.cola:
+                    lote = list(self.cola)
+                    self.cola.clear()
+                    self.cola_bytes = 0
+                    self.writer.writelines(lote)
+                    await self.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.cerrar()
+
+    def cerrar(self):
+        if self.cerrada:
+            return
+        self.cerrada = True
+        self.cola.clear()
+        self.cola_bytes = 0
+        if self._tarea is not asyncio.current_task():
+            self._tarea.cancel()
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+class RelayTCP(Relay):
+    """
+    Cliente del HubRelay. Reconecta solo si se cae la conexión; lo que se
+    publica mientras tanto se descarta (y se cuenta en 'perdidos').
+    """
+
+    def __init__(self, host, port, reintento=1.0):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.reintento = reintento
+        self._salida = None
+        self._tarea = None
+
+    async def iniciar(self, nodo, al_recibir, al_conectar):
+        self._tarea = asyncio.create_task(self._mantener(al_recibir, al_conectar))
+
+    def publicar(self, evento):
+        if self._salida is None or self._salida.cerrada:
+            self.perdidos += 1
+            return
+        if not self._salida.enviar(protocolo.codificar(evento)):
+            # El hub no lee al ritmo que publicamos: se corta y se reconecta
+            print(f"Relay {self.host}:{self.port}: cola llena, reconectando.")
+            self.perdidos += 1
+            return
+        self.publicados += 1
+
+    async def _mantener(self, al_recibir, al_conectar):
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                self._salida = SalidaAcotada(writer)
+                al_conectar()
+                decoder = protocolo.DecodificadorFrames(config.RELAY_MAX_FRAME)
+                while (data := await reader.read(config.RECV_SIZE)):
+                    for frame in decoder.feed(data):
+                        self.recibidos += 1
+                        try:
+                            al_recibir(json.loads(frame))
+                        except Exception as e:
+                            # Un evento roto no puede dejar al nodo fuera del cluster
+                            self.invalidos += 1
+                            print(f"Relay: evento descartado ({e!r}): {frame[:200]!r}")
+            except Exception as e:
+                print(f"Relay {self.host}:{self.port}: {e}")
+            finally:
+                if self._salida is not None:
+                    self._salida.cerrar()
+                    self._salida = None
+            await asyncio.sleep(self.reintento)
+
+    def cerrar(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+        if self._salida is not None:
+            self._salida.cerrar()
+
+
+class HubRelay:
+    """
+    Hub TCP al que se conectan los nodos. Reenvía cada frame tal cual a
+    todos los demás nodos, sin decodificarlo (sólo mira el primero de
+    cada conexión para saber qué nodo es).
+    """
+
+    def __init__(self, host=config.RELAY_HOST, port=config.RELAY_PORT):
+        self.host = host
+        self.port = port
+        self.nodos = {}  # {SalidaAcotada: nodo}
+        self.cortados = 0  # Nodos desconectados por no leer a tiempo
+
+    async def atender(self, reader, writer):
+        decoder = protocolo.DecodificadorFrames(config.RELAY_MAX_FRAME)
+        salida = SalidaAcotada(writer)
+        self.nodos[salida] = None
+        try:
+            while (data := await reader.read(config.RECV_SIZE)):
+                frames = decoder.feed(data)
+                if not frames:
+                    continue
+                if self.nodos[salida] is None:
+                    self.nodos[salida] = json.loads(frames[0]).get("nodo")
+                lote = b"".join(frame + b"\n" for frame in frames)
+                self._difundir(lote, origen=salida)
+                if salida.cerrada:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            nodo = self.nodos.pop(salida, None)
+            salida.cerrar()
+            if nodo is not None:
+                self._difundir(protocolo.codificar({"tipo": NODO_CAIDO, "nodo": nodo}), origen=None)
+
+    def _difundir(self, data_bytes, origen):
+        for otro in list(self.nodos):
+            if otro is not origen and not otro.enviar(data_bytes):
+                # No lee a tiempo: al cerrar, su 'atender' avisa 'nodo_caido' a los demás
+                self.cortados += 1
+                print(f"Hub: nodo {self.nodos.get(otro)} desconectado (cola llena).")
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self.atender, self.host, self.port,
+                                            reuse_address=True)
+        async with server:
+            await server.serve_forever()
+
+
+def parsear_direccion(texto):
+    """'host:puerto' -> (host, puerto)."""
+    host, _, port = texto.rpartition(":")
+    return host or config.RELAY_HOST, int(port)
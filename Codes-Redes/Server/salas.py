@@ -0,0 +1,96 @@
+"""
+Salas (canales) del chat.
+
+Cada sesión está en una sola sala a la vez. El índice sala -> miembros
+permite que un broadcast recorra sólo a los miembros de esa sala, y cada
+sala guarda su propio historial reciente.
+
+Cuando una sala se vacía se borra, pero su historial se guarda aparte
+(hasta SALAS_INACTIVAS_MAX salas, las más recientes): si alguien vuelve
+a entrar, por ejemplo al reconectar, recupera lo que se habló.
+"""
+import re
+from collections import OrderedDict
+
+# ### Importar nuestros módulos ###
+import config
+from historial import HistorialMensajes
+from limites import CuboTokens
+
+RE_NOMBRE_SALA = re.compile(r"^[\w-]{1,32}$")
+
+
+class Sala:
+    """Una sala: sus miembros, su historial reciente y su límite de tasa."""
+
+    __slots__ = ("nombre", "miembros", "historial", "limite")
+
+    def __init__(self, nombre, historial=None):
+        self.nombre = nombre
+        self.miembros = set()  # {Sesion}
+        self.historial = historial if historial is not None else HistorialMensajes()
+        self.limite = CuboTokens(config.LIMITE_SALA_SEG, config.LIMITE_SALA_RAFAGA)
+
+    def __len__(self):
+        return len(self.miembros)
+
+
+class Salas:
+    """Índice de salas: nombre -> Sala."""
+
+    def __init__(self, por_defecto=config.SALA_POR_DEFECTO):
+        self.por_defecto = por_defecto
+        self._salas = {por_defecto: Sala(por_defecto)}
+        self._inactivas = OrderedDict()  # {nombre: HistorialMensajes} de salas vacías
+
+    def __iter__(self):
+        return iter(self._salas.values())
+
+    def __len__(self):
+        return len(self._salas)
+
+    def get(self, nombre):
+        return self._salas.get(nombre)
+
+    def historial_inactivo(self, nombre):
+        """Historial guardado de una sala que ahora no existe (o None)."""
+        return self._inactivas.get(nombre)
+
+    def limpiar_historiales(self):
+        for sala in self._salas.values():
+            sala.historial.limpiar()
+        self._inactivas.clear()
+
+    @staticmethod
+    def nombre_valido(nombre):
+        return bool(RE_NOMBRE_SALA.match(nombre or ""))
+
+    def entrar(self, sesion, nombre):
+        """
+        Mueve la sesión a la sala 'nombre' (creándola si hace falta).
+        Devuelve (sala_anterior o None, sala_nueva).
+        """
+        anterior = self.salir(sesion)
+        sala = self._salas.get(nombre)
+        if sala is None:
+            sala = self._salas[nombre] = Sala(nombre, self._inactivas.pop(nombre, None))
+        sala.miembros.add(sesion)
+        sesion.sala = sala
+        return anterior, sala
+
+    def salir(self, sesion):
+        """
+        Saca a la sesión de su sala. Las salas vacías (salvo la general) se
+        borran, guardando su historial.
+        """
+        sala = sesion.sala
+        if sala is None:
+            return None
+        sala.miembros.discard(sesion)
+        sesion.sala = None
+        if not sala.miembros and sala.nombre != self.por_defecto:
+            self._salas.pop(sala.nombre, None)
+            self._inactivas[sala.nombre] = sala.historial
+            if len(self._inactivas) > config.SALAS_INACTIVAS_MAX:
+                self._inactivas.popitem(last=False)  # Se olvida la más vieja
+        return sala
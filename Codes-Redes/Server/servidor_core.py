@@ -0,0 +1,809 @@
+"""
+Núcleo del servidor de chat basado en asyncio.
+
+Un solo hilo (el del event loop) atiende todas las conexiones, así que
+el servidor ya no crea un hilo por cliente. La GUI de Tkinter es sólo
+un cliente opcional de este núcleo: se suscribe a los eventos con
+'on_evento' y envía las acciones de admin con 'desde_hilo'.
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+# El protocolo vive en 'Codes-Redes/Comun' (compartido con los clientes)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Comun"))
+
+# ### Importar nuestros módulos ###
+import config
+import protocolo
+import logger
+import command_handler
+import network_utils
+import relay as relay_mod
+from almacen import AlmacenMensajes
+from ids import GeneradorIds, a_int
+from indice_mensajes import IndiceMensajes
+from limites import ControlAdmision
+from metricas import Metricas, ServidorMetricas
+from registro import ListaUsuarios, RegistroConexiones, clave_nombre, nombre_valido
+from salas import Salas
+from sesion import Sesion
+from temporizadores import RuedaTemporizadores
+
+# Los frames que siempre son iguales se serializan una sola vez
+FRAME_CLEAR = protocolo.Frame({"type": "clear"})
+FRAME_PING = protocolo.Frame({"type": "ping"})
+FRAME_PONG = protocolo.Frame({"type": "pong"})
+
+
+class ChatServer:
+    """
+    Servidor de chat asíncrono.
+
+    Habla el protocolo de 'protocolo.py': frames JSON delimitados por
+    '\\n' en ambos sentidos; el primer frame es el saludo con el usuario.
+    """
+
+    def __init__(self, host=config.HOST, port=config.PORT, on_evento=None,
+                 politica=config.POLITICA_DESBORDE, nodo=config.NODO_ID,
+                 relay=None, reuse_port=False, metricas_port=config.METRICAS_PORT,
+                 almacen=config.ALMACEN_DB):
+        self.host = host
+        self.port = port
+        self.nodo = nodo
+        self.relay = relay  # Relay con los otros nodos (None = un solo proceso)
+        self.reuse_port = reuse_port  # Varios procesos escuchando el mismo puerto
+        self.politica = politica  # Política de desborde de las colas de salida
+        self.on_evento = on_evento  # Callback opcional (ej. la GUI)
+        self.clientes = RegistroConexiones()  # writer -> Sesion y username -> Sesion
+        self.salas = Salas()  # Índice sala -> miembros (cada sala con su historial)
+        self.indice = IndiceMensajes()  # Todos los IDs enviados (para validar 'delete')
+        self.ids = GeneradorIds(nodo)  # IDs crecientes (y únicos entre nodos)
+        # Todos los mensajes en disco, para /historial y /buscar (None = apagado)
+        self.almacen = AlmacenMensajes(almacen) if almacen else None
+        self._tareas = set()  # Tareas sueltas en curso (ej. comandos async)
+        self.usuarios = ListaUsuarios()  # Conectados en todos los nodos (ordenados)
+        self._presencia = {}  # Cambios sin avisar: {clave_nombre: (username, en_linea)}
+        self._sin_foto = []  # Sesiones nuevas que esperan la foto de la presencia
+        self._tarea_presencia = None
+        self.admision = ControlAdmision()  # Topes globales (conexiones y bytes en vuelo)
+        # Una sola rueda de temporizadores para los heartbeats de todas las sesiones
+        self.rueda = RuedaTemporizadores(config.RUEDA_RESOLUCION,
+                                         max(config.HEARTBEAT_SEG, config.TIMEOUT_INACTIVO))
+        self.expulsados_inactivos = 0
+        self._tarea_rueda = None
+
+        # --- Métricas ---
+        self.metricas = Metricas()
+        self.metricas_port = metricas_port
+        # Contadores de las sesiones ya cerradas (las vivas se suman al pedir las métricas)
+        self._cerradas = {"frames": 0, "bytes": 0, "descartados": 0,
+                          "sin_comprimir": 0, "comprimidos": 0, "segundos_compresion": 0.0}
+        self._endpoint = None
+        self._tarea_muestreo = None
+        self.loop = None
+        self._server = None
+
+    # --- Eventos y Log ---
+
+    def log_y_mostrar(self, mensaje):
+        """
+        Paso 1: Escribe el mensaje en el archivo de log.
+        Paso 2: Avisa al observador (si hay uno, ej. la GUI).
+        """
+        logger.escribir_log(mensaje)
+
+        if self.on_evento:
+            timestamp = datetime.now().strftime("%H:%M:%S")  # Hora corta
+            self.on_evento(f"[{timestamp}] {mensaje}")
+
+    # --- Ciclo de Vida ---
+
+    async def start(self):
+        """Abre el socket de escucha (no bloquea)."""
+        self.loop = asyncio.get_running_loop()
+        network_utils.subir_limite_descriptores()
+        self._server = await asyncio.start_server(
+            self.manejar_cliente, self.host, self.port,
+            backlog=config.BACKLOG, reuse_address=True,
+            reuse_port=self.reuse_port or None)
+        self.log_y_mostrar(f"Servidor escuchando en {self.host}:{self.port}")
+        if self.almacen is not None:
+            try:
+                self.almacen.iniciar()
+            except sqlite3.Error as e:
+                self.log_y_mostrar(f"No se pudo abrir el almacén {self.almacen.ruta}: {e}")
+                self.almacen = None
+        if config.HEARTBEAT_SEG:
+            self._tarea_rueda = asyncio.create_task(self.rueda.ejecutar(self._revisar_sesion))
+        self._tarea_muestreo = asyncio.create_task(self._muestrear_metricas())
+        self._tarea_presencia = asyncio.create_task(self._enviar_presencia())
+        if self.metricas_port:
+            self._endpoint = ServidorMetricas(config.METRICAS_HOST, self.metricas_port,
+                                              self.estadisticas)
+            try:
+                await self._endpoint.iniciar()
+                self.log_y_mostrar(f"Métricas en http://{config.METRICAS_HOST}:{self.metricas_port}/metrics")
+            except OSError as e:
+                self.log_y_mostrar(f"No se pudo abrir el puerto de métricas {self.metricas_port}: {e}")
+                self._endpoint = None
+        if self.relay is not None:
+            await self.relay.iniciar(self.nodo, self._evento_remoto, self._anunciar_nodo)
+
+    async def serve_forever(self):
+        """Atiende conexiones hasta que se cancele la tarea."""
+        if self._server is None:
+            await self.start()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for sesion in list(self.clientes.values()):
+                sesion.cerrar()
+            if self._tarea_rueda is not None:
+                self._tarea_rueda.cancel()
+            if self._tarea_muestreo is not None:
+                self._tarea_muestreo.cancel()
+            if self._tarea_presencia is not None:
+                self._tarea_presencia.cancel()
+            if self._endpoint is not None:
+                self._endpoint.cerrar()
+            if self.relay is not None:
+                self.relay.cerrar()
+            if self.almacen is not None:
+                self.almacen.cerrar()
+            self.log_y_mostrar("Servidor detenido.")
+
+    def ejecutar(self):
+        """Punto de entrada bloqueante: crea el event loop y atiende clientes."""
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            pass
+
+    def desde_hilo(self, funcion, *args):
+        """
+        Ejecuta 'funcion' dentro del event loop desde otro hilo (ej. Tkinter).
+        Si el servidor aún no arrancó, no hay clientes y se ejecuta directo.
+        """
+        if self.loop is None or self.loop.is_closed():
+            funcion(*args)
+        else:
+            self.loop.call_soon_threadsafe(funcion, *args)
+
+    # --- Lógica de Red ---
+
+    def broadcast_data(self, frame, sender=None, sala=None):
+        """
+        Encola un frame para los miembros de 'sala' (o para todos los
+        clientes si no se indica), excepto el remitente.
+        Acepta un 'protocolo.Frame' o un diccionario, que se serializa
+        una sola vez para todos.
+
+        Sólo encola: cada sesión tiene su propio escritor, así que un
+        cliente lento no retrasa a los demás.
+        """
+        inicio = time.perf_counter()
+        if not isinstance(frame, protocolo.Frame):
+            frame = protocolo.Frame(frame)
+
+        destinatarios = sala.miembros if sala is not None else self.clientes.values()
+        for sesion in list(destinatarios):
+            if sesion is not sender:
+                sesion.enviar(frame)
+
+        self.metricas.broadcasts += 1
+        self.metricas.latencia_broadcast.observar(time.perf_counter() - inicio)
+
+    async def _leer_frames(self, reader, decoder):
+        """
+        Lee del socket hasta tener al menos un frame completo.
+        Devuelve todos los frames que llegaron juntos, o None si se cerró.
+        Si el servidor tiene demasiados bytes por enviar, no lee hasta que bajen.
+        """
+        while True:
+            await self.admision.esperar_lugar()
+            data = await reader.read(config.RECV_SIZE)
+            if not data:
+                return None
+            frames = decoder.feed(data)
+            self.metricas.bytes_entrantes += len(data)
+            self.metricas.frames_entrantes += len(frames)
+            if decoder.descartados:
+                self.metricas.frames_entrantes_descartados += decoder.descartados
+                raise Exception(f"Frame de más de {config.MAX_FRAME} bytes.")
+            if frames:
+                return frames
+
+    async def _esperar_turno(self, sesion):
+        """
+        Token bucket de la conexión y de su sala. Mientras se espera no se
+        lee más del socket: lo que mande el cliente queda en el buffer del
+        kernel y TCP lo frena (no se acumula en la memoria del servidor).
+        """
+        while True:
+            sala = sesion.sala
+            espera = max(sesion.limite.espera(), sala.limite.espera() if sala else 0.0)
+            if espera <= 0:
+                sesion.limite.consumir()
+                if sala:
+                    sala.limite.consumir()
+                return
+
+            if not sesion.frenadas:
+                self.log_y_mostrar(f"⏳ {sesion.username} superó el límite de mensajes (se lo frena).")
+            sesion.frenadas += 1
+            sesion.segundos_frenada += espera
+            self.admision.frenadas += 1
+            self.admision.segundos_frenados += espera
+            await asyncio.sleep(espera)
+            # Tiene frames esperando: no está inactivo aunque no lo leamos
+            sesion.ultima_actividad = self.loop.time()
+
+    def estadisticas_limites(self, maximo=10):
+        """Contadores globales y las sesiones más frenadas (para operadores)."""
+        frenadas = sorted((s for s in self.clientes.values() if s.frenadas),
+                          key=lambda s: s.frenadas, reverse=True)
+        datos = self.admision.estadisticas()
+        datos["mas_frenados"] = [(s.username, s.frenadas, round(s.segundos_frenada, 3))
+                                 for s in frenadas[:maximo]]
+        return datos
+
+    def _rechazar(self, writer, code, texto):
+        """Manda un frame de error antes de cerrar una conexión que no se acepta."""
+        writer.write(protocolo.codificar({
+            "type": "error",
+            "code": code,
+            "prefix": "📢 Servidor: ",
+            "payload": texto
+        }))
+
+    async def manejar_cliente(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        if not self.admision.admitir():
+            self._rechazar(writer, "servidor_lleno", "El servidor está lleno. Intenta más tarde.")
+            writer.close()
+            return
+
+        network_utils.configurar_keepalive(
+            writer.get_extra_info("socket"), config.TCP_KEEPALIVE_IDLE,
+            config.TCP_KEEPALIVE_INTERVALO, config.TCP_KEEPALIVE_SONDEOS)
+
+        self.metricas.conexiones_totales += 1
+        sesion = None
+        decoder = protocolo.DecodificadorFrames(config.MAX_FRAME)
+        try:
+            # El primer frame es el saludo con el nombre de usuario
+            frames = await self._leer_frames(reader, decoder)
+            if not frames:
+                raise Exception("No se recibió nombre de usuario.")
+            saludo = protocolo.decodificar(frames.pop(0))
+            username = (saludo.get("username") or saludo.get("payload") or "").strip()
+            if not nombre_valido(username):
+                self._rechazar(writer, "nombre_invalido",
+                               f"Nombre inválido: hasta {config.NOMBRE_MAX} letras, números, '_', '.' o '-' (sin espacios).")
+                await writer.drain()
+                return
+
+            if username in self.usuarios or self.clientes.nombre_en_uso(username):
+                # Nombre repetido: se le avisa y se cierra (sin anunciarlo a nadie)
+                self._rechazar(writer, "nombre_en_uso",
+                               f"El nombre '{username}' ya está en uso. Elige otro.")
+                await writer.drain()
+                return
+
+            # El formato de salida ('json' o 'binario') y la compresión se negocian en el saludo
+            sesion = Sesion(reader, writer, username, addr, self.politica, self.admision,
+                            saludo.get("formato"), saludo.get("compresion"), self.ids)
+            self.clientes.registrar(sesion)
+            self.usuarios.agregar(username, self.nodo)
+            self._cambio_presencia(username, True)
+            self._sin_foto.append(sesion)  # La foto de quién está le llega en el próximo lote
+            sesion.iniciar_escritor()
+            if config.HEARTBEAT_SEG:
+                self.rueda.programar(sesion, config.HEARTBEAT_SEG)
+
+            # Loguear localmente
+            self.log_y_mostrar(f"🔗 {username} se ha conectado desde {addr}")
+            self._publicar({"tipo": "conectado", "username": username})
+
+            # Entrar a la sala pedida (o a la general). Se le manda el historial
+            # de la sala, o sólo lo que se perdió si reconecta con 'since_id'.
+            # La llegada no se anuncia con texto: ya va en la presencia
+            nombre_sala = saludo.get("sala")
+            if not Salas.nombre_valido(nombre_sala):
+                nombre_sala = self.salas.por_defecto
+            self.cambiar_sala(sesion, nombre_sala, saludo.get("since_id"), anunciar=False)
+
+            # Procesamos todos los frames de cada lectura (clientes en pipeline)
+            while frames is not None:
+                for frame in frames:
+                    datos = protocolo.decodificar(frame)
+                    # El heartbeat (ping/pong) no gasta tokens: un cliente
+                    # frenado tiene que poder contestarlo a tiempo
+                    if datos.get("type") not in ("ping", "pong"):
+                        await self._esperar_turno(sesion)
+                    self.procesar_frame(sesion, datos)
+                frames = await self._leer_frames(reader, decoder)
+                # Actividad = lo que se leyó, no cuándo se termina de procesar
+                sesion.ultima_actividad = self.loop.time()
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"Error con {addr}: {e}")
+        finally:
+            self.admision.liberar()
+            if sesion is not None:
+                self.rueda.cancelar(sesion)
+            if sesion is not None and self.clientes.quitar(sesion):
+                self.usuarios.quitar(sesion.username, self.nodo)
+                self._cambio_presencia(sesion.username, False)
+                # Enviar notificación de salida (sólo a su sala)
+                self.log_y_mostrar(f"❌ {sesion.username} (conexión cerrada).")
+                self._publicar({"tipo": "desconectado", "username": sesion.username})
+
+                self.salas.salir(sesion)  # La salida va en la presencia, sin texto
+            if sesion:
+                sesion.cerrar()
+                self._cerradas["frames"] += sesion.frames_enviados
+                self._cerradas["bytes"] += sesion.bytes_enviados
+                self._cerradas["descartados"] += sesion.descartados
+                self._cerradas["sin_comprimir"] += sesion.bytes_sin_comprimir
+                self._cerradas["comprimidos"] += sesion.bytes_comprimidos
+                self._cerradas["segundos_compresion"] += sesion.segundos_compresion
+            else:
+                writer.close()
+
+    def _revisar_sesion(self, sesion):
+        """
+        Le tocó el turno a una sesión en la rueda: si no se supo nada de
+        ella en HEARTBEAT_SEG se le manda un ping, y si tampoco contestó
+        en TIMEOUT_INACTIVO se la desconecta.
+        """
+        if sesion.cerrada:
+            return
+        inactivo = self.loop.time() - sesion.ultima_actividad
+
+        if config.TIMEOUT_INACTIVO and inactivo >= config.TIMEOUT_INACTIVO:
+            self.expulsados_inactivos += 1
+            self.log_y_mostrar(f"⌛ {sesion.username} no responde hace {int(inactivo)} s (se lo desconecta).")
+            sesion.cerrar()  # manejar_cliente ve el cierre y hace la limpieza
+            return
+
+        if inactivo >= config.HEARTBEAT_SEG:
+            sesion.enviar(FRAME_PING)
+            espera = (config.TIMEOUT_INACTIVO - inactivo) if config.TIMEOUT_INACTIVO else config.HEARTBEAT_SEG
+        else:
+            espera = config.HEARTBEAT_SEG - inactivo
+        self.rueda.programar(sesion, espera)
+
+    # --- Métricas ---
+
+    def _salientes(self):
+        """Frames escritos a los sockets desde que arrancó (vivas + cerradas)."""
+        return self._cerradas["frames"] + sum(s.frames_enviados for s in self.clientes.values())
+
+    async def _muestrear_metricas(self):
+        while True:
+            self.metricas.muestrear(self._salientes())
+            await asyncio.sleep(1)
+
+    def estadisticas(self):
+        """
+        Foto de todas las métricas: (datos, histogramas). La usan '/stats',
+        la GUI y el endpoint HTTP; recorre las sesiones una sola vez.
+        """
+        m = self.metricas
+        c = self._cerradas
+        frames = bytes_salientes = descartados = cola_total = cola_max = 0
+        sin_comprimir, comprimidos, seg_compresion = (
+            c["sin_comprimir"], c["comprimidos"], c["segundos_compresion"])
+        sesiones_comprimidas = 0
+        for s in self.clientes.values():
+            frames += s.frames_enviados
+            bytes_salientes += s.bytes_enviados
+            descartados += s.descartados
+            cola_total += len(s.cola)
+            cola_max = max(cola_max, len(s.cola))
+            if s.bytes_sin_comprimir:
+                sesiones_comprimidas += 1
+                sin_comprimir += s.bytes_sin_comprimir
+                comprimidos += s.bytes_comprimidos
+                seg_compresion += s.segundos_compresion
+        entrantes_seg, salientes_seg = m.tasas()
+
+        datos = {
+            "nodo": self.nodo,
+            "conexiones": {
+                "activas": len(self.clientes),
+                "totales": m.conexiones_totales,
+                "remotas": len(self.usuarios) - self.usuarios.de_nodo(self.nodo),
+            },
+            "mensajes": {
+                "entrantes": m.frames_entrantes,
+                "salientes": self._cerradas["frames"] + frames,
+                "entrantes_por_seg": round(entrantes_seg, 1),
+                "salientes_por_seg": round(salientes_seg, 1),
+                "descartados_entrada": m.frames_entrantes_descartados,
+                "descartados_salida": self._cerradas["descartados"] + descartados,
+                "broadcasts": m.broadcasts,
+                "comandos": m.comandos,
+            },
+            "bytes": {
+                "entrantes": m.bytes_entrantes,
+                "salientes": self._cerradas["bytes"] + bytes_salientes,
+            },
+            "compresion": {
+                "sesiones": sesiones_comprimidas,
+                "bytes_entrada": sin_comprimir,
+                "bytes_salida": comprimidos,
+                "ratio": round(sin_comprimir / comprimidos, 2) if comprimidos else 0,
+                "cpu_segundos": round(seg_compresion, 4),
+            },
+            "colas": {
+                "mensajes_total": cola_total,
+                "mensajes_max": cola_max,
+            },
+            "log": logger.escritor.estadisticas(),
+            "limites": self.estadisticas_limites(),  # Incluye las sesiones más frenadas
+            "heartbeat": {
+                "expulsados_inactivos": self.expulsados_inactivos,
+                "sesiones_en_rueda": len(self.rueda),
+            },
+            "salas": len(self.salas),
+            "mensajes_indexados": len(self.indice),
+        }
+        if self.almacen is not None:
+            datos["almacen"] = self.almacen.estadisticas()
+        if self.relay is not None:
+            datos["relay"] = {"publicados": self.relay.publicados,
+                              "recibidos": self.relay.recibidos,
+                              "perdidos": self.relay.perdidos,
+                              "invalidos": self.relay.invalidos}
+        histogramas = {
+            "latencia_broadcast_segundos": m.latencia_broadcast,
+            "latencia_comando_segundos": m.latencia_comando,
+            "latencia_consulta_segundos": m.latencia_consulta,
+        }
+        return datos, histogramas
+
+    # --- Presencia ---
+    #
+    # Quién está conectado viaja en frames 'presence' (no en texto):
+    #   {"type": "presence", "snapshot": true, "online": [...]}   foto completa
+    #   (partida si es grande: las partes siguientes llevan "sigue": true)
+    #   {"type": "presence", "online": [...], "offline": [...]}   cambios
+    # Los cambios se juntan durante PRESENCIA_INTERVALO y salen en un solo
+    # frame (compartido por todas las sesiones): si miles reconectan a la
+    # vez, cada cliente recibe unos pocos frames y no uno por usuario.
+
+    def _cambio_presencia(self, username, en_linea):
+        """Anota un cambio para el próximo lote."""
+        clave = clave_nombre(username)
+        anterior = self._presencia.get(clave)
+        if anterior is None:
+            self._presencia[clave] = (username, en_linea)
+        elif anterior[1] != en_linea:
+            del self._presencia[clave]  # Entró y salió (o al revés): no hay nada que avisar
+
+    async def _enviar_presencia(self):
+        while True:
+            await asyncio.sleep(config.PRESENCIA_INTERVALO)
+            self._repartir_presencia()
+
+    def _repartir_presencia(self):
+        """Manda los cambios juntados a todos y la foto completa a las sesiones nuevas."""
+        nuevas = [s for s in self._sin_foto if not s.cerrada]
+        self._sin_foto = []
+
+        if self._presencia:
+            cambios = self._presencia.values()
+            frames = self._frames_presencia([u for u, en_linea in cambios if en_linea],
+                                            [u for u, en_linea in cambios if not en_linea])
+            self._presencia = {}
+            excluidas = set(nuevas)  # La foto ya incluye estos cambios
+            for sesion in self.clientes.values():
+                if sesion not in excluidas:
+                    for frame in frames:
+                        sesion.enviar(frame)
+
+        if nuevas:
+            _, nombres = self.usuarios.pagina(0, len(self.usuarios))
+            frames = self._frames_presencia(nombres, (), foto=True)
+            for sesion in nuevas:
+                for frame in frames:
+                    sesion.enviar(frame)
+
+    def _frames_presencia(self, entraron, salieron, foto=False):
+        """Frames 'presence' (serializados una vez), de a PRESENCIA_MAX_NOMBRES nombres."""
+        maximo = config.PRESENCIA_MAX_NOMBRES
+        partes = [{"type": "presence", "online": entraron[i:i + maximo]}
+                  for i in range(0, len(entraron), maximo)]
+        partes += [{"type": "presence", "offline": salieron[i:i + maximo]}
+                   for i in range(0, len(salieron), maximo)]
+        if foto:
+            if not partes:
+                partes = [{"type": "presence", "online": []}]
+            for i, parte in enumerate(partes):
+                parte["snapshot"] = True
+                if i:
+                    parte["sigue"] = True  # Completa la misma foto (no la reemplaza)
+        elif len(partes) == 2 and len(entraron) <= maximo and len(salieron) <= maximo:
+            partes = [{"type": "presence", "online": entraron, "offline": salieron}]
+        return [protocolo.Frame(parte) for parte in partes]
+
+    # --- Salas ---
+
+    def cambiar_sala(self, sesion, nombre, since_id=None, anunciar=True):
+        """
+        Mueve la sesión a otra sala: avisa la salida en la anterior, le
+        manda el historial de la nueva y avisa la llegada sólo ahí (si
+        'anunciar'; al conectarse la llegada ya va en la presencia).
+        """
+        anterior, sala = self.salas.entrar(sesion, nombre)
+        if anterior is not None:
+            self._aviso_sala(anterior, f"{sesion.username} se fue a la sala '{nombre}'.")
+
+        # El cliente recuerda su sala y la pide en el saludo al reconectar
+        sesion.enviar(protocolo.Frame({"type": "room", "sala": nombre}))
+        for frame in sala.historial.desde(since_id, self.indice):
+            sesion.enviar(frame)
+
+        if not anunciar:
+            return
+        if nombre == self.salas.por_defecto:
+            self._aviso_sala(sala, f"{sesion.username} se ha unido al chat.")
+        else:
+            self._aviso_sala(sala, f"{sesion.username} se ha unido a la sala '{nombre}'.")
+
+    def _aviso_sala(self, sala, texto):
+        """Aviso del servidor (unión/salida) para los miembros de una sala."""
+        frame = self._frame_chat(self.ids.siguiente(), "📢 Servidor: ", texto, "Servidor", sala)
+        self.broadcast_data(frame, sala=sala)
+
+    def _frame_chat(self, msg_id, prefix, payload, autor, sala=None):
+        """
+        Crea un frame de chat, lo guarda en el historial reciente de su
+        sala (de todas si es global), lo registra en el índice con su
+        autor y lo guarda en el almacén en disco. También lo publica a los
+        otros nodos, que lo entregan a sus propios miembros de la sala.
+        """
+        frame = protocolo.Frame({
+            "type": "chat",
+            "id": msg_id,
+            "prefix": prefix,
+            "payload": payload
+        })
+        self._guardar_chat(frame, autor, sala)
+        self._publicar({"tipo": "chat", "sala": sala.nombre if sala is not None else None,
+                        "autor": autor, "frame": frame.campos})
+        return frame
+
+    def _guardar_chat(self, frame, autor, sala):
+        msg_id = frame.campos["id"]
+        for s in ([sala] if sala is not None else self.salas):
+            s.historial.agregar(msg_id, frame)
+        self.indice.agregar(msg_id, autor)
+        self._persistir(frame.campos, autor, sala.nombre if sala is not None else None)
+
+    def _persistir(self, campos, autor, nombre_sala):
+        """Encola el mensaje para el almacén en disco (lo escribe otro hilo)."""
+        msg_id = a_int(campos.get("id"))
+        if self.almacen is not None and msg_id is not None:
+            self.almacen.guardar(msg_id, nombre_sala, autor,
+                                 campos.get("prefix", ""), campos.get("payload", ""))
+
+    async def consultar_almacen(self, consulta, *args):
+        """
+        Corre una consulta del almacén en un hilo lector (el event loop
+        sigue atendiendo) y devuelve las filas, o None si falló.
+        """
+        inicio = time.perf_counter()
+        try:
+            return await self.almacen.consultar(consulta, *args)
+        except sqlite3.Error as e:
+            print(f"Error consultando el almacén: {e}")
+            return None
+        finally:
+            self.metricas.latencia_consulta.observar(time.perf_counter() - inicio)
+
+    def lanzar(self, corrutina):
+        """Corre 'corrutina' como tarea aparte (ej. un comando async) sin esperarla."""
+        tarea = self.loop.create_task(corrutina)
+        self._tareas.add(tarea)  # Referencia fuerte hasta que termine
+        tarea.add_done_callback(self._fin_tarea)
+
+    def _fin_tarea(self, tarea):
+        self._tareas.discard(tarea)
+        if not tarea.cancelled() and tarea.exception() is not None:
+            print(f"Error en una tarea: {tarea.exception()!r}")
+
+    def procesar_frame(self, sesion, data):
+        """Despacha un frame ya decodificado de un cliente."""
+        tipo = data.get("type")
+        if tipo == "ping":
+            sesion.enviar(FRAME_PONG)
+            return
+        if tipo != "chat":
+            return  # 'pong' u otros: ya cuentan como actividad
+        msg = data.get("payload", "")
+        if not msg:
+            return
+
+        if msg.startswith('/'):
+            # Es un comando, pasarlo al command_handler
+            inicio = time.perf_counter()
+            command_handler.procesar_comando(sesion, msg, self)
+            self.metricas.comandos += 1
+            self.metricas.latencia_comando.observar(time.perf_counter() - inicio)
+        else:
+            self.mensaje_chat(sesion, msg)
+
+    def mensaje_directo(self, sesion, destino, msg):
+        """
+        Envía un mensaje privado a un solo usuario (más el eco al remitente).
+        Se busca al destinatario por nombre en el registro, sin recorrer a
+        los demás clientes. No pasa por el historial de ninguna sala.
+        Devuelve False si el usuario no está conectado.
+        """
+        destinatario = self.clientes.por_nombre(destino)
+        remoto = self.usuarios.get(destino) if destinatario is None else None
+        if destinatario is None and remoto is None:
+            return False
+        nombre_destino = destinatario.username if destinatario is not None else remoto[1]
+
+        msg_id = self.ids.siguiente()
+        self.log_y_mostrar(f"[ID: {msg_id}] 🔒 {sesion.username} → {nombre_destino}: {msg}")
+        self.indice.agregar(msg_id, sesion.username)
+
+        frame = protocolo.Frame({
+            "type": "chat", "id": msg_id, "privado": True,
+            "prefix": f"🔒 {sesion.username} (privado): ", "payload": msg
+        })
+        if destinatario is not None:
+            destinatario.enviar(frame)
+        else:
+            # Está en otro nodo: sólo ese nodo lo entrega
+            self._publicar({"tipo": "directo", "destino": nombre_destino,
+                            "autor": sesion.username, "frame": frame.campos})
+
+        if destinatario is not sesion:
+            sesion.enviar(protocolo.Frame({
+                "type": "chat", "id": msg_id, "privado": True,
+                "prefix": f"🔒 Tú → {nombre_destino}: ", "payload": msg
+            }))
+        return True
+
+    def mensaje_chat(self, sesion, msg):
+        """Reenvía un mensaje de chat normal a los demás miembros de su sala."""
+        # 1. Generar un ID único (y creciente) para este mensaje
+        msg_id = self.ids.siguiente()
+        prefix = f"💬 {sesion.username}: "
+
+        # 2. Loguearlo localmente (servidor) con su ID
+        self.log_y_mostrar(f"[ID: {msg_id}] {prefix}{msg}")
+
+        # 3. Serializar el paquete JSON una sola vez (y guardarlo en el historial)
+        frame = self._frame_chat(msg_id, prefix, msg, sesion.username, sesion.sala)
+
+        # 4. Enviar a los demás de la sala
+        self.broadcast_data(frame, sender=sesion, sala=sesion.sala)
+
+    # --- Acciones de Admin (se llaman con 'desde_hilo' desde la GUI) ---
+
+    def notificacion_admin(self, msg):
+        """Envía un mensaje de admin a todos usando el protocolo JSON."""
+        msg_id = self.ids.siguiente()
+        prefix = "📢 [ADMIN]: "
+
+        # 1. Loguear localmente
+        self.log_y_mostrar(f"[ID: {msg_id}] {prefix}{msg}")
+
+        # 2. Serializar una vez y enviar
+        frame = self._frame_chat(msg_id, prefix, msg, "ADMIN")
+        self.broadcast_data(frame)  # Enviar a todos
+
+    def limpiar_chats(self):
+        """Limpia la pantalla de chat de todos los clientes."""
+        self.log_y_mostrar("[ADMIN_ACTION] Admin ha limpiado las ventanas de chat.")
+        self.salas.limpiar_historiales()  # Los que se conecten después tampoco lo verán
+        self.broadcast_data(FRAME_CLEAR)
+        self._publicar({"tipo": "clear"})
+
+    def eliminar_mensaje(self, id_to_delete):
+        """
+        Elimina un mensaje por su ID: lo marca en el índice (así tampoco
+        aparece en el historial) y envía el comando 'delete' a todos.
+        Devuelve False si el ID no existe o ya estaba eliminado.
+        """
+        if not self.indice.eliminar(id_to_delete):
+            self.log_y_mostrar(f"[ADMIN_ACTION] ID inexistente o ya eliminado: {id_to_delete}")
+            return False
+
+        # El admin puede escribirlo en mayúsculas o sin ceros: los clientes usan la forma canónica
+        valor = a_int(id_to_delete)
+        id_to_delete = f"{valor:016x}"
+        self.log_y_mostrar(f"[ADMIN_ACTION] Admin eliminó mensaje ID: {id_to_delete}")
+        if self.almacen is not None:
+            self.almacen.marcar_borrado(valor)
+        self.broadcast_data(protocolo.Frame({"type": "delete", "id": id_to_delete}))
+        self._publicar({"tipo": "delete", "id": id_to_delete})
+        return True
+
+    # --- Relay entre Nodos ---
+
+    def _publicar(self, evento):
+        """Manda un evento a los otros nodos (si el servidor corre en shards)."""
+        if self.relay is not None:
+            evento["nodo"] = self.nodo
+            self.relay.publicar(evento)
+
+    def _anunciar_nodo(self):
+        """Al (re)conectar con el relay: se anuncia con sus usuarios y pide los de los demás."""
+        self._publicar({"tipo": relay_mod.HOLA,
+                        "usuarios": [s.username for s in self.clientes.values()]})
+
+    def _evento_remoto(self, evento):
+        """
+        Aplica un evento publicado por otro nodo. Se entrega sólo a los
+        clientes locales y no se vuelve a publicar.
+        """
+        tipo = evento.get("tipo")
+        nodo = evento.get("nodo")
+
+        if tipo == "chat":
+            nombre_sala = evento.get("sala")
+            sala = self.salas.get(nombre_sala) if nombre_sala is not None else None
+            if nombre_sala is not None and sala is None:
+                # Nadie está en esa sala en este nodo: queda en el índice, en disco
+                # y en el historial guardado de la sala (si lo hay)
+                self.indice.agregar(evento["frame"]["id"], evento.get("autor", ""))
+                self._persistir(evento["frame"], evento.get("autor", ""), nombre_sala)
+                historial = self.salas.historial_inactivo(nombre_sala)
+                if historial is not None:
+                    historial.agregar(evento["frame"]["id"], protocolo.Frame(evento["frame"]))
+                return
+            frame = protocolo.Frame(evento["frame"])
+            self._guardar_chat(frame, evento.get("autor", ""), sala)
+            self.broadcast_data(frame, sala=sala)
+
+        elif tipo == "directo":
+            destinatario = self.clientes.por_nombre(evento.get("destino", ""))
+            if destinatario is not None:
+                self.indice.agregar(evento["frame"]["id"], evento.get("autor", ""))
+                destinatario.enviar(protocolo.Frame(evento["frame"]))
+
+        elif tipo == "delete":
+            if self.indice.eliminar(evento.get("id")) and self.almacen is not None:
+                self.almacen.marcar_borrado(a_int(evento.get("id")))
+            self.broadcast_data(protocolo.Frame({"type": "delete", "id": evento.get("id")}))
+
+        elif tipo == "clear":
+            self.salas.limpiar_historiales()
+            self.broadcast_data(FRAME_CLEAR)
+
+        elif tipo == "conectado":
+            self.usuarios.agregar(evento["username"], nodo)
+            self._cambio_presencia(evento["username"], True)
+
+        elif tipo == "desconectado":
+            if self.usuarios.quitar(evento["username"], nodo):
+                self._cambio_presencia(evento["username"], False)
+
+        elif tipo in (relay_mod.HOLA, relay_mod.USUARIOS, relay_mod.NODO_CAIDO):
+            # Se reemplaza todo lo que se sabía de ese nodo
+            entraron, salieron = self.usuarios.reemplazar_nodo(nodo, evento.get("usuarios", ()))
+            for username in entraron:
+                self._cambio_presencia(username, True)
+            for username in salieron:
+                self._cambio_presencia(username, False)
+            if tipo == relay_mod.HOLA:
+                # Un nodo nuevo (o que reconectó): le contamos quién está acá
+                self._publicar({"tipo": relay_mod.USUARIOS,
+                                "usuarios": [s.username for s in self.clientes.values()]})
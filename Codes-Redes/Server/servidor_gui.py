@@ -0,0 +1,250 @@
+"""
+GUI de administración (Tkinter) del servidor.
+
+Es un cliente opcional del núcleo 'servidor_core.ChatServer': recibe los
+eventos del servidor y le manda las acciones de admin.
+"""
+import threading
+from collections import deque
+import tkinter as tk
+from tkinter import scrolledtext
+from tkinter import ttk
+
+# ### Importar nuestros módulos ###
+import config
+import metricas
+import network_utils
+
+
+class ServidorGUI:
+    """Ventana de administración conectada a un ChatServer."""
+
+    def __init__(self, servidor):
+        self.servidor = servidor
+        self.servidor.on_evento = self.mostrar
+
+        # --- Cola de eventos hacia la consola ---
+        # El servidor sólo agrega líneas (deque.append es seguro entre hilos);
+        # el mainloop de Tk las vuelca en lotes con 'after'. Si la pantalla
+        # no da abasto, se conservan sólo las más recientes.
+        self._pendientes = deque(maxlen=config.GUI_MAX_LINEAS)
+        self._contador = 0
+        self.omitidas = 0  # Eventos no mostrados (muestreo o desborde)
+        self.pausada = False
+
+        # --- Interfaz Tkinter ---
+        self.ventana = tk.Tk()
+        self.ventana.title("Servidor TCP - Chat (Modular)")
+        self.ventana.geometry("500x550")  # Aumenté un poco la altura
+        self.ventana.configure(bg=config.BG_COLOR)
+
+        self._configurar_estilo()
+        self._crear_widgets()
+
+    def _configurar_estilo(self):
+        # --- Configuración de Estilo Dark Mode ---
+        style = ttk.Style(self.ventana)
+        style.theme_use('clam')
+        style.configure('.',
+                        background=config.BG_COLOR,
+                        foreground=config.FG_COLOR,
+                        fieldbackground=config.WIDGET_BG,
+                        borderwidth=0)
+        style.configure('TFrame', background=config.BG_COLOR)
+        style.configure('TButton',
+                        background=config.BTN_BG,
+                        foreground=config.BTN_FG,
+                        bordercolor=config.WIDGET_BG)
+        style.map('TButton',
+                  background=[('active', config.BTN_ACTIVE), ('disabled', config.WIDGET_BG)],
+                  foreground=[('disabled', config.BTN_BG)])
+        style.configure('TLabel', background=config.BG_COLOR, foreground=config.FG_COLOR)
+        style.configure('TEntry',
+                        foreground=config.WIDGET_FG,
+                        fieldbackground=config.WIDGET_BG,
+                        insertcolor=config.ENTRY_CURSOR)
+
+    def _crear_widgets(self):
+        # --- Creación de Widgets ---
+        main_frame = ttk.Frame(self.ventana, padding="10 10 10 10", style='TFrame')
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.chat_area = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, height=15,
+                                                   font=("Arial", 10),
+                                                   bg=config.WIDGET_BG,
+                                                   fg=config.WIDGET_FG,
+                                                   insertbackground=config.ENTRY_CURSOR,
+                                                   state='normal')
+        self.chat_area.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.chat_area.config(state=tk.DISABLED)
+
+        self.status_label = ttk.Label(main_frame, text="🔴 Servidor detenido",
+                                      foreground=config.RED_STATUS,
+                                      font=("Arial", 10, "bold"), anchor="center")
+        self.status_label.pack(pady=5, fill=tk.X)
+
+        self.btn_iniciar = ttk.Button(main_frame, text="Iniciar Servidor",
+                                      command=self.iniciar_servidor)
+        self.btn_iniciar.pack(pady=5, fill=tk.X, padx=5)
+
+        # -- Frame de Control de la Consola ---
+        consola_frame = ttk.Frame(main_frame, style='TFrame')
+        consola_frame.pack(fill=tk.X, padx=5)
+
+        self.btn_pausar = ttk.Button(consola_frame, text="Pausar Consola",
+                                     command=self.on_toggle_pausa)
+        self.btn_pausar.pack(side=tk.LEFT)
+
+        btn_stats = ttk.Button(consola_frame, text="Estadísticas",
+                               command=self.on_mostrar_estadisticas)
+        btn_stats.pack(side=tk.LEFT, padx=5)
+
+        self.omitidas_label = ttk.Label(consola_frame, text="")
+        self.omitidas_label.pack(side=tk.LEFT, padx=10)
+
+        # -- Frame de Controles de Admin ---
+        admin_frame = ttk.Frame(main_frame, style='TFrame')
+        admin_frame.pack(fill=tk.X, padx=5, pady=(10, 5))
+
+        self.admin_msg_entry = ttk.Entry(admin_frame, style='TEntry')
+        self.admin_msg_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+
+        btn_send_admin = ttk.Button(admin_frame, text="Enviar Notificación",
+                                    command=self.on_send_admin_notification)
+        btn_send_admin.pack(side=tk.LEFT)
+
+        btn_clear_chat = ttk.Button(admin_frame, text="Limpiar Chats",
+                                    command=self.on_clear_all_chats, style='TButton')
+        btn_clear_chat.pack(side=tk.LEFT, padx=5)
+
+        # --- Frame de Eliminar por ID ---
+        delete_frame = ttk.Frame(main_frame, style='TFrame')
+        delete_frame.pack(fill=tk.X, padx=5, pady=5)
+
+        ttk.Label(delete_frame, text="ID de Mensaje:").pack(side=tk.LEFT, padx=5)
+        self.admin_id_entry = ttk.Entry(delete_frame, style='TEntry', width=15)
+        self.admin_id_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+
+        btn_delete_id = ttk.Button(delete_frame, text="Eliminar Mensaje",
+                                   command=self.on_delete_by_id)
+        btn_delete_id.pack(side=tk.LEFT)
+
+        # --- Frame de Información de Conexión ---
+        info_frame = ttk.Frame(main_frame, style='TFrame')
+        info_frame.pack(fill=tk.X, padx=5, pady=(5, 0))
+
+        info_frame.columnconfigure(1, weight=1)
+
+        try:
+            local_ip = network_utils.get_local_ip()
+        except Exception as e:
+            print(f"Error interno al obtener IP: {e}")
+            local_ip = "Error al obtener IP"
+
+        port = self.servidor.port
+
+        # Conexión Local (Misma PC)
+        ttk.Label(info_frame, text="IP Local (Misma PC):", font=("Arial", 10, "bold")).grid(row=0, column=0, sticky="w", padx=5)
+        ip_local_text = tk.Text(info_frame, height=1, borderwidth=0,
+                                bg=config.WIDGET_BG, fg=config.WIDGET_FG,
+                                font=("Courier", 10))
+        ip_local_text.insert(tk.END, f"127.0.0.1:{port}")
+        ip_local_text.config(state=tk.DISABLED)
+        ip_local_text.grid(row=0, column=1, sticky="ew", padx=5)
+
+        # Conexión de Red (LAN)
+        ttk.Label(info_frame, text="IP de Red (LAN):", font=("Arial", 10, "bold")).grid(row=1, column=0, sticky="w", padx=5)
+        ip_lan_text = tk.Text(info_frame, height=1, borderwidth=0,
+                              bg=config.WIDGET_BG, fg=config.WIDGET_FG,
+                              font=("Courier", 10))
+        ip_lan_text.insert(tk.END, f"{local_ip}:{port}")
+        ip_lan_text.config(state=tk.DISABLED)
+        ip_lan_text.grid(row=1, column=1, sticky="ew", padx=5)
+
+        # IP Pública
+        ttk.Label(info_frame, text="IP Pública (Internet):", font=("Arial", 10, "bold")).grid(row=2, column=0, sticky="w", padx=5)
+        ttk.Label(info_frame, text="(Requiere Port Forwarding o VPN)", font=("Arial", 9, "italic")).grid(row=2, column=1, sticky="w", padx=5)
+
+    # --- Eventos del Servidor ---
+
+    def mostrar(self, linea):
+        """
+        Recibe una línea de evento del servidor (desde cualquier hilo).
+        No toca Tkinter: sólo la encola para el próximo volcado.
+        """
+        self._contador += 1
+        if self._contador % config.GUI_MUESTREO:
+            self.omitidas += 1
+            return
+        if len(self._pendientes) == self._pendientes.maxlen:
+            self.omitidas += 1  # La más vieja se pierde
+        self._pendientes.append(linea)
+
+    def _volcar_eventos(self):
+        """Vuelca en un solo 'insert' todo lo acumulado (corre en el mainloop)."""
+        if self._pendientes and not self.pausada:
+            lineas = []
+            while self._pendientes:
+                lineas.append(self._pendientes.popleft())
+
+            self.chat_area.config(state=tk.NORMAL)
+            self.chat_area.insert(tk.END, "\n".join(lineas) + "\n")
+
+            # Recortar el scrollback para que la consola no crezca sin límite
+            total = int(self.chat_area.index("end-1c").split(".")[0])
+            sobrantes = total - config.GUI_MAX_LINEAS
+            if sobrantes > 0:
+                self.chat_area.delete("1.0", f"{sobrantes + 1}.0")
+
+            self.chat_area.see(tk.END)
+            self.chat_area.config(state=tk.DISABLED)
+
+        if self.omitidas:
+            self.omitidas_label.config(text=f"Eventos sin mostrar: {self.omitidas}")
+
+        self.ventana.after(config.GUI_INTERVALO_MS, self._volcar_eventos)
+
+    # --- Acciones de los Botones ---
+
+    def on_toggle_pausa(self):
+        """Pausa/reanuda la consola; el servidor sigue funcionando igual."""
+        self.pausada = not self.pausada
+        self.btn_pausar.config(text="Reanudar Consola" if self.pausada else "Pausar Consola")
+
+    def on_mostrar_estadisticas(self):
+        # Se arman dentro del event loop (ahí viven los contadores)
+        self.servidor.desde_hilo(
+            lambda: self.mostrar(metricas.texto_legible(*self.servidor.estadisticas())))
+
+    def iniciar_servidor(self):
+        self.btn_iniciar.config(state=tk.DISABLED, text="Servidor Activo")
+        self.status_label.config(text=f"🟢 Servidor activo en {self.servidor.host}:{self.servidor.port}",
+                                 foreground=config.GREEN_STATUS)
+        # El event loop corre en un solo hilo aparte; Tkinter sigue en el principal
+        threading.Thread(target=self.servidor.ejecutar, daemon=True).start()
+
+    def on_send_admin_notification(self):
+        """Envía un mensaje de admin a todos."""
+        msg = self.admin_msg_entry.get()
+        if not msg:
+            return
+        self.servidor.desde_hilo(self.servidor.notificacion_admin, msg)
+        self.admin_msg_entry.delete(0, tk.END)
+
+    def on_clear_all_chats(self):
+        """Limpia la pantalla de chat de todos los clientes."""
+        self.servidor.desde_hilo(self.servidor.limpiar_chats)
+
+    def on_delete_by_id(self):
+        """Pide al servidor eliminar un mensaje por su ID."""
+        id_to_delete = self.admin_id_entry.get().strip()
+        if not id_to_delete:
+            return
+        self.servidor.desde_hilo(self.servidor.eliminar_mensaje, id_to_delete)
+        self.admin_id_entry.delete(0, tk.END)
+
+    def ejecutar(self):
+        # --- Saludo Inicial ---
+        self.servidor.log_y_mostrar("--- Servidor (Modular) iniciado. Esperando conexiones. ---")
+        self.ventana.after(config.GUI_INTERVALO_MS, self._volcar_eventos)
+        self.ventana.mainloop()
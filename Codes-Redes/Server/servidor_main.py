@@ -1,319 +1,131 @@
-import socket
-import threading
-import tkinter as tk
-from tkinter import scrolledtext
-from tkinter import ttk
-import json  # Importar JSON
-import uuid  # Importar para IDs únicos
+"""
+Punto de entrada del servidor de chat.
+
+    python servidor_main.py               # Abre la GUI de admin (Tkinter)
+    python servidor_main.py --headless    # Sin GUI (servidores sin pantalla)
+    python servidor_main.py --workers 4   # 4 procesos en el mismo puerto + relay
+
+Varias máquinas: un hub ('--hub') y en cada máquina un servidor con
+'--relay host_del_hub:5001' y un '--nodo' distinto.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
 
 # ### Importar nuestros módulos ###
 import config
 import logger
-import command_handler
-import network_utils
-
-# --- Estado Global del Servidor ---
-clientes = {}  # {conn: username}
-lock = threading.Lock() # Lock para la lista de 'clientes'
-
-# --- Funciones de Lógica de Red ---
-
-def log_y_mostrar(mensaje):
-    """
-    Paso 1: Escribe el mensaje en el archivo de log (usando nuestro módulo logger).
-    Paso 2: Muestra el mensaje en la GUI del servidor.
-    """
-    # Paso 1: Loggear en el archivo
-    logger.escribir_log(mensaje)
-    
-    # Paso 2: Mostrar en la GUI
-    from datetime import datetime
-    timestamp = datetime.now().strftime("%H:%M:%S") # Hora corta para la GUI
-    
-    chat_area.config(state=tk.NORMAL)
-    chat_area.insert(tk.END, f"[{timestamp}] {mensaje}\n")
-    chat_area.see(tk.END)
-    chat_area.config(state=tk.DISABLED)
-
-
-def broadcast_data(data_dict, sender_conn=None):
+import relay
+from servidor_core import ChatServer
+from sesion import POLITICAS
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Servidor de chat TCP")
+    parser.add_argument("--headless", action="store_true",
+                        help="Ejecuta el servidor sin la GUI de Tkinter")
+    parser.add_argument("--silencioso", action="store_true",
+                        help="En modo headless, no imprime cada evento (sólo el log)")
+    parser.add_argument("--host", default=config.HOST)
+    parser.add_argument("--port", type=int, default=config.PORT)
+    parser.add_argument("--politica", choices=POLITICAS, default=config.POLITICA_DESBORDE,
+                        help="Qué hacer cuando la cola de un cliente lento se llena")
+    parser.add_argument("--sin-limites", action="store_true",
+                        help="Desactiva los límites de tasa por conexión y por sala (ej. benchmarks)")
+
+    # --- Sharding ---
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Lanza N procesos servidor (headless) en el mismo puerto, unidos por un relay")
+    parser.add_argument("--nodo", type=int, default=config.NODO_ID,
+                        help="ID de este nodo (0-1023), distinto en cada proceso/máquina")
+    parser.add_argument("--relay", metavar="HOST:PUERTO",
+                        help="Se une a otros nodos a través del hub en esa dirección")
+    parser.add_argument("--hub", action="store_true",
+                        help="Sólo corre el hub del relay (en --relay o el de config)")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="Abre el puerto con SO_REUSEPORT (varios procesos en el mismo puerto)")
+    parser.add_argument("--log", default=config.LOG_FILE, help="Archivo de log")
+    parser.add_argument("--db", default=config.ALMACEN_DB or "",
+                        help="Base SQLite de mensajes para /historial y /buscar ('' = sin almacén)")
+    parser.add_argument("--metricas-port", type=int, default=config.METRICAS_PORT,
+                        help="Puerto local de /metrics y /stats (0 = apagado; con --workers, uno por worker)")
+    return parser.parse_args()
+
+
+def lanzar_workers(args):
     """
-    Convierte un diccionario a JSON y lo envía a todos los clientes
-    (excepto al remitente).
-    Añade una nueva línea para actuar como delimitador.
+    Lanza 'args.workers' procesos servidor con SO_REUSEPORT en el mismo
+    puerto (el kernel reparte las conexiones entre ellos) y corre el hub
+    del relay en este proceso hasta Ctrl+C.
     """
+    hub_host, hub_port = relay.parsear_direccion(args.relay or f"{config.RELAY_HOST}:{config.RELAY_PORT}")
+    base, ext = os.path.splitext(args.log)
+    base_db, ext_db = os.path.splitext(args.db)
+    procesos = []
+    for nodo in range(args.workers):
+        comando = [sys.executable, os.path.abspath(__file__), "--headless",
+                   "--host", args.host, "--port", str(args.port), "--politica", args.politica,
+                   "--nodo", str(args.nodo + nodo), "--relay", f"{hub_host}:{hub_port}",
+                   "--reuse-port", "--log", f"{base}.nodo{args.nodo + nodo}{ext}",
+                   "--metricas-port", str(args.metricas_port + nodo if args.metricas_port else 0),
+                   "--db", f"{base_db}.nodo{args.nodo + nodo}{ext_db}" if args.db else ""]
+        if args.silencioso:
+            comando.append("--silencioso")
+        if args.sin_limites:
+            comando.append("--sin-limites")
+        procesos.append(subprocess.Popen(comando))
+
+    print(f"--- {args.workers} workers en {args.host}:{args.port}, relay en {hub_host}:{hub_port} ---")
+    # Un SIGTERM al padre también tiene que bajar a los workers (ver 'finally')
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     try:
-        # Usamos '\n' como delimitador de mensajes JSON
-        mensaje_json = json.dumps(data_dict) + "\n"
-        mensaje_bytes = mensaje_json.encode("utf-8")
-        
-        with lock:
-            for conn in list(clientes.keys()):
-                if conn == sender_conn:
-                    continue
-                try:
-                    conn.sendall(mensaje_bytes)
-                except Exception as e:
-                    print(f"Error enviando a {clientes[conn]}: {e}")
-                    conn.close()
-                    del clientes[conn]
-    except Exception as e:
-        print(f"Error en broadcast_data: {e}")
-
-def manejar_cliente(conn, addr):
-    username = None
-    try:
-        username = conn.recv(1024).decode("utf-8")
-        if not username:
-            raise Exception("No se recibió nombre de usuario.")
-        
-        with lock:
-            clientes[conn] = username
-        
-        # Loguear localmente
-        log_y_mostrar(f"🔗 {username} se ha conectado desde {addr}")
-        
-        # Enviar notificación de unión a todos (incluido el nuevo cliente)
-        join_data = {
-            "type": "chat",
-            "id": "server_" + str(uuid.uuid4())[:4],
-            "prefix": "📢 Servidor: ",
-            "payload": f"{username} se ha unido al chat."
-        }
-        broadcast_data(join_data) # Sin sender_conn para que lo reciban todos
-
-        while True:
-            data = conn.recv(1024)
-            if not data:
-                break
-            
-            msg = data.decode("utf-8")
-            
-            if msg.startswith('/'):
-                # Es un comando, pasarlo al command_handler
-                command_handler.procesar_comando(conn, username, msg, clientes, lock)
-            else:
-                # Es un mensaje de chat normal
-                # 1. Generar un ID único para este mensaje
-                msg_id = str(uuid.uuid4())[:8] # Un ID corto de 8 caracteres
-                prefix = f"💬 {username}: "
-                
-                # 2. Loguearlo localmente (servidor) con su ID
-                log_y_mostrar(f"[ID: {msg_id}] {prefix}{msg}")
-                
-                # 3. Preparar el paquete de datos JSON para los clientes
-                data_to_send = {
-                    "type": "chat",
-                    "id": msg_id,
-                    "prefix": prefix,
-                    "payload": msg
-                }
-                
-                # 4. Enviar a todos los demás
-                broadcast_data(data_to_send, sender_conn=conn)
-            
-    except Exception as e:
-        print(f"Error con {addr}: {e}")
-    finally:
-        if conn in clientes:
-            with lock:
-                del clientes[conn]
-            if username:
-                # Enviar notificación de salida
-                leave_msg = f"{username} se ha desconectado."
-                leave_data = {
-                    "type": "chat",
-                    "id": "server_" + str(uuid.uuid4())[:4],
-                    "prefix": "📢 Servidor: ",
-                    "payload": leave_msg
-                }
-                broadcast_data(leave_data) # Sin sender_conn
-                
-                log_y_mostrar(f"❌ {username} (conexión cerrada).")
-        conn.close()
-
-def iniciar_servidor():
-    btn_iniciar.config(state=tk.DISABLED, text="Servidor Activo")
-    status_label.config(text=f"🟢 Servidor activo en {config.HOST}:{config.PORT}", 
-                        foreground=config.GREEN_STATUS)
-    
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((config.HOST, config.PORT))
-    server.listen()
-    
-    log_y_mostrar(f"Servidor escuchando en {config.HOST}:{config.PORT}")
-
-    try:
-        while True:
-            conn, addr = server.accept()
-            hilo = threading.Thread(target=manejar_cliente, args=(conn, addr), daemon=True)
-            hilo.start()
-    except:
-        log_y_mostrar("Servidor detenido manualmente.")
+        asyncio.run(relay.HubRelay(hub_host, hub_port).serve_forever())
+    except KeyboardInterrupt:
+        pass
     finally:
-        server.close()
-
-# --- Interfaz Tkinter ---
-ventana = tk.Tk()
-ventana.title("Servidor TCP - Chat (Modular)")
-ventana.geometry("500x550") # Aumenté un poco la altura
-ventana.configure(bg=config.BG_COLOR)
-
-# --- Configuración de Estilo Dark Mode ---
-style = ttk.Style(ventana)
-style.theme_use('clam') 
-style.configure('.',
-                background=config.BG_COLOR,
-                foreground=config.FG_COLOR,
-                fieldbackground=config.WIDGET_BG,
-                borderwidth=0)
-style.configure('TFrame', background=config.BG_COLOR)
-style.configure('TButton',
-                background=config.BTN_BG,
-                foreground=config.BTN_FG,
-                bordercolor=config.WIDGET_BG)
-style.map('TButton',
-          background=[('active', config.BTN_ACTIVE), ('disabled', config.WIDGET_BG)],
-          foreground=[('disabled', config.BTN_BG)])
-style.configure('TLabel', background=config.BG_COLOR, foreground=config.FG_COLOR)
-style.configure('TEntry',
-                foreground=config.WIDGET_FG,
-                fieldbackground=config.WIDGET_BG,
-                insertcolor=config.ENTRY_CURSOR)
-
-# --- Creación de Widgets ---
-main_frame = ttk.Frame(ventana, padding="10 10 10 10", style='TFrame')
-main_frame.pack(fill=tk.BOTH, expand=True)
-
-chat_area = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, height=15,
-                                      font=("Arial", 10),
-                                      bg=config.WIDGET_BG,
-                                      fg=config.WIDGET_FG,
-                                      insertbackground=config.ENTRY_CURSOR,
-                                      state='normal')
-chat_area.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-chat_area.config(state=tk.DISABLED)
-
-status_label = ttk.Label(main_frame, text="🔴 Servidor detenido", 
-                         foreground=config.RED_STATUS,
-                         font=("Arial", 10, "bold"), anchor="center")
-status_label.pack(pady=5, fill=tk.X)
-
-btn_iniciar = ttk.Button(main_frame, text="Iniciar Servidor",
-                         command=lambda: threading.Thread(target=iniciar_servidor, daemon=True).start())
-btn_iniciar.pack(pady=5, fill=tk.X, padx=5)
+        for proceso in procesos:
+            proceso.terminate()
+        for proceso in procesos:
+            proceso.wait()
 
 
-# -- Frame de Controles de Admin ---
-
-def on_send_admin_notification():
-    """Envía un mensaje de admin a todos usando el protocolo JSON."""
-    msg = admin_msg_entry.get()
-    if not msg:
+def main():
+    args = parse_args()
+    if args.workers:
+        lanzar_workers(args)
         return
-    
-    msg_id = "admin_" + str(uuid.uuid4())[:4]
-    prefix = "📢 [ADMIN]: "
-    
-    # 1. Loguear localmente
-    log_y_mostrar(f"[ID: {msg_id}] {prefix}{msg}")
-    
-    # 2. Preparar JSON y enviar
-    data_to_send = {
-        "type": "chat",
-        "id": msg_id,
-        "prefix": prefix,
-        "payload": msg
-    }
-    broadcast_data(data_to_send) # Enviar a todos
-    admin_msg_entry.delete(0, tk.END)
-
-def on_clear_all_chats():
-    """Limpia la pantalla de chat de todos los clientes."""
-    # 1. Loguear la acción
-    log_y_mostrar("[ADMIN_ACTION] Admin ha limpiado las ventanas de chat.")
-    
-    # 2. Enviar el comando "clear"
-    data_to_send = {"type": "clear"}
-    broadcast_data(data_to_send)
-
-admin_frame = ttk.Frame(main_frame, style='TFrame')
-admin_frame.pack(fill=tk.X, padx=5, pady=(10, 5))
-
-admin_msg_entry = ttk.Entry(admin_frame, style='TEntry')
-admin_msg_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
-
-btn_send_admin = ttk.Button(admin_frame, text="Enviar Notificación", command=on_send_admin_notification)
-btn_send_admin.pack(side=tk.LEFT)
-
-btn_clear_chat = ttk.Button(admin_frame, text="Limpiar Chats", command=on_clear_all_chats, style='TButton')
-btn_clear_chat.pack(side=tk.LEFT, padx=5)
-
-
-# --- Frame de Eliminar por ID ---
-
-def on_delete_by_id():
-    """Envía un comando 'delete' con un ID específico."""
-    id_to_delete = admin_id_entry.get().strip()
-    if not id_to_delete:
+    if args.hub:
+        host, port = relay.parsear_direccion(args.relay or f"{config.RELAY_HOST}:{config.RELAY_PORT}")
+        print(f"--- Hub del relay escuchando en {host}:{port} ---")
+        try:
+            asyncio.run(relay.HubRelay(host, port).serve_forever())
+        except KeyboardInterrupt:
+            pass
         return
-        
-    # 1. Loguear la acción
-    log_y_mostrar(f"[ADMIN_ACTION] Admin eliminó mensaje ID: {id_to_delete}")
-    
-    # 2. Enviar el comando "delete"
-    data_to_send = {"type": "delete", "id": id_to_delete}
-    broadcast_data(data_to_send)
-    
-    admin_id_entry.delete(0, tk.END)
-
-# Nuevo frame para la función de eliminar
-delete_frame = ttk.Frame(main_frame, style='TFrame')
-delete_frame.pack(fill=tk.X, padx=5, pady=5)
-
-ttk.Label(delete_frame, text="ID de Mensaje:").pack(side=tk.LEFT, padx=5)
-admin_id_entry = ttk.Entry(delete_frame, style='TEntry', width=15)
-admin_id_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
-
-btn_delete_id = ttk.Button(delete_frame, text="Eliminar Mensaje", command=on_delete_by_id)
-btn_delete_id.pack(side=tk.LEFT)
-
-
-# --- Frame de Información de Conexión ---
-info_frame = ttk.Frame(main_frame, style='TFrame')
-info_frame.pack(fill=tk.X, padx=5, pady=(5, 0))
-
-info_frame.columnconfigure(1, weight=1)
-
-try:
-    local_ip = network_utils.get_local_ip()
-except Exception as e:
-    print(f"Error interno al obtener IP: {e}")
-    local_ip = "Error al obtener IP"
-
-# Conexión Local (Misma PC)
-ttk.Label(info_frame, text="IP Local (Misma PC):", font=("Arial", 10, "bold")).grid(row=0, column=0, sticky="w", padx=5)
-ip_local_text = tk.Text(info_frame, height=1, borderwidth=0, 
-                         bg=config.WIDGET_BG, fg=config.WIDGET_FG, 
-                         font=("Courier", 10))
-ip_local_text.insert(tk.END, f"127.0.0.1:{config.PORT}")
-ip_local_text.config(state=tk.DISABLED)
-ip_local_text.grid(row=0, column=1, sticky="ew", padx=5)
-
-# Conexión de Red (LAN)
-ttk.Label(info_frame, text="IP de Red (LAN):", font=("Arial", 10, "bold")).grid(row=1, column=0, sticky="w", padx=5)
-ip_lan_text = tk.Text(info_frame, height=1, borderwidth=0, 
-                       bg=config.WIDGET_BG, fg=config.WIDGET_FG, 
-                       font=("Courier", 10))
-ip_lan_text.insert(tk.END, f"{local_ip}:{config.PORT}")
-ip_lan_text.config(state=tk.DISABLED)
-ip_lan_text.grid(row=1, column=1, sticky="ew", padx=5)
-
-# IP Pública
-ttk.Label(info_frame, text="IP Pública (Internet):", font=("Arial", 10, "bold")).grid(row=2, column=0, sticky="w", padx=5)
-ttk.Label(info_frame, text="(Requiere Port Forwarding o VPN)", font=("Arial", 9, "italic")).grid(row=2, column=1, sticky="w", padx=5)
-
-# --- Saludo Inicial ---
-log_y_mostrar("--- Servidor (Modular) iniciado. Esperando conexiones. ---")
 
-ventana.mainloop()
\ No newline at end of file
+    if args.sin_limites:
+        config.LIMITE_MENSAJES_SEG = config.LIMITE_SALA_SEG = 0
+        config.LIMITES_COMANDOS = False
+
+    logger.escritor.ruta = args.log
+    enlace = relay.RelayTCP(*relay.parsear_direccion(args.relay)) if args.relay else None
+    servidor = ChatServer(args.host, args.port, politica=args.politica, nodo=args.nodo,
+                          relay=enlace, reuse_port=args.reuse_port,
+                          metricas_port=args.metricas_port, almacen=args.db or None)
+
+    if args.headless:
+        # Sin GUI: los eventos se imprimen en la consola
+        servidor.on_evento = None if args.silencioso else print
+        servidor.log_y_mostrar("--- Servidor (Headless) iniciado. Esperando conexiones. ---")
+        servidor.ejecutar()
+    else:
+        # Importamos Tkinter sólo si hace falta la GUI
+        from servidor_gui import ServidorGUI
+        ServidorGUI(servidor).ejecutar()
+
+
+if __name__ == "__main__":
+    main()
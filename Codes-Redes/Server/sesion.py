@@ -0,0 +1,237 @@
+"""
+Estado de una conexión de cliente y su cola de salida.
+
+Cada sesión tiene su propia cola acotada y su propia tarea escritora,
+así un cliente lento sólo se retrasa a sí mismo y nunca frena el
+broadcast hacia los demás.
+"""
+import asyncio
+import time
+import zlib
+from collections import deque
+
+# ### Importar nuestros módulos ###
+import config
+import protocolo
+from limites import CuboTokens
+
+# --- Políticas de desborde de la cola de salida ---
+DESCARTAR_ANTIGUOS = "descartar_antiguos"  # Se tiran los mensajes más viejos
+DESCONECTAR = "desconectar"                # Se expulsa al cliente lento
+COALESCER = "coalescer"                    # La cola se resume en un solo aviso
+
+POLITICAS = (DESCARTAR_ANTIGUOS, DESCONECTAR, COALESCER)
+
+# Prefijos internados del formato binario (compartidos por todas las sesiones,
+# así el frame binario de un broadcast también se arma una sola vez)
+PREFIJOS = protocolo.TablaPrefijos()
+
+
+class Sesion:
+    """Estado de una conexión de cliente."""
+
+    def __init__(self, reader, writer, username, addr, politica=None, admision=None,
+                 formato=None, compresion=None, ids=None):
+        self.reader = reader
+        self.writer = writer
+        self.username = username
+        self.addr = addr
+        self.sala = None  # Sala actual (la asigna 'salas.Salas')
+        self.ultima_actividad = asyncio.get_running_loop().time()  # Último frame recibido
+        self.politica = politica or config.POLITICA_DESBORDE
+        self.admision = admision  # limites.ControlAdmision (bytes en vuelo globales)
+        self.ids = ids  # ids.GeneradorIds del servidor (para los avisos propios)
+
+        # --- Límite de tasa de lo que manda el cliente ---
+        self.limite = CuboTokens(config.LIMITE_MENSAJES_SEG, config.LIMITE_MENSAJES_RAFAGA)
+        self.frenadas = 0  # Frames demorados por el límite (propio o de su sala)
+        self.segundos_frenada = 0.0
+        self.limites_comandos = {}  # {"/comando": CuboTokens} (los crea command_handler)
+
+        # --- Cola de salida ---
+        self.cola = deque()
+        self.cola_bytes = 0
+        self.en_vuelo = 0  # Bytes ya escritos al transporte que 'drain' no confirmó
+        self.descartados = 0  # Mensajes perdidos por desborde
+        self._aviso = None  # Último aviso de coalescer en la cola (los bytes encolados)
+        self._aviso_omitidos = 0  # Lo que contaba ese aviso
+        self.frames_enviados = 0  # Escritos al socket (para las métricas)
+        self.bytes_enviados = 0
+        self._hay_datos = asyncio.Event()
+        self._tarea_escritora = None
+        self.cerrada = False
+
+        # --- Formato de salida y compresión (negociados en el saludo) ---
+        self.binario = formato == protocolo.FORMATO_BINARIO
+        self.prefijos = set()  # Prefijos que este cliente ya conoce (formato binario)
+        self._zlib = None  # Contexto zlib propio de esta conexión
+        if compresion == protocolo.COMPRESION_ZLIB:
+            self._zlib = zlib.compressobj(config.COMPRESION_NIVEL, zlib.DEFLATED,
+                                          zlib.MAX_WBITS, config.COMPRESION_MEMORIA)
+        self.bytes_sin_comprimir = 0
+        self.bytes_comprimidos = 0
+        self.segundos_compresion = 0.0
+        if self.binario or self._zlib is not None:
+            # Se escribe directo (no a la cola): no se puede descartar por desborde
+            writer.write(protocolo.confirmacion(
+                protocolo.FORMATO_BINARIO if self.binario else protocolo.FORMATO_JSON,
+                protocolo.COMPRESION_ZLIB if self._zlib is not None else None))
+
+    # --- Envío ---
+
+    def enviar(self, frame):
+        """
+        Encola un 'protocolo.Frame' para el cliente sin bloquear nunca al
+        que llama. Se encolan los bytes ya serializados (compartidos con
+        las demás sesiones, sin copia).
+        Si la cola está llena se aplica la política de desborde.
+        """
+        if self.cerrada:
+            return
+        if not self.binario:
+            self._encolar(frame.datos)
+            return
+
+        data_bytes, prefijo = frame.binario(PREFIJOS)
+        self._encolar(data_bytes, prefijo)
+
+    def _encolar(self, data_bytes, prefijo=None):
+        if (len(self.cola) >= config.COLA_MAX_MENSAJES or
+                self.cola_bytes + len(data_bytes) > config.COLA_MAX_BYTES):
+            if not self._desbordar(data_bytes):
+                return
+
+        # Después del desborde: si la definición del prefijo se perdió con la
+        # cola, se vuelve a mandar antes de este frame
+        if prefijo and prefijo not in self.prefijos:
+            # Primera vez que este cliente ve el prefijo: va su definición antes
+            self.prefijos.add(prefijo)
+            self._agregar(PREFIJOS.definicion(prefijo))
+        self._agregar(data_bytes)
+
+    def _agregar(self, data_bytes):
+        self.cola.append(data_bytes)
+        self._contar_bytes(len(data_bytes))
+        self._hay_datos.set()
+
+    def _contar_bytes(self, n):
+        """Suma (o resta) bytes pendientes, en la sesión y en el total del servidor."""
+        self.cola_bytes += n
+        if self.admision is not None:
+            if n > 0:
+                self.admision.sumar(n)
+            else:
+                self.admision.restar(-n)
+
+    def _desbordar(self, data_bytes):
+        """Aplica la política de desborde. Devuelve False si no se debe encolar."""
+        if self.politica == DESCONECTAR:
+            print(f"Cliente lento desconectado: {self.username}")
+            self.cerrar()
+            return False
+
+        if self.politica == COALESCER:
+            # Se descarta todo lo pendiente y se deja un único aviso
+            omitidos = 0
+            for viejo in self.cola:
+                if self.binario and viejo[4] == protocolo.B_PREFIJO:
+                    # Definición que no llegó: se vuelve a mandar cuando haga falta
+                    self.prefijos.discard(int.from_bytes(viejo[5:9], "big"))
+                elif viejo is self._aviso:
+                    # El aviso anterior tampoco llegó: su cuenta pasa al nuevo
+                    omitidos += self._aviso_omitidos
+                else:
+                    omitidos += 1
+                    self.descartados += 1
+            self.cola.clear()
+            self._contar_bytes(-self.cola_bytes)
+            self.enviar(protocolo.Frame({
+                "type": "chat",
+                "id": self.ids.siguiente(),  # Un ID real (el cliente lo guarda para reconectar)
+                "prefix": "📢 Servidor: ",
+                "payload": f"Se omitieron {omitidos} mensajes por conexión lenta."
+            }))  # La cola quedó vacía: el aviso entra sin desbordar
+            self._aviso = self.cola[-1]
+            self._aviso_omitidos = omitidos
+            return True
+
+        # DESCARTAR_ANTIGUOS (por defecto). Las definiciones de prefijos no se
+        # tiran nunca: los frames que quedan en la cola pueden usarlas
+        definiciones = []
+        while self.cola and (len(self.cola) >= config.COLA_MAX_MENSAJES or
+                             self.cola_bytes + len(data_bytes) > config.COLA_MAX_BYTES):
+            viejo = self.cola.popleft()
+            if self.binario and viejo[4] == protocolo.B_PREFIJO:
+                definiciones.append(viejo)
+                continue
+            self._contar_bytes(-len(viejo))
+            self.descartados += 1
+        self.cola.extendleft(reversed(definiciones))
+        return True
+
+    # --- Tarea Escritora ---
+
+    def iniciar_escritor(self):
+        self._tarea_escritora = asyncio.get_running_loop().create_task(self._escritor())
+
+    async def _escritor(self):
+        """Vacía la cola hacia el socket; sólo espera a su propio cliente."""
+        try:
+            while not self.cerrada:
+                await self._hay_datos.wait()
+                self._hay_datos.clear()
+
+                while self.cola:
+                    # Todo lo pendiente sale en una sola escritura vectorizada
+                    # (writelines -> sendmsg en los transportes que lo soportan)
+                    lote = list(self.cola)
+                    self.cola.clear()
+                    self.frames_enviados += len(lote)
+                    self.bytes_enviados += self.cola_bytes
+                    # Salen de la cola, pero para el tope global (ControlAdmision)
+                    # siguen en vuelo hasta que 'drain' los deja pasar
+                    self.en_vuelo = self.cola_bytes
+                    self.cola_bytes = 0
+                    if self._zlib is not None:
+                        self.writer.write(self._comprimir(lote))
+                    else:
+                        self.writer.writelines(lote)
+                    await self.writer.drain()
+                    self._liberar_en_vuelo()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            print(f"Error en el escritor de {self.username}: {e}")
+        finally:
+            self.cerrar()
+
+    def _comprimir(self, lote):
+        """
+        Comprime un lote en el stream de la conexión. Z_SYNC_FLUSH deja todo
+        decodificable ya (sin esperar más datos) y conserva el diccionario,
+        así los prefijos y nombres repetidos cuestan casi nada.
+        """
+        inicio = time.perf_counter()
+        crudo = b"".join(lote)
+        datos = self._zlib.compress(crudo) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+        self.segundos_compresion += time.perf_counter() - inicio
+        self.bytes_sin_comprimir += len(crudo)
+        self.bytes_comprimidos += len(datos)
+        return datos
+
+    def _liberar_en_vuelo(self):
+        if self.admision is not None and self.en_vuelo:
+            self.admision.restar(self.en_vuelo)
+        self.en_vuelo = 0
+
+    def cerrar(self):
+        if self.cerrada:
+            return
+        self.cerrada = True
+        self.cola.clear()
+        self._contar_bytes(-self.cola_bytes)
+        self._liberar_en_vuelo()
+        if self._tarea_escritora and self._tarea_escritora is not asyncio.current_task():
+            self._tarea_escritora.cancel()
+        if not self.writer.is_closing():
+            self.writer.close()
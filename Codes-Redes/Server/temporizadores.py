@@ -0,0 +1,61 @@
+"""
+Rueda de temporizadores (timer wheel) para los heartbeats.
+
+En vez de un temporizador por socket, hay una sola rueda con una ranura
+por cada 'resolucion' segundos y una única tarea que avanza una ranura
+por tick. Programar o cancelar es O(1) y cada tick sólo mira las
+sesiones de su ranura, así el costo depende de los usuarios vivos.
+
+Las sesiones no se reprograman con cada mensaje que llega (eso costaría
+en el camino caliente): sólo actualizan 'ultima_actividad', y cuando les
+toca el turno se decide si mandarles un ping, expulsarlas o volver a
+programarlas para más adelante.
+"""
+import asyncio
+import math
+
+
+class RuedaTemporizadores:
+    """Rueda de 'ranuras' con un conjunto de elementos por ranura."""
+
+    def __init__(self, resolucion, horizonte):
+        self.resolucion = resolucion
+        self._ranuras = [set() for _ in range(math.ceil(horizonte / resolucion) + 1)]
+        self._actual = 0
+        self._donde = {}  # {elemento: índice de su ranura}
+
+    def __len__(self):
+        return len(self._donde)
+
+    def programar(self, elemento, segundos):
+        """(Re)programa 'elemento' para dentro de 'segundos' (se redondea hacia arriba)."""
+        self.cancelar(elemento)
+        ticks = max(1, math.ceil(segundos / self.resolucion))
+        ticks = min(ticks, len(self._ranuras) - 1)  # Más allá del horizonte: al final
+        indice = (self._actual + ticks) % len(self._ranuras)
+        self._ranuras[indice].add(elemento)
+        self._donde[elemento] = indice
+
+    def cancelar(self, elemento):
+        indice = self._donde.pop(elemento, None)
+        if indice is not None:
+            self._ranuras[indice].discard(elemento)
+
+    def avanzar(self):
+        """Avanza una ranura y devuelve los elementos que vencieron."""
+        self._actual = (self._actual + 1) % len(self._ranuras)
+        vencidos = self._ranuras[self._actual]
+        self._ranuras[self._actual] = set()
+        for elemento in vencidos:
+            del self._donde[elemento]
+        return vencidos
+
+    async def ejecutar(self, al_vencer):
+        """Tarea única: cada 'resolucion' segundos llama a al_vencer(elemento)."""
+        loop = asyncio.get_running_loop()
+        siguiente = loop.time()
+        while True:
+            siguiente += self.resolucion
+            await asyncio.sleep(max(0.0, siguiente - loop.time()))
+            for elemento in self.avanzar():
+                al_vencer(elemento)
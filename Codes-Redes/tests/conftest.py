@@ -0,0 +1,9 @@
+"""
+Configuración de pytest: los módulos del servidor ('Server') y el
+protocolo compartido ('Comun') se importan igual que en el servidor.
+"""
+import os
+import sys
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path[:0] = [os.path.join(RAIZ, "Server"), os.path.join(RAIZ, "Comun")]
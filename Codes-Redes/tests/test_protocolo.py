@@ -0,0 +1,150 @@
+"""Codificación y decodificación del protocolo (JSON, binario y zlib)."""
+import zlib
+
+import pytest
+
+import protocolo
+
+
+def _partido(data, paso):
+    """Trozos de 'paso' bytes (como llegan por TCP, cortando en cualquier lado)."""
+    return [data[i:i + paso] for i in range(0, len(data), paso)]
+
+
+def _decodificar_binario(datos, paso=None):
+    decoder = protocolo.DecodificadorBinario()
+    mensajes = []
+    for trozo in _partido(datos, paso or len(datos)):
+        mensajes += decoder.mensajes(trozo)
+    return mensajes
+
+
+# --- JSON ---
+
+def test_frame_json_ida_y_vuelta():
+    campos = {"type": "chat", "id": "0123456789abcdef", "prefix": "💬 Ana: ", "payload": "hola ñandú"}
+    frame = protocolo.Frame(campos)
+    assert frame.datos.endswith(b"\n")
+    assert frame.datos is frame.datos  # Se serializa una sola vez
+    assert protocolo.DecodificadorFrames().mensajes(frame.datos) == [campos]
+
+
+@pytest.mark.parametrize("paso", [1, 3, 7])
+def test_json_partido_en_trozos(paso):
+    campos = [{"type": "chat", "payload": f"mensaje {i} ¿qué tal?"} for i in range(20)]
+    datos = b"".join(protocolo.codificar(c) for c in campos)
+    decoder = protocolo.DecodificadorFrames()
+    recibidos = []
+    for trozo in _partido(datos, paso):
+        recibidos += decoder.mensajes(trozo)
+    assert recibidos == campos
+
+
+# --- Tabla de Prefijos ---
+
+def test_tabla_prefijos_interna_una_vez():
+    tabla = protocolo.TablaPrefijos()
+    assert tabla.indice("") == 0
+    a = tabla.indice("💬 Ana: ")
+    b = tabla.indice("💬 Beto: ")
+    assert a != b and a > 0 and b > 0
+    assert tabla.indice("💬 Ana: ") == a
+    definicion = tabla.definicion(a)
+    assert definicion[4] == protocolo.B_PREFIJO
+    assert int.from_bytes(definicion[5:9], "big") == a
+
+
+def test_tabla_llena_cae_a_json():
+    tabla = protocolo.TablaPrefijos(maximo=1)
+    assert tabla.indice("uno: ") == 1
+    assert tabla.indice("dos: ") is None
+    datos, indice = protocolo.codificar_binario(
+        {"type": "chat", "id": "0000000000000001", "prefix": "dos: ", "payload": "x"}, tabla)
+    assert indice == 0 and datos[4] == protocolo.B_JSON
+    assert _decodificar_binario(datos)[0]["prefix"] == "dos: "
+
+
+# --- Formato Binario ---
+
+@pytest.mark.parametrize("campos", [
+    {"type": "chat", "id": "034c498859000000", "prefix": "💬 Ana: ", "payload": "hola"},
+    {"type": "chat", "id": "local-7", "prefix": "", "payload": "id de texto"},
+    {"type": "chat", "id": "034c498859000001", "prefix": "🔒 Beto: ", "payload": "secreto", "privado": True},
+    {"type": "delete", "id": "034c498859000000"},
+    {"type": "clear"},
+    {"type": "ping"},
+    {"type": "pong"},
+    {"type": "presence", "online": ["ana", "José"], "offline": []},
+])
+def test_binario_ida_y_vuelta(campos):
+    tabla = protocolo.TablaPrefijos()
+    datos, indice = protocolo.Frame(campos).binario(tabla)
+    if indice:
+        datos = tabla.definicion(indice) + datos  # Lo que manda la sesión la primera vez
+    recibido = _decodificar_binario(datos)
+    assert len(recibido) == 1
+    esperado = dict(campos)
+    if esperado.get("type") == "chat":
+        esperado.setdefault("prefix", "")
+    assert {k: v for k, v in recibido[0].items() if k in esperado} == esperado
+
+
+def test_binario_partido_byte_a_byte():
+    tabla = protocolo.TablaPrefijos()
+    datos = bytearray()
+    conocidos = set()
+    campos = []
+    for i in range(50):
+        c = {"type": "chat", "id": f"{i + 1:016x}", "prefix": f"💬 autor{i % 3}: ", "payload": f"ñ{i}"}
+        campos.append(c)
+        frame, indice = protocolo.codificar_binario(c, tabla)
+        if indice not in conocidos:
+            conocidos.add(indice)
+            datos += tabla.definicion(indice)
+        datos += frame
+    recibidos = _decodificar_binario(bytes(datos), paso=1)
+    assert [(m["prefix"], m["payload"], m["id"]) for m in recibidos] == \
+           [(c["prefix"], c["payload"], c["id"]) for c in campos]
+
+
+# --- Negociación y zlib ---
+
+def _comprimir_lotes(lotes):
+    """Como 'Sesion._comprimir': un stream por conexión, Z_SYNC_FLUSH por envío."""
+    z = zlib.compressobj()
+    return [z.compress(lote) + z.flush(zlib.Z_SYNC_FLUSH) for lote in lotes]
+
+
+@pytest.mark.parametrize("formato", [protocolo.FORMATO_JSON, protocolo.FORMATO_BINARIO])
+@pytest.mark.parametrize("paso", [1, 5, 4096])
+def test_zlib_ida_y_vuelta(formato, paso):
+    tabla = protocolo.TablaPrefijos()
+    campos = [{"type": "chat", "id": f"{i + 1:016x}", "prefix": "💬 Ana: ", "payload": f"mensaje {i}"}
+              for i in range(30)]
+    lotes = []
+    for i in range(0, len(campos), 7):
+        lote = b""
+        for c in campos[i:i + 7]:
+            if formato == protocolo.FORMATO_BINARIO:
+                frame, indice = protocolo.codificar_binario(c, tabla)
+                lote += (tabla.definicion(indice) if i == 0 and lote == b"" else b"") + frame
+            else:
+                lote += protocolo.codificar(c)
+        lotes.append(lote)
+
+    datos = protocolo.confirmacion(formato, protocolo.COMPRESION_ZLIB) + b"".join(_comprimir_lotes(lotes))
+    decoder = protocolo.DecodificadorNegociado()
+    recibidos = []
+    for trozo in _partido(datos, paso):
+        recibidos += decoder.mensajes(trozo)
+    assert decoder.formato == formato
+    assert decoder.compresion == protocolo.COMPRESION_ZLIB
+    assert [m["payload"] for m in recibidos] == [c["payload"] for c in campos]
+    assert decoder.bytes_descomprimidos == sum(map(len, lotes))
+
+
+def test_sin_confirmacion_sigue_en_json():
+    datos = protocolo.codificar({"type": "chat", "payload": "servidor viejo"})
+    decoder = protocolo.DecodificadorNegociado()
+    assert decoder.mensajes(datos) == [{"type": "chat", "payload": "servidor viejo"}]
+    assert decoder.formato == protocolo.FORMATO_JSON and decoder.compresion is None
@@ -0,0 +1,145 @@
+"""Cola de salida de 'Sesion': políticas de desborde y prefijos del formato binario."""
+import asyncio
+import re
+
+import pytest
+
+import config
+import protocolo
+import sesion
+from ids import GeneradorIds
+
+COLA = 3
+
+
+class EscritorFalso:
+    """Lo mínimo de un StreamWriter: junta en 'buf' lo que se escribe."""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.cerrado = False
+
+    def write(self, data):
+        self.buf += data
+
+    def writelines(self, datos):
+        for data in datos:
+            self.write(data)
+
+    def is_closing(self):
+        return self.cerrado
+
+    def close(self):
+        self.cerrado = True
+
+
+@pytest.fixture(autouse=True)
+def cola_chica(monkeypatch):
+    monkeypatch.setattr(config, "COLA_MAX_MENSAJES", COLA)
+
+
+def _chat(i, prefijo):
+    return protocolo.Frame({"type": "chat", "id": f"{i + 1:016x}", "prefix": prefijo, "payload": f"m{i}"})
+
+
+def _vaciar(ses):
+    """Lo que hace una vuelta de '_escritor', sin esperar a 'drain'."""
+    lote = list(ses.cola)
+    ses.cola.clear()
+    ses._contar_bytes(-ses.cola_bytes)
+    if ses._zlib is not None:
+        ses.writer.write(ses._comprimir(lote))
+    else:
+        ses.writer.writelines(lote)
+
+
+def _recibido(ses):
+    """Decodifica todo lo que le llegó (o le llegaría) al cliente."""
+    if not ses.cerrada:
+        _vaciar(ses)
+    return protocolo.DecodificadorNegociado().mensajes(bytes(ses.writer.buf))
+
+
+def _correr(politica, envios, vaciar_cada=0, compresion=None):
+    """
+    Manda 'envios' chats rotando entre 4 prefijos, vaciando la cola cada
+    'vaciar_cada' envíos (0 = cliente que nunca lee). Devuelve (sesión, recibido).
+    """
+    async def prueba():
+        ses = sesion.Sesion(None, EscritorFalso(), "lento", ("127.0.0.1", 0), politica=politica,
+                            formato=protocolo.FORMATO_BINARIO, compresion=compresion,
+                            ids=GeneradorIds())
+        for i in range(envios):
+            ses.enviar(_chat(i, f"💬 autor{i % 4}: "))
+            if vaciar_cada and (i + 1) % vaciar_cada == 0:
+                _vaciar(ses)
+        return ses, _recibido(ses)
+    return asyncio.run(prueba())
+
+
+def _chequear_prefijos(mensajes):
+    """Cada chat llegó con el prefijo de su autor (ninguno quedó sin definir)."""
+    for m in mensajes:
+        if m.get("payload", "").startswith("m"):
+            i = int(m["payload"][1:])
+            assert m["prefix"] == f"💬 autor{i % 4}: "
+
+
+# --- Prefijos tras el desborde ---
+
+@pytest.mark.parametrize("politica", sesion.POLITICAS)
+def test_prefijos_se_redefinen_tras_desborde(politica):
+    ses, recibido = _correr(politica, 40, vaciar_cada=5)
+    _chequear_prefijos(recibido)
+    if politica == sesion.DESCONECTAR:
+        # Llega en orden lo que salió antes de cerrar
+        assert ses.cerrada
+        assert [m["payload"] for m in recibido] == [f"m{i}" for i in range(len(recibido))]
+    else:
+        assert not ses.cerrada and ses.descartados > 0
+        # Lo último que se mandó siempre llega
+        assert recibido[-1]["payload"] == "m39"
+
+
+@pytest.mark.parametrize("politica", sesion.POLITICAS)
+def test_sin_desborde_llega_todo(politica):
+    ses, recibido = _correr(politica, 30, vaciar_cada=1)
+    assert not ses.cerrada and ses.descartados == 0
+    assert [m["payload"] for m in recibido] == [f"m{i}" for i in range(30)]
+    _chequear_prefijos(recibido)
+
+
+def test_descartar_antiguos_conserva_definiciones():
+    ses, recibido = _correr(sesion.DESCARTAR_ANTIGUOS, 40)
+    assert [m["payload"] for m in recibido] == ["m37", "m38", "m39"]
+    assert ses.descartados == 37
+    _chequear_prefijos(recibido)
+
+
+def test_desconectar_cierra_al_desbordar():
+    ses, recibido = _correr(sesion.DESCONECTAR, COLA + 1)
+    assert ses.cerrada and ses.writer.cerrado
+    assert not ses.cola and ses.cola_bytes == 0
+    assert recibido == []  # Sólo la confirmación del saludo, que no es un mensaje
+
+
+def test_coalescer_cuenta_avisos_anteriores():
+    ses, recibido = _correr(sesion.COALESCER, 40)
+    assert ses.descartados == 39
+    aviso, ultimo = recibido
+    assert aviso["prefix"] == "📢 Servidor: "
+    assert re.search(r"\b39\b", aviso["payload"])
+    assert re.fullmatch(r"[0-9a-f]{16}", aviso["id"])
+    assert ultimo["payload"] == "m39" and ultimo["prefix"] == "💬 autor3: "
+
+
+# --- Compresión ---
+
+@pytest.mark.parametrize("politica", sesion.POLITICAS)
+def test_zlib_con_desborde(politica):
+    ses, recibido = _correr(politica, 40, vaciar_cada=4, compresion=protocolo.COMPRESION_ZLIB)
+    _chequear_prefijos(recibido)
+    assert ses.cerrada == (politica == sesion.DESCONECTAR)
+    if not ses.cerrada:
+        assert recibido[-1]["payload"] == "m39"
+        assert 0 < ses.bytes_comprimidos